@@ -50,6 +50,9 @@ from routes.schemes_routes import schemes_bp
 from routes.profile_routes import profile_bp
 from routes.farm_routes import farm_bp
 from models.farm_data import UserFarmData
+from models.market_price import MarketPrice
+from models.market_price_summary import MarketPriceSummary
+from models.market_sync_target import MarketSyncTarget
 
 # MySQL Connection
 try:
@@ -84,6 +87,22 @@ app.register_blueprint(schemes_bp, url_prefix='/api/schemes')
 app.register_blueprint(profile_bp, url_prefix='/api/profile')
 app.register_blueprint(farm_bp, url_prefix='/api/farm-data')
 
+# Load MODEL_PRELOAD models now; everything else loads on first use
+if app.config['MODEL_PRELOAD']:
+    from models.ml_models import model_registry
+    model_registry.preload(app.config['MODEL_PRELOAD'])
+
+# Optional in-process market sync (otherwise run market_sync_worker.py).
+# Under gunicorn it is started per worker by gunicorn.conf.py, never in the preloading master
+from services.market_sync import start_in_app
+if os.getenv('MARKET_SYNC_STARTED_BY_GUNICORN') != 'true':
+    start_in_app(app)
+
+@app.errorhandler(413)
+def request_too_large(e):
+    # Bodies over MAX_CONTENT_LENGTH are refused before they are read
+    return jsonify({"success": False, "error": "Upload is too large"}), 413
+
 @app.route('/')
 def home():
     return jsonify({"message": "Welcome to Agro360 API"})
@@ -92,5 +111,38 @@ def home():
 def health():
     return jsonify({"status": "healthy"})
 
+@app.route('/api/health/gemini')
+def gemini_health():
+    from services.gemini_service import gemini_service
+    return jsonify({
+        "available": gemini_service.is_available(),
+        "routes": gemini_service.health()
+    })
+
+@app.route('/api/health/http')
+def http_health():
+    from services.http_client import http_client
+    return jsonify({"hosts": http_client.stats()})
+
+@app.route('/api/health/models')
+def models_health():
+    from models.model_registry import model_registry
+    from services.prediction_cache import prediction_cache
+    from services.simple_recommendations import simple_table
+    from services.image_cache import image_cache
+    health = {
+        "models": model_registry.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "simple_recommendations": simple_table.stats(),
+        "image_cache": image_cache.stats()
+    }
+    if model_registry.is_loaded('disease'):
+        detector = model_registry.get('disease')
+        health["disease_cnn"] = {
+            "backend": detector.backend,
+            "batching": detector.batcher.stats() if detector.batcher else None
+        }
+    return jsonify(health)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,198 @@
+"""
+Disease CNN throughput with and without micro-batching, per serving setup.
+
+Each client sends synthetic leaf photos through the same path as
+/api/disease/detect (preprocess, then the runner directly or through a
+MicroBatcher) for --seconds, and the images/s and latency percentiles are
+reported per backend, for two worker models:
+
+    threaded   one process serving --clients concurrent requests, as a gunicorn
+               gthread worker with GUNICORN_THREADS=<clients> does
+    sync       --processes processes each serving one request at a time, as the
+               default sync gunicorn workers do (--workers <processes>)
+
+Batching can only gather requests that one process serves at once, so it
+pays off in the threaded setup and only adds its wait window in the sync one
+(which is why DISEASE_BATCH_MAX_SIZE defaults to 1). Uses
+ml/saved_models/disease_model.h5 and any exports from export_disease_model.py;
+--untrained benchmarks a randomly initialised MobileNetV2 with the training
+head when no trained model is available (timings are representative,
+predictions are not).
+
+Usage:
+    python benchmark_disease_inference.py
+    python benchmark_disease_inference.py --backend tflite --clients 1 8 32 --seconds 20
+    python benchmark_disease_inference.py --processes 4 --clients 8     # sync workers vs gthread
+    python benchmark_disease_inference.py --untrained
+"""
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from models.cnn_runtime import BACKENDS, IMG_SIZE, KerasRunner, load_disease_runner, preprocess_leaf_image
+from models.micro_batcher import MicroBatcher
+from models.ml_models import SAVED_MODELS_DIR, DISEASE_BATCH_MAX_SIZE, DISEASE_BATCH_WAIT_MS, DISEASE_MODEL_THREADS
+
+
+def untrained_runner(n_classes=38):
+    import tensorflow as tf
+    base = tf.keras.applications.MobileNetV2(weights=None, include_top=False, input_shape=(IMG_SIZE, IMG_SIZE, 3))
+    x = tf.keras.layers.GlobalAveragePooling2D()(base.output)
+    x = tf.keras.layers.Dense(256, activation='relu')(x)
+    outputs = tf.keras.layers.Dense(n_classes, activation='softmax')(x)
+    return KerasRunner(tf.keras.Model(base.input, outputs))
+
+
+def synthetic_photos(count, seed=0):
+    """Phone-camera sized random images (the route resizes every upload to 224x224)."""
+    rng = np.random.default_rng(seed)
+    return [Image.fromarray(rng.integers(0, 256, (960, 1280, 3), dtype=np.uint8)) for _ in range(count)]
+
+
+def run_clients(predict, photos, clients, seconds):
+    latencies = [[] for _ in range(clients)]
+    stop = time.monotonic() + seconds
+
+    def client(i):
+        n = i
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            predict(photos[n % len(photos)])
+            latencies[i].append(time.perf_counter() - start)
+            n += clients
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    flat = np.array([latency for per_client in latencies for latency in per_client]) * 1000
+    return len(flat) / elapsed, np.percentile(flat, 50), np.percentile(flat, 99)
+
+
+def load_runner(backend, untrained):
+    if untrained:
+        return untrained_runner()
+    return load_disease_runner(SAVED_MODELS_DIR, backend, DISEASE_MODEL_THREADS)
+
+
+def _sync_worker(backend, untrained, seconds, batch_size, wait_ms, barrier, results):
+    """One sync gunicorn worker: a single client, unbatched and then through a MicroBatcher."""
+    runner = load_runner(backend, untrained)
+    photos = synthetic_photos(4, seed=os.getpid())
+    batcher = MicroBatcher(runner.predict_batch, batch_size, wait_ms, name='bench-sync')
+
+    def unbatched(photo):
+        return runner.predict_batch(preprocess_leaf_image(photo)[np.newaxis])[0]
+
+    def batched(photo):
+        return batcher.predict(preprocess_leaf_image(photo))
+
+    run_clients(unbatched, photos, 1, 1.0)
+    run_clients(batched, photos, 1, 1.0)
+    measured = {}
+    for mode, predict in (("unbatched", unbatched), ("batched", batched)):
+        # Every process measures the same mode at the same time
+        barrier.wait()
+        measured[mode] = run_clients(predict, photos, 1, seconds)
+    measured["mean_batch"] = batcher.stats()["mean_batch_size"]
+    results.put(measured)
+
+
+def benchmark_sync_workers(name, backend, untrained, processes, seconds, batch_size, wait_ms):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(processes)
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=_sync_worker, args=(backend, untrained, seconds, batch_size, wait_ms, barrier, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    measured = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    print(f"\n{name}: {processes} sync workers, one request at a time each")
+    print(f"  {'mode':>9}  {'img/s':>8} {'p50 ms':>8} {'p99 ms':>8}  {'mean batch':>10}")
+    for mode in ("unbatched", "batched"):
+        throughput = sum(m[mode][0] for m in measured)
+        p50 = float(np.mean([m[mode][1] for m in measured]))
+        p99 = max(m[mode][2] for m in measured)
+        mean_batch = float(np.mean([m["mean_batch"] for m in measured])) if mode == "batched" else 1.0
+        print(f"  {mode:>9}  {throughput:>8.1f} {p50:>8.1f} {p99:>8.1f}  {mean_batch:>10.2f}")
+
+
+def benchmark(name, runner, photos, client_counts, seconds, batch_size, wait_ms):
+    lock = threading.Lock()
+
+    def unbatched(photo):
+        array = preprocess_leaf_image(photo)
+        with lock:
+            return runner.predict_batch(array[np.newaxis])[0]
+
+    batcher = MicroBatcher(runner.predict_batch, batch_size, wait_ms, name=f'bench-{name}')
+
+    def batched(photo):
+        return batcher.predict(preprocess_leaf_image(photo))
+
+    # Warm up every code path (graph tracing, interpreter allocation) before timing
+    run_clients(unbatched, photos, 1, 1.0)
+    run_clients(batched, photos, max(client_counts), 1.0)
+
+    print(f"\n{name}: one process, concurrent client threads (gthread workers)")
+    print(f"  {'clients':>7}  {'unbatched img/s':>15} {'p50 ms':>8} {'p99 ms':>8}  |"
+          f"  {'batched img/s':>13} {'p50 ms':>8} {'p99 ms':>8}  {'speedup':>7}")
+    for clients in client_counts:
+        plain = run_clients(unbatched, photos, clients, seconds)
+        before = batcher.stats()
+        grouped = run_clients(batched, photos, clients, seconds)
+        after = batcher.stats()
+        mean_batch = (after["items"] - before["items"]) / max(1, after["batches"] - before["batches"])
+        print(f"  {clients:>7}  {plain[0]:>15.1f} {plain[1]:>8.1f} {plain[2]:>8.1f}  |"
+              f"  {grouped[0]:>13.1f} {grouped[1]:>8.1f} {grouped[2]:>8.1f}  {grouped[0] / plain[0]:>6.2f}x"
+              f"   (mean batch {mean_batch:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=BACKENDS, action='append',
+                        help='Runtimes to compare (default: every one available)')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each measurement')
+    parser.add_argument('--batch-size', type=int, default=DISEASE_BATCH_MAX_SIZE if DISEASE_BATCH_MAX_SIZE > 1 else 16)
+    parser.add_argument('--wait-ms', type=float, default=DISEASE_BATCH_WAIT_MS)
+    parser.add_argument('--untrained', action='store_true', help='Use a randomly initialised MobileNetV2')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Also benchmark this many sync worker processes (the default gunicorn setup)')
+    args = parser.parse_args()
+
+    photos = synthetic_photos(16)
+    if args.untrained:
+        runners = {"keras (untrained)": (None, untrained_runner())}
+    else:
+        runners = {}
+        for backend in args.backend or BACKENDS:
+            runner = load_runner(backend, False)
+            if runner is not None:
+                runners[backend] = (backend, runner)
+        if not runners:
+            raise SystemExit("No disease CNN found in ml/saved_models (train one, export it, or pass --untrained)")
+
+    print(f"Batching: up to {args.batch_size} images, {args.wait_ms} ms window; {os.cpu_count()} CPUs")
+    for name, (backend, runner) in runners.items():
+        benchmark(name, runner, photos, args.clients, args.seconds, args.batch_size, args.wait_ms)
+        if args.processes:
+            benchmark_sync_workers(name, backend, args.untrained, args.processes, args.seconds,
+                                   args.batch_size, args.wait_ms)
+
+
+if __name__ == '__main__':
+    main()
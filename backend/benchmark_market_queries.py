@@ -0,0 +1,144 @@
+"""
+Time the market_prices lookups with and without the MarketPrice indexes.
+
+Seeds a throwaway table with synthetic Agmarknet-shaped rows, times the three
+dashboard queries (latest price for a tuple, markets in a state, crops in a
+market), builds the indexes declared on MarketPrice and times them again.
+
+Usage:
+    python benchmark_market_queries.py                       # 1M rows in a temp SQLite file
+    python benchmark_market_queries.py --rows 200000
+    python benchmark_market_queries.py --database-url mysql+pymysql://user:pw@localhost/agro360_bench
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import MetaData, Table, Index, create_engine, select, insert
+
+from models.market_price import MarketPrice
+
+STATES = 30
+MARKETS_PER_STATE = 25
+COMMODITIES = 60
+
+
+def build_table(metadata):
+    """A copy of market_prices with its columns but none of its indexes."""
+    return Table(
+        MarketPrice.__tablename__, metadata,
+        *[column._copy() for column in MarketPrice.__table__.columns]
+    )
+
+
+def seed(engine, table, rows, batch=50000):
+    rng = random.Random(42)
+    states = [f"State {s}" for s in range(STATES)]
+    markets = {state: [f"{state} Market {m}" for m in range(MARKETS_PER_STATE)] for state in states}
+    commodities = [f"Commodity {c}" for c in range(COMMODITIES)]
+    day = {}
+
+    start = time.time()
+    with engine.begin() as conn:
+        pending = []
+        for _ in range(rows):
+            state = rng.choice(states)
+            market = rng.choice(markets[state])
+            commodity = rng.choice(commodities)
+            key = (state, market, commodity)
+            day[key] = day.get(key, 0) + 1
+            price = rng.uniform(800, 8000)
+            pending.append({
+                "state": state, "district": market, "market": market, "commodity": commodity,
+                "min_price": price * 0.9, "max_price": price * 1.1, "modal_price": price,
+                "arrival_date": f"day-{day[key]:05d}"
+            })
+            if len(pending) == batch:
+                conn.execute(insert(table), pending)
+                pending = []
+        if pending:
+            conn.execute(insert(table), pending)
+    print(f"Seeded {rows:,} rows in {time.time() - start:.1f}s")
+    return states, markets, commodities
+
+
+def time_queries(engine, table, states, markets, commodities, repeats):
+    rng = random.Random(7)
+    queries = {
+        "latest price (state, market, commodity)": lambda: (
+            select(table).where(table.c.state == (s := rng.choice(states)),
+                                table.c.market == rng.choice(markets[s]),
+                                table.c.commodity == rng.choice(commodities))
+            .order_by(table.c.id.desc()).limit(1)
+        ),
+        "distinct markets in state": lambda: (
+            select(table.c.market).where(table.c.state == rng.choice(states)).distinct()
+        ),
+        "distinct crops in market": lambda: (
+            select(table.c.commodity).where(
+                table.c.market == rng.choice(markets[rng.choice(states)])).distinct()
+        ),
+    }
+    results = {}
+    with engine.connect() as conn:
+        for name, make_query in queries.items():
+            timings = []
+            for _ in range(repeats):
+                query = make_query()
+                start = time.perf_counter()
+                conn.execute(query).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def create_indexes(engine, table):
+    start = time.time()
+    for index in MarketPrice.__table__.indexes:
+        Index(index.name, *[table.c[column.name] for column in index.columns],
+              unique=index.unique).create(engine)
+    print(f"Built {len(MarketPrice.__table__.indexes)} indexes in {time.time() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeats', type=int, default=50, help='Timed runs per query (median reported)')
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    tmp_path = None
+    url = args.database_url
+    if not url:
+        fd, tmp_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        url = f"sqlite:///{tmp_path}"
+
+    engine = create_engine(url)
+    metadata = MetaData()
+    table = build_table(metadata)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    try:
+        states, markets, commodities = seed(engine, table, args.rows)
+        before = time_queries(engine, table, states, markets, commodities, args.repeats)
+        create_indexes(engine, table)
+        after = time_queries(engine, table, states, markets, commodities, args.repeats)
+
+        print(f"\n{'query':<42}{'no index (ms)':>15}{'indexed (ms)':>15}{'speedup':>10}")
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f"{name:<42}{before[name]:>15.2f}{after[name]:>15.2f}{speedup:>9.0f}x")
+    finally:
+        metadata.drop_all(engine)
+        engine.dispose()
+        if tmp_path:
+            os.remove(tmp_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Memory benchmark for serving models from pickles vs memory-mapped exports.
+
+Starts --workers processes per mode, like gunicorn workers. Each process
+loads the crop, fertilizer and yield models (or --models). Every process
+then reports its memory from /proc/self/smaps_rollup while all of
+them are alive:
+
+  RSS     resident pages, shared ones counted in full
+  PSS     proportional share: shared pages are split between their users
+  shared  resident pages also mapped by another process
+
+"pickle" is joblib.load, the default. "mmap" is MODEL_MMAP with the .npy
+exports from export_model_arrays.py. Linux only.
+
+Usage:
+    python benchmark_model_memory.py --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODELS = ("crop", "fertilizer", "yield")
+
+
+def read_memory():
+    """RSS / PSS / shared / private of this process, in MB."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "shared": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def worker(models):
+    """Load the models, report memory, then hold it until the parent closes stdin."""
+    import warnings
+    warnings.filterwarnings('ignore')
+    baseline = read_memory()
+    from models.ml_models import model_registry
+    model_registry.preload(models)
+    loaded = read_memory()
+    print(json.dumps({"baseline": baseline, "loaded": loaded}), flush=True)
+    sys.stdin.read()
+
+
+def run_mode(mode, workers, models):
+    env = dict(os.environ, MODEL_MMAP=",".join(models) if mode == "mmap" else "")
+    procs = [
+        subprocess.Popen([sys.executable, __file__, '--worker', '--models', *models], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for _ in range(workers)
+    ]
+    reports = []
+    for proc in procs:
+        for line in proc.stdout:
+            if line.startswith('{'):
+                reports.append(json.loads(line))
+                break
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+    return reports
+
+
+def summarize(mode, reports):
+    n = len(reports)
+    avg = {key: sum(r["loaded"][key] for r in reports) / n for key in ("rss", "pss", "shared", "private")}
+    models = sum(r["loaded"]["rss"] - r["baseline"]["rss"] for r in reports) / n
+    print(f"{mode:<8} {n:>3} workers  RSS {avg['rss']:7.1f} MB  PSS {avg['pss']:7.1f} MB  "
+          f"shared {avg['shared']:6.1f} MB  private {avg['private']:6.1f} MB  "
+          f"(+{models:.1f} MB RSS for models)  total PSS {avg['pss'] * n:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--models', nargs='+', choices=MODELS, default=list(MODELS))
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.models)
+        return
+
+    print(f"Per-worker memory after loading the {', '.join(args.models)} models:\n")
+    for mode in ("pickle", "mmap"):
+        summarize(mode, run_mode(mode, args.workers, args.models))
+
+
+if __name__ == '__main__':
+    main()
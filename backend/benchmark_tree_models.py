@@ -0,0 +1,145 @@
+"""
+Check and time the flat-array tree engine against scikit-learn.
+
+For each of the crop, fertilizer and yield models this loads the pickle and
+its .trees export (see export_model_arrays.py) and then:
+
+  1. verifies that predict / predict_proba agree bit-for-bit on every row of
+     the bundled dataset in ml/datasets, as one batch and row by row;
+  2. reports p50 / p99 single-row latency and batch throughput of both.
+
+Exactness is checked against the pickle with n_jobs=None: with n_jobs=-1
+scikit-learn adds the trees' votes in thread completion order, so its own
+results can differ in the last bit between calls. Latency is measured with
+the pickle as trained.
+
+Usage:
+    python benchmark_tree_models.py
+    python benchmark_tree_models.py --only crop --calls 2000
+"""
+import argparse
+import copy
+import os
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from models.ml_models import SAVED_MODELS_DIR
+from models.tree_arrays import TreeModel, trees_path, GB_REGRESSOR
+
+DATASETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml', 'datasets')
+
+
+def crop_features():
+    df = pd.read_csv(os.path.join(DATASETS_DIR, 'crop_recommendation.csv'))
+    return df[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']].values
+
+
+def fertilizer_features():
+    df = pd.read_csv(os.path.join(DATASETS_DIR, 'fertilizer_recommendation.csv'))
+    le_soil = joblib.load(os.path.join(SAVED_MODELS_DIR, 'fertilizer_soil_encoder.pkl'))
+    le_crop = joblib.load(os.path.join(SAVED_MODELS_DIR, 'fertilizer_crop_encoder.pkl'))
+    df['soil_encoded'] = le_soil.transform(df['soil_type'])
+    df['crop_encoded'] = le_crop.transform(df['crop_type'])
+    return df[['temperature', 'humidity', 'moisture', 'soil_encoded', 'crop_encoded', 'N', 'P', 'K']].values
+
+
+def yield_features():
+    df = pd.read_csv(os.path.join(DATASETS_DIR, 'yield_prediction.csv'))
+    le_crop = joblib.load(os.path.join(SAVED_MODELS_DIR, 'yield_crop_encoder.pkl'))
+    df['crop_encoded'] = le_crop.transform(df['crop'])
+    return df[['crop_encoded', 'area', 'rainfall', 'fertilizer', 'temperature', 'humidity']].values
+
+
+MODELS = {
+    "crop": ("crop_model.pkl", crop_features),
+    "fertilizer": ("fertilizer_model.pkl", fertilizer_features),
+    "yield": ("yield_model.pkl", yield_features),
+}
+
+
+def outputs(model, X, regressor):
+    return (model.predict(X),) if regressor else (model.predict(X), model.predict_proba(X))
+
+
+def verify(reference, flat, X, regressor):
+    """Number of rows whose outputs differ, batch and row by row."""
+    batch = [np.any(a != b, axis=tuple(range(1, a.ndim))) for a, b in zip(outputs(reference, X, regressor),
+                                                                         outputs(flat, X, regressor))]
+    batch_mismatches = int(np.logical_or.reduce(batch).sum())
+    row_mismatches = sum(
+        not all(np.array_equal(a, b) for a, b in zip(outputs(reference, row, regressor), outputs(flat, row, regressor)))
+        for row in (X[i:i + 1] for i in range(len(X)))
+    )
+    return batch_mismatches, row_mismatches
+
+
+def latency(call, X, calls):
+    timings = np.empty(calls)
+    for i in range(calls):
+        row = X[i % len(X):i % len(X) + 1]
+        start = time.perf_counter()
+        call(row)
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1e3, np.percentile(timings, 99) * 1e3
+
+
+def throughput(call, X, repeats=5):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        call(X)
+    return len(X) * repeats / (time.perf_counter() - start)
+
+
+def run(name, calls):
+    model_file, features = MODELS[name]
+    model_path = os.path.join(SAVED_MODELS_DIR, model_file)
+    if not os.path.isdir(trees_path(model_path)):
+        print(f"{name}: no export at {trees_path(model_path)}; run export_model_arrays.py first\n")
+        return True
+    try:
+        model = joblib.load(model_path)
+        X = features()
+    except Exception as e:
+        print(f"{name}: could not load {model_file}: {e}\n")
+        return True
+
+    flat = TreeModel(trees_path(model_path))
+    regressor = flat.kind == GB_REGRESSOR
+    reference = copy.copy(model)
+    if hasattr(reference, "n_jobs"):
+        reference.n_jobs = None
+
+    batch_bad, row_bad = verify(reference, flat, X, regressor)
+    status = "bit-exact" if batch_bad == row_bad == 0 else f"MISMATCH ({batch_bad} batch rows, {row_bad} single rows)"
+    print(f"{name}: {flat.meta['n_trees']} trees, {flat.meta['n_nodes']:,} nodes, depth {flat._depth}, "
+          f"{len(X):,} dataset rows: {status}")
+
+    call = model.predict if regressor else model.predict_proba
+    flat_call = flat.predict if regressor else flat.predict_proba
+    sk_p50, sk_p99 = latency(call, X, calls)
+    fl_p50, fl_p99 = latency(flat_call, X, calls)
+    sk_rps, fl_rps = throughput(call, X), throughput(flat_call, X)
+    print(f"  single row  sklearn p50 {sk_p50:7.3f} ms  p99 {sk_p99:7.3f} ms | "
+          f"flat p50 {fl_p50:7.3f} ms  p99 {fl_p99:7.3f} ms  ({sk_p50 / fl_p50:.0f}x at p50)")
+    print(f"  batch       sklearn {sk_rps:12,.0f} rows/s | flat {fl_rps:12,.0f} rows/s\n")
+    return batch_bad == row_bad == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', choices=sorted(MODELS), action='append')
+    parser.add_argument('--calls', type=int, default=1000, help='Single-row calls timed per backend')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    results = [run(name, args.calls) for name in (args.only or MODELS)]
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Regenerate data/district_centroids.csv for every district in STATES_DISTRICTS.
+
+The shipped file holds approximate district headquarters coordinates. This
+script geocodes "<district>, <state>, India" with the Google Maps Geocoding
+API (GOOGLE_MAPS_API_KEY) and rewrites the file. Districts that fail to
+geocode keep their existing coordinates.
+
+Usage:
+    python build_district_gazetteer.py                 # re-geocode everything
+    python build_district_gazetteer.py --only-missing  # just districts not in the file yet
+"""
+import argparse
+import csv
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.district_gazetteer import GAZETTEER_PATH
+from services.http_client import http_client
+from services.location_service import STATES_DISTRICTS
+
+
+def geocode(state, district, api_key):
+    response = http_client.get(
+        "https://maps.googleapis.com/maps/api/geocode/json",
+        params={"address": f"{district}, {state}, India", "key": api_key}
+    )
+    if response.status_code != 200:
+        return None
+    results = response.json().get('results', [])
+    if not results:
+        return None
+    location = results[0]['geometry']['location']
+    return round(location['lat'], 4), round(location['lng'], 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only-missing', action='store_true')
+    parser.add_argument('--out', default=GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    api_key = os.getenv('GOOGLE_MAPS_API_KEY')
+    if not api_key:
+        raise SystemExit("GOOGLE_MAPS_API_KEY is not set")
+
+    existing = {}
+    if os.path.exists(args.out):
+        with open(args.out, newline='', encoding='utf-8') as f:
+            existing = {(r['state'], r['district']): (float(r['lat']), float(r['lon'])) for r in csv.DictReader(f)}
+
+    rows = []
+    geocoded = failed = 0
+    for state, districts in STATES_DISTRICTS.items():
+        for district in districts:
+            coords = existing.get((state, district))
+            if coords is None or not args.only_missing:
+                found = geocode(state, district, api_key)
+                if found:
+                    coords = found
+                    geocoded += 1
+                else:
+                    failed += 1
+                    print(f"  ⚠️  Could not geocode {district}, {state}")
+                time.sleep(0.05)
+            if coords:
+                rows.append((state, district, *coords))
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['state', 'district', 'lat', 'lon'])
+        writer.writerows(rows)
+    print(f"✅ Wrote {len(rows)} districts to {args.out} ({geocoded} geocoded, {failed} failed)")
+
+
+if __name__ == '__main__':
+    main()
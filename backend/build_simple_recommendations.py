@@ -0,0 +1,101 @@
+"""
+Precompute /api/crop/recommend-simple answers for the whole simple-mode input space.
+
+Enumerates every distinct feature vector simple mode can produce without live
+weather (SOIL_TYPE_DATA soils and the regional soil of every district ×
+WATER_AVAILABILITY levels × seasonal/fallback weather, see
+services/simple_recommendations.py), runs each through the crop model, the
+decision engine and the fertilizer model on all cores, and writes the table
+the route answers from. Re-run after retraining or editing the decision engine;
+the app ignores a table built from other models.
+
+Usage:
+    python build_simple_recommendations.py
+    python build_simple_recommendations.py --workers 4 --output /tmp/simple.json.gz
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from models.ml_models import crop_model, fertilizer_model
+from services.decision_engine import run_decision_engine
+from services.simple_recommendations import (
+    DEFAULT_TABLE_PATH, FERTILIZER_MOISTURE, TABLE_FORMAT, enumerate_space, fingerprint
+)
+
+
+def recommend(item):
+    features, soil_class = item
+    n, p, k, temperature, humidity, ph, rainfall = features
+    crop, confidence = crop_model.predict(np.array([features]))
+    decision = run_decision_engine({
+        "N": n, "P": p, "K": k, "temperature": temperature, "humidity": humidity, "ph": ph, "rainfall": rainfall
+    }, crop, 'en')
+    fertilizer = None
+    if fertilizer_model.model is not None:
+        fertilizer = fertilizer_model.predict(
+            [n, p, k, ph], crop=crop.lower(), soil_type=soil_class,
+            temperature=temperature, humidity=humidity, moisture=FERTILIZER_MOISTURE
+        )
+    return crop, confidence, fertilizer, decision
+
+
+def build(output, workers):
+    if crop_model.model is None:
+        raise SystemExit("Crop model could not be loaded; nothing to precompute")
+    if fertilizer_model.model is None:
+        print("⚠️ Fertilizer model not available; the table will carry no fertilizer")
+    space = enumerate_space()
+    print(f"Precomputing {len(space):,} simple-mode inputs on {workers} processes")
+    start = time.time()
+
+    # Both models are loaded above, before the pool forks, so workers share them
+    if workers > 1:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.map(recommend, space, chunksize=max(1, len(space) // (workers * 8)))
+    else:
+        results = [recommend(item) for item in space]
+
+    crops = sorted({crop for crop, _, _, _ in results})
+    fertilizers = sorted({fertilizer for _, _, fertilizer, _ in results if fertilizer is not None})
+    crop_index = {crop: i for i, crop in enumerate(crops)}
+    fertilizer_index = {fertilizer: i for i, fertilizer in enumerate(fertilizers)}
+    rows = [
+        [*features, soil_class, crop_index[crop], confidence,
+         fertilizer_index[fertilizer] if fertilizer is not None else None, decision]
+        for (features, soil_class), (crop, confidence, fertilizer, decision) in zip(space, results)
+    ]
+    elapsed = round(time.time() - start, 2)
+
+    table = {
+        "format": TABLE_FORMAT,
+        "fingerprint": fingerprint(),
+        "built_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "build_seconds": elapsed,
+        "crops": crops,
+        "fertilizers": fertilizers,
+        "rows": rows,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp = output + '.tmp'
+    with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+        json.dump(table, f, separators=(',', ':'))
+    os.replace(tmp, output)
+    print(f"✅ {len(rows):,} answers in {elapsed}s → {output} ({os.path.getsize(output) / 1024:.0f} KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default=os.getenv('SIMPLE_RECOMMENDATIONS_PATH', DEFAULT_TABLE_PATH))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes (default: all cores)')
+    args = parser.parse_args()
+    build(args.output, max(1, args.workers))
+
+
+if __name__ == '__main__':
+    main()
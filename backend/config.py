@@ -19,3 +19,14 @@ class Config:
     
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
+    
+    # ML models to load at startup instead of on first request (comma separated:
+    # crop, fertilizer, yield, soil, disease). With gunicorn preload_app they are
+    # loaded once in the master and shared by the workers.
+    MODEL_PRELOAD = [name.strip() for name in os.getenv('MODEL_PRELOAD', '').split(',') if name.strip()]
+
+    # Request bodies larger than this are refused with 413 before werkzeug reads
+    # and spools them: one photo (IMAGE_UPLOAD_MAX_BYTES) plus multipart overhead.
+    # /api/soil/analyze-images raises the limit for its own request to
+    # IMAGE_BATCH_MAX_BYTES.
+    MAX_CONTENT_LENGTH = int(os.getenv('IMAGE_UPLOAD_MAX_BYTES', 15 * 1024 * 1024)) + 1024 * 1024
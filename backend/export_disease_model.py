@@ -0,0 +1,163 @@
+"""
+Export the disease CNN (ml/saved_models/disease_model.h5) to quantized
+TensorFlow Lite and/or ONNX for faster, smaller CPU inference.
+
+int8 quantization is calibrated on leaf images from the PlantVillage training
+set (ml/datasets/PlantVillage, or --calibration-dir); without images use
+--quantize dynamic (int8 weights, float activations). Each export is compared
+with the Keras model on the calibration images before it is kept, and records
+the .h5's hash so the app ignores it after a retrain (see models/cnn_runtime.py).
+The app picks the export up with DISEASE_MODEL_BACKEND=auto (the default).
+
+Usage:
+    python export_disease_model.py                         # TFLite, int8
+    python export_disease_model.py --format onnx           # needs tf2onnx + onnxruntime
+    python export_disease_model.py --format tflite onnx --quantize dynamic
+"""
+import argparse
+import json
+import os
+import random
+
+import numpy as np
+from PIL import Image
+
+from models.cnn_runtime import (
+    IMG_SIZE, EXPORT_FILES, KerasRunner, TFLiteRunner, OnnxRunner, export_meta_path, preprocess_leaf_image
+)
+from models.ml_models import SAVED_MODELS_DIR
+from models.tree_arrays import file_sha256
+
+H5_PATH = os.path.join(SAVED_MODELS_DIR, 'disease_model.h5')
+DATASET_DIR = os.path.join(os.path.dirname(__file__), 'ml', 'datasets', 'PlantVillage')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def calibration_images(directory, count, seed=0):
+    """Up to `count` preprocessed images sampled across the class folders of `directory`."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths += [os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS)]
+    random.Random(seed).shuffle(paths)
+    images = []
+    for path in paths[:count]:
+        with Image.open(path) as image:
+            images.append(preprocess_leaf_image(image))
+    return np.stack(images) if images else np.empty((0, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+
+
+def export_tflite(model, path, quantize, calibration):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize != 'none':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == 'int8':
+        def representative_dataset():
+            for image in calibration:
+                yield [image[np.newaxis]]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, path, quantize, calibration):
+    try:
+        import tf2onnx
+        import tensorflow as tf
+        from onnxruntime.quantization import (
+            CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+        )
+    except ImportError as e:
+        raise SystemExit(f"ONNX export needs tf2onnx and onnxruntime (pip install tf2onnx onnxruntime): {e}")
+
+    # Dynamic batch dimension, so batched requests run as one call
+    spec = (tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.float32, name='input'),)
+    float_path = path if quantize == 'none' else path + '.float.onnx'
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=float_path)
+    if quantize == 'none':
+        return
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(calibration)
+
+        def get_next(self):
+            image = next(self._images, None)
+            return None if image is None else {'input': image[np.newaxis]}
+
+    try:
+        if quantize == 'int8':
+            quantize_static(float_path, path, Reader(), quant_format=QuantFormat.QDQ,
+                            activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+        else:
+            quantize_dynamic(float_path, path, weight_type=QuantType.QInt8)
+    finally:
+        os.remove(float_path)
+
+
+def compare(reference, runner, images):
+    """Top-1 agreement and mean absolute probability difference against the Keras model."""
+    expected = reference.predict_batch(images)
+    actual = np.concatenate([runner.predict_batch(images[i:i + 16]) for i in range(0, len(images), 16)])
+    agreement = float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1)))
+    return agreement, float(np.mean(np.abs(expected - actual)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--format', nargs='+', choices=sorted(EXPORT_FILES), default=['tflite'])
+    parser.add_argument('--quantize', choices=['int8', 'dynamic', 'none'], default='int8')
+    parser.add_argument('--calibration-dir', default=DATASET_DIR)
+    parser.add_argument('--calibration-images', type=int, default=300)
+    parser.add_argument('--min-agreement', type=float, default=0.95,
+                        help='Discard an export whose top-1 agreement with Keras is lower')
+    args = parser.parse_args()
+
+    if not os.path.exists(H5_PATH):
+        raise SystemExit(f"{H5_PATH} not found; train it with ml/train_disease_model.py first")
+    import tensorflow as tf
+    model = tf.keras.models.load_model(H5_PATH)
+    reference = KerasRunner(model)
+
+    calibration = calibration_images(args.calibration_dir, args.calibration_images)
+    print(f"{len(calibration)} calibration images from {args.calibration_dir}")
+    if args.quantize == 'int8' and not len(calibration):
+        raise SystemExit("int8 quantization needs calibration images; pass --calibration-dir or use --quantize dynamic")
+
+    source_sha256 = file_sha256(H5_PATH)
+    failed = False
+    for fmt in args.format:
+        path = os.path.join(SAVED_MODELS_DIR, EXPORT_FILES[fmt])
+        (export_tflite if fmt == 'tflite' else export_onnx)(model, path, args.quantize, calibration)
+        runner = TFLiteRunner(path) if fmt == 'tflite' else OnnxRunner(path)
+
+        size = f"{os.path.getsize(path) / 1e6:.1f} MB (Keras .h5 {os.path.getsize(H5_PATH) / 1e6:.1f} MB)"
+        if len(calibration):
+            agreement, mean_diff = compare(reference, runner, calibration)
+            print(f"{fmt}: {size}, top-1 agreement {agreement:.1%}, mean |Δp| {mean_diff:.4f}")
+            if agreement < args.min_agreement:
+                print(f"❌ {fmt}: agreement below {args.min_agreement:.0%}; export discarded")
+                os.remove(path)
+                failed = True
+                continue
+        else:
+            print(f"{fmt}: {size} (no images to compare against Keras)")
+
+        with open(export_meta_path(path), 'w') as f:
+            json.dump({
+                "format": fmt,
+                "quantize": args.quantize,
+                "source_sha256": source_sha256,
+                "calibration_images": len(calibration),
+            }, f, indent=2)
+        print(f"✅ {path}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Export the tree models in ml/saved_models to memory-mappable .npy arrays.
+
+Writes <model>.trees/ next to crop_model.pkl, fertilizer_model.pkl and
+yield_model.pkl, and <encoder>.classes.json next to each label encoder (see
+models/tree_arrays.py). Each export is checked against the pickle's own
+predictions before it is kept. Serve models from the exports with
+MODEL_MMAP=crop,fertilizer,yield. Re-run after retraining.
+
+Usage:
+    python export_model_arrays.py                 # every model
+    python export_model_arrays.py --only crop     # just one
+"""
+import argparse
+import os
+import shutil
+
+import joblib
+import numpy as np
+
+from models.ml_models import SAVED_MODELS_DIR
+from models.tree_arrays import (
+    TreeModel, export_tree_model, export_label_encoder, trees_path, classes_path, GB_REGRESSOR
+)
+
+ARTIFACTS = {
+    "crop": ("crop_model.pkl", ["crop_label_encoder.pkl"]),
+    "fertilizer": ("fertilizer_model.pkl", [
+        "fertilizer_soil_encoder.pkl", "fertilizer_crop_encoder.pkl", "fertilizer_label_encoder.pkl"
+    ]),
+    "yield": ("yield_model.pkl", ["yield_crop_encoder.pkl"]),
+}
+CHECK_ROWS = 2000
+
+
+def check_export(model, flat, rng):
+    """Compare the export with the pickle on random rows spanning each feature's split range."""
+    lo, hi = flat.split_ranges()
+    X = rng.uniform(lo - 1, hi + 1, size=(CHECK_ROWS, flat.n_features_in_))
+    if flat.kind == GB_REGRESSOR:
+        return np.array_equal(model.predict(X), flat.predict(X))
+    return np.array_equal(model.predict(X), flat.predict(X)) and np.array_equal(model.predict_proba(X), flat.predict_proba(X))
+
+
+def export(name, base_dir):
+    model_file, encoder_files = ARTIFACTS[name]
+    model_path = os.path.join(base_dir, model_file)
+    if not os.path.exists(model_path):
+        print(f"⚠️ {model_file} not found, skipping {name}")
+        return False
+
+    try:
+        model = joblib.load(model_path)
+    except Exception as e:
+        # Pickles only load under the scikit-learn version that wrote them
+        print(f"❌ {name}: could not load {model_file}: {e}")
+        return False
+    # Single-threaded so the reference probabilities are summed in tree order
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = None
+    out_dir = trees_path(model_path)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    meta = export_tree_model(model, out_dir, source=model_path)
+    if not check_export(model, TreeModel(out_dir), np.random.default_rng(42)):
+        shutil.rmtree(out_dir)
+        print(f"❌ {name}: export does not reproduce {model_file}; removed")
+        return False
+
+    for encoder_file in encoder_files:
+        encoder_path = os.path.join(base_dir, encoder_file)
+        export_label_encoder(joblib.load(encoder_path), classes_path(encoder_path), source=encoder_path)
+    size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    print(f"✅ {name}: {meta['n_trees']} trees, {meta['n_nodes']:,} nodes, {size / 1e6:.1f} MB -> {out_dir}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', choices=sorted(ARTIFACTS), action='append',
+                        help='Model to export (repeatable); default is all')
+    parser.add_argument('--dir', default=SAVED_MODELS_DIR)
+    args = parser.parse_args()
+
+    results = [export(name, args.dir) for name in (args.only or ARTIFACTS)]
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
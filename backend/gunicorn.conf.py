@@ -0,0 +1,58 @@
+"""
+Gunicorn settings, picked up automatically from the working directory
+(`gunicorn app:app`). Command-line flags still win.
+
+preload_app imports the app once in the master before forking, so models
+named in MODEL_PRELOAD are loaded a single time and their memory is shared
+copy-on-write by every worker. Leave 'disease' out of MODEL_PRELOAD here:
+TensorFlow is not fork-safe, so the CNN should load inside each worker.
+
+Workers are sync (one request at a time) unless GUNICORN_THREADS is set.
+Disease CNN micro-batching only gathers requests that one process serves
+concurrently, so enable it together with threads, e.g.
+GUNICORN_THREADS=8 DISEASE_BATCH_MAX_SIZE=8.
+
+Background threads and processes must not start in the master: the in-app
+market sync scheduler (MARKET_SYNC_IN_APP) is started from post_worker_init
+instead, in whichever worker takes its lock first, once that worker has its
+own DB connections. The soil batch decoding pool (SOIL_BATCH_WORKERS
+processes) is started there too, once per worker, and stopped in worker_exit.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Threads per worker; above 1 gunicorn uses gthread workers, which lets one process
+# serve concurrent requests (needed for DISEASE_BATCH_MAX_SIZE > 1 to form batches)
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# Read by app.py: leave starting the scheduler to post_worker_init below
+os.environ['MARKET_SYNC_STARTED_BY_GUNICORN'] = 'true'
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # The master opened database connections while importing the app (create_all);
+    # drop them from the inherited pool so each worker connects on its own.
+    from app import app
+    from extensions import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Runs in every worker once the app is loaded (preloaded or not); the lock
+    # in start_in_app lets only one of them run the scheduler
+    from app import app
+    from services.market_sync import start_in_app
+    start_in_app(app)
+
+    # Started here so no request pays for spawning the processes
+    from services.soil_image_analyzer import start_decode_pool
+    start_decode_pool()
+
+
+def worker_exit(server, worker):
+    from services.soil_image_analyzer import stop_decode_pool
+    stop_decode_pool()
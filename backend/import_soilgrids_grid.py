@@ -0,0 +1,105 @@
+"""
+Build the offline SoilGrids grid used by fetch_soilgrids_data.
+
+Input is either
+  * a CSV with columns lat,lon,nitrogen,phh2o,ocd,cec (raw SoilGrids units,
+    0-5 cm mean), one row per sample point, or
+  * one single-band GeoTIFF per property in EPSG:4326, e.g. SoilGrids tiles
+    reprojected with `gdalwarp -t_srs EPSG:4326`. Requires rasterio.
+
+Output is a float32 array of shape (4, rows, cols) saved as .npy (NoData is
+NaN) plus a .json with its georeferencing. The app memory-maps it.
+
+Usage:
+    python import_soilgrids_grid.py --csv india_soilgrids.csv
+    python import_soilgrids_grid.py --geotiff nitrogen=n.tif phh2o=ph.tif ocd=ocd.tif cec=cec.tif
+"""
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from services.soilgrids_store import PROPERTIES, DEFAULT_GRID_PATH, SOILGRIDS_CELL_DEGREES
+
+
+def write_grid(path, meta, fill):
+    """Create the .npy memmap, let `fill(array)` populate it and write the metadata."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    grid = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32,
+                                     shape=(len(PROPERTIES), meta["rows"], meta["cols"]))
+    grid[:] = np.nan
+    fill(grid)
+    grid.flush()
+    with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+        json.dump({**meta, "properties": list(PROPERTIES)}, f, indent=2)
+    covered = int((~np.isnan(grid[0])).sum())
+    print(f"✅ Wrote {path}: {meta['rows']}x{meta['cols']} cells of {meta['cell']}°, {covered:,} with data")
+
+
+def import_csv(csv_path, out_path, cell):
+    data = np.genfromtxt(csv_path, delimiter=',', names=True, dtype=np.float64)
+    lat, lon = data['lat'], data['lon']
+    lat_max = (math.floor(lat.max() / cell) + 1) * cell
+    lon_min = math.floor(lon.min() / cell) * cell
+    rows_idx = ((lat_max - lat) // cell).astype(np.int64)
+    cols_idx = ((lon - lon_min) // cell).astype(np.int64)
+    meta = {"lat_max": lat_max, "lon_min": lon_min, "cell": cell,
+            "rows": int(rows_idx.max()) + 1, "cols": int(cols_idx.max()) + 1}
+
+    def fill(grid):
+        for band, name in enumerate(PROPERTIES):
+            grid[band, rows_idx, cols_idx] = data[name]
+
+    write_grid(out_path, meta, fill)
+
+
+def import_geotiffs(paths, out_path):
+    try:
+        import rasterio
+    except ImportError:
+        raise SystemExit("GeoTIFF import needs rasterio (pip install rasterio); or export the extract to CSV")
+
+    missing = [name for name in PROPERTIES if name not in paths]
+    if missing:
+        raise SystemExit(f"Missing GeoTIFF for: {', '.join(missing)}")
+
+    with rasterio.open(paths[PROPERTIES[0]]) as src:
+        transform, height, width = src.transform, src.height, src.width
+    if abs(transform.a + transform.e) > 1e-12:
+        raise SystemExit("GeoTIFF cells must be square degrees (reproject to EPSG:4326)")
+    meta = {"lat_max": transform.f, "lon_min": transform.c, "cell": transform.a,
+            "rows": height, "cols": width}
+
+    def fill(grid):
+        for band, name in enumerate(PROPERTIES):
+            with rasterio.open(paths[name]) as src:
+                if src.transform != transform or (src.height, src.width) != (height, width):
+                    raise SystemExit(f"{paths[name]} is not aligned with {paths[PROPERTIES[0]]}")
+                values = src.read(1).astype(np.float32)
+                if src.nodata is not None:
+                    values[values == src.nodata] = np.nan
+                grid[band] = values
+
+    write_grid(out_path, meta, fill)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help='CSV with lat,lon,nitrogen,phh2o,ocd,cec columns')
+    source.add_argument('--geotiff', nargs='+', metavar='PROPERTY=PATH',
+                        help=f"One GeoTIFF per property: {', '.join(PROPERTIES)}")
+    parser.add_argument('--out', default=os.getenv('SOILGRIDS_GRID_PATH', DEFAULT_GRID_PATH))
+    parser.add_argument('--cell', type=float, default=SOILGRIDS_CELL_DEGREES,
+                        help='Cell size in degrees for CSV input')
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.csv:
+        import_csv(args.csv, args.out, args.cell)
+    else:
+        import_geotiffs(dict(item.split('=', 1) for item in args.geotiff), args.out)
+    print(f"Done in {time.time() - start:.1f}s")
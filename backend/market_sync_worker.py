@@ -0,0 +1,62 @@
+"""
+Background market price sync, run as its own process next to the web app.
+
+Refreshes the (state, market, commodity) tuples users actually request, hottest
+first, before their cached prices go stale. Web requests only read the DB.
+
+Usage:
+    python market_sync_worker.py            # run forever
+    python market_sync_worker.py --once     # single pass (e.g. from cron)
+    python market_sync_worker.py --rebuild-summaries   # backfill price summaries and exit
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from flask import Flask
+
+from config import Config
+from extensions import db
+from models.market_price import MarketPrice
+from models.market_price_summary import MarketPriceSummary
+from models.market_sync_target import MarketSyncTarget
+from services.market_service import MarketService
+from services.market_sync import MarketSyncScheduler, MARKET_SYNC_POLL_SECONDS
+
+
+def create_app():
+    # Only the DB layer is needed here; importing app.py would also load every ML model
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--once', action='store_true', help='Run a single pass and exit')
+    parser.add_argument('--interval', type=float, default=MARKET_SYNC_POLL_SECONDS,
+                        help='Seconds between passes')
+    parser.add_argument('--rebuild-summaries', action='store_true',
+                        help='Recompute the rolling price summary of every tuple and exit')
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.rebuild_summaries:
+        with app.app_context():
+            print(f"✅ Rebuilt price summaries for {MarketService.rebuild_price_summaries()} tuples")
+        raise SystemExit(0)
+
+    scheduler = MarketSyncScheduler(app, poll_seconds=args.interval)
+    if args.once:
+        synced = scheduler.run_pass()
+        print(f"✅ Synced {synced} targets: {scheduler.stats}")
+    else:
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
@@ -0,0 +1,84 @@
+"""
+Add the market_prices indexes and unique natural key to an existing database.
+
+db.create_all() only creates missing tables, so databases created before the
+indexes were declared on MarketPrice need this once. Duplicate rows for the
+same (state, market, commodity, arrival_date) are removed first, keeping the
+newest id, otherwise the unique key cannot be built.
+
+Usage:
+    python migrate_market_indexes.py            # apply
+    python migrate_market_indexes.py --dry-run  # show what would change
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from flask import Flask
+from sqlalchemy import inspect, text
+
+from config import Config
+from extensions import db
+from models.market_price import MarketPrice
+
+DUPLICATES_SQL = """
+    SELECT COUNT(*) - (
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM market_prices GROUP BY state, market, commodity, arrival_date
+        ) AS key_groups
+    ) FROM market_prices
+"""
+
+DEDUPE_SQL = """
+    DELETE FROM market_prices WHERE id NOT IN (
+        SELECT keep_id FROM (
+            SELECT MAX(id) AS keep_id FROM market_prices
+            GROUP BY state, market, commodity, arrival_date
+        ) AS keep_rows
+    )
+"""
+
+
+def migrate(dry_run=False):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+        inspector = inspect(engine)
+        if not inspector.has_table(MarketPrice.__tablename__):
+            if not dry_run:
+                MarketPrice.__table__.create(engine)
+            print("✅ Created market_prices with all indexes")
+            return
+
+        existing = {index['name'] for index in inspector.get_indexes(MarketPrice.__tablename__)}
+        missing = [index for index in MarketPrice.__table__.indexes if index.name not in existing]
+        if not missing:
+            print("✅ All market_prices indexes already exist")
+            return
+
+        if any(index.unique for index in missing):
+            (duplicates,) = db.session.execute(text(DUPLICATES_SQL)).one()
+            print(f"Found {duplicates} duplicate rows on the natural key")
+            if duplicates and not dry_run:
+                deleted = db.session.execute(text(DEDUPE_SQL)).rowcount
+                db.session.commit()
+                print(f"🗑  Removed {deleted} duplicate rows")
+
+        for index in missing:
+            columns = ', '.join(column.name for column in index.columns)
+            print(f"{'Would create' if dry_run else 'Creating'} {index.name} ({columns})")
+            if not dry_run:
+                index.create(engine)
+        print("✅ Done" if not dry_run else "Dry run, nothing changed")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run)
@@ -118,6 +118,7 @@ def train():
     print(f"\nModel saved to {MODEL_DIR}/crop_model.pkl")
     print(f"Label encoder saved to {MODEL_DIR}/crop_label_encoder.pkl")
     print(f"Classes: {list(le.classes_)}")
+    print("Run `python export_model_arrays.py` from backend/ to refresh the memory-mapped export")
     return acc
 
 
@@ -164,6 +164,7 @@ def _train_real_model():
             json.dump(config, f, indent=2)
         
         print("Disease CNN model saved successfully!")
+        print("Run `python export_disease_model.py` from backend/ to refresh the quantized TFLite/ONNX exports.")
         
     except Exception as e:
         print(f"CNN training failed: {e}")
@@ -102,6 +102,7 @@ def train():
         }, f)
     
     print(f"\nAll models saved to {MODEL_DIR}/")
+    print("Run `python export_model_arrays.py` from backend/ to refresh the memory-mapped export")
     return acc
 
 
@@ -107,6 +107,7 @@ def train():
         json.dump(list(le_crop.classes_), f)
     
     print(f"Model saved to {MODEL_DIR}/yield_model.pkl")
+    print("Run `python export_model_arrays.py` from backend/ to refresh the memory-mapped export")
     return r2
 
 
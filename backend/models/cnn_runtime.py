@@ -0,0 +1,156 @@
+"""
+Runtimes for the disease CNN (MobileNetV2, ml/train_disease_model.py).
+
+disease_model.h5 is served with Keras by default. export_disease_model.py
+can also convert it to
+
+    disease_model.tflite       TensorFlow Lite, int8 (or dynamic-range) quantized
+    disease_model.onnx         ONNX, int8 QDQ (or dynamic) quantized, for onnxruntime
+
+each with a <file>.json sidecar recording the quantization and the hash of
+the .h5 it came from. An int8 model is roughly a quarter of the float
+model's size and runs several times faster on CPU.
+
+Every runner takes a float32 batch of shape (n, 224, 224, 3) scaled to
+[0, 1], the training preprocessing, and returns class probabilities of shape
+(n, n_classes). Runners are not thread-safe; DiseaseDetector drives them from
+a single MicroBatcher thread (or under a lock).
+"""
+import json
+import os
+
+import numpy as np
+
+from models.tree_arrays import file_sha256
+from services.image_ingest import resized_array
+
+IMG_SIZE = 224
+BACKENDS = ("keras", "tflite", "onnx")
+EXPORT_FILES = {"tflite": "disease_model.tflite", "onnx": "disease_model.onnx"}
+
+
+def preprocess_leaf_image(image):
+    """PIL image -> float32 (224, 224, 3) array in [0, 1], as in training (rescale=1/255)."""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return resized_array(image, (IMG_SIZE, IMG_SIZE), np.float32)
+
+
+def export_meta_path(path):
+    return path + '.json'
+
+
+class KerasRunner:
+    backend = "keras"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_batch(self, batch):
+        # predict_on_batch skips the per-call data-adapter setup of Model.predict
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteRunner:
+    """TFLite interpreter with one allocated interpreter per batch-size bucket
+    (1, 2, 4, ...), so changing batch sizes don't re-allocate tensors on every call."""
+    backend = "tflite"
+
+    def __init__(self, path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self._interpreter_class = Interpreter
+        with open(path, 'rb') as f:
+            self._content = f.read()
+        self.num_threads = num_threads
+        self._interpreters = {}
+        self.model_size = len(self._content)
+
+    def _interpreter(self, size):
+        if size not in self._interpreters:
+            interpreter = self._interpreter_class(model_content=self._content, num_threads=self.num_threads)
+            input_index = interpreter.get_input_details()[0]['index']
+            interpreter.resize_tensor_input(input_index, [size, IMG_SIZE, IMG_SIZE, 3])
+            interpreter.allocate_tensors()
+            self._interpreters[size] = interpreter
+        return self._interpreters[size]
+
+    def predict_batch(self, batch):
+        n = len(batch)
+        size = 1 << (n - 1).bit_length()
+        interpreter = self._interpreter(size)
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+
+        if size != n:
+            batch = np.concatenate([batch, np.zeros((size - n, *batch.shape[1:]), dtype=batch.dtype)])
+        scale, zero_point = input_details['quantization']
+        if input_details['dtype'] != np.float32 and scale:
+            batch = np.clip(np.round(batch / scale + zero_point),
+                            np.iinfo(input_details['dtype']).min, np.iinfo(input_details['dtype']).max)
+        interpreter.set_tensor(input_details['index'], batch.astype(input_details['dtype']))
+        interpreter.invoke()
+
+        output = interpreter.get_tensor(output_details['index'])[:n]
+        scale, zero_point = output_details['quantization']
+        if output_details['dtype'] != np.float32 and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+class OnnxRunner:
+    backend = "onnx"
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_size = os.path.getsize(path)
+
+    def predict_batch(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def _export_is_current(path, source_path):
+    """True when the export at `path` exists and was made from the current .h5."""
+    if not os.path.exists(path) or not os.path.exists(export_meta_path(path)):
+        return False
+    if os.path.exists(source_path):
+        with open(export_meta_path(path)) as f:
+            recorded = json.load(f).get("source_sha256")
+        if recorded != file_sha256(source_path):
+            print(f"⚠️ {os.path.basename(path)} was not exported from the current {os.path.basename(source_path)}; "
+                  f"re-run export_disease_model.py. Skipping it.")
+            return False
+    return True
+
+
+def load_disease_runner(models_dir, backend='auto', num_threads=None):
+    """The runner for the configured backend, or None when no CNN is available.
+    'auto' prefers an up-to-date TFLite export, then ONNX, then the Keras .h5."""
+    h5_path = os.path.join(models_dir, 'disease_model.h5')
+    candidates = ["tflite", "onnx", "keras"] if backend == 'auto' else [backend]
+    for candidate in candidates:
+        if candidate == "keras":
+            if not os.path.exists(h5_path):
+                continue
+            import tensorflow as tf
+            return KerasRunner(tf.keras.models.load_model(h5_path))
+
+        path = os.path.join(models_dir, EXPORT_FILES[candidate])
+        if not _export_is_current(path, h5_path):
+            continue
+        try:
+            if candidate == "tflite":
+                return TFLiteRunner(path, num_threads)
+            return OnnxRunner(path, num_threads)
+        except ImportError as e:
+            # The runtime for this export isn't installed; try the next one
+            print(f"ℹ️ {EXPORT_FILES[candidate]} present but its runtime is unavailable: {e}")
+    return None
@@ -3,6 +3,16 @@ from datetime import datetime
 
 class MarketPrice(db.Model):
     __tablename__ = 'market_prices'
+    __table_args__ = (
+        # One row per market report; the sync upserts on this key
+        db.Index('uq_market_prices_natural_key', 'state', 'market', 'commodity', 'arrival_date', unique=True),
+        # get_market_insights: WHERE state, market, commodity ORDER BY id DESC
+        db.Index('idx_market_prices_lookup', 'state', 'market', 'commodity', 'id'),
+        # get_markets: DISTINCT market WHERE state
+        db.Index('idx_market_prices_state_market', 'state', 'market'),
+        # get_crops: DISTINCT commodity WHERE market
+        db.Index('idx_market_prices_market_commodity', 'market', 'commodity'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     state = db.Column(db.String(100), nullable=False)
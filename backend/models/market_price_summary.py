@@ -0,0 +1,36 @@
+from extensions import db
+from datetime import datetime
+
+class MarketPriceSummary(db.Model):
+    """Rolling price statistics per (state, market, commodity), rewritten at sync
+    time so insight reads never scan price history."""
+    __tablename__ = 'market_price_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('state', 'market', 'commodity', name='uq_market_price_summary'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(100), nullable=False)
+    market = db.Column(db.String(100), nullable=False)
+    commodity = db.Column(db.String(100), nullable=False)
+    latest_price_id = db.Column(db.Integer, nullable=True)
+    latest_price = db.Column(db.Float, nullable=True)
+    previous_price = db.Column(db.Float, nullable=True)
+    latest_arrival_date = db.Column(db.String(50), nullable=True)
+    avg_7d = db.Column(db.Float, nullable=True)
+    avg_30d = db.Column(db.Float, nullable=True)
+    # Standard deviation of modal prices over 30 days as a percentage of their mean
+    volatility_30d = db.Column(db.Float, nullable=True)
+    samples_30d = db.Column(db.Integer, nullable=True)
+    trend = db.Column(db.String(20), nullable=False, default='stable')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "previous_price": self.previous_price,
+            "avg_7d": self.avg_7d,
+            "avg_30d": self.avg_30d,
+            "volatility_30d": self.volatility_30d,
+            "samples_30d": self.samples_30d,
+            "trend": self.trend
+        }
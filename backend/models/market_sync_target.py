@@ -0,0 +1,44 @@
+from extensions import db
+
+class MarketSyncTarget(db.Model):
+    """A (state, market, commodity) tuple the background sync keeps fresh.
+    Empty strings act as wildcards: ('Punjab', '', '') is a state-wide sync
+    and ('', '', '') is the initial nationwide fetch."""
+    __tablename__ = 'market_sync_targets'
+    __table_args__ = (
+        db.UniqueConstraint('state', 'market', 'commodity', name='uq_market_sync_target'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(100), nullable=False, default='')
+    market = db.Column(db.String(100), nullable=False, default='')
+    commodity = db.Column(db.String(100), nullable=False, default='')
+    # Request count with exponential decay, used to rank tuples by popularity
+    demand = db.Column(db.Float, nullable=False, default=0.0)
+    last_requested_at = db.Column(db.DateTime, nullable=True)
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.String(20), nullable=True)
+    last_records = db.Column(db.Integer, nullable=True)
+    last_latency_ms = db.Column(db.Integer, nullable=True)
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "market": self.market,
+            "commodity": self.commodity,
+            "demand": round(self.demand or 0, 2),
+            "last_requested_at": self.last_requested_at.isoformat() if self.last_requested_at else None,
+            "last_synced_at": self.last_synced_at.isoformat() if self.last_synced_at else None,
+            "last_status": self.last_status,
+            "last_records": self.last_records,
+            "last_latency_ms": self.last_latency_ms
+        }
+
+
+class MarketSyncState(db.Model):
+    """Timestamps shared by every process running the market sync (in-app
+    scheduler, market_sync_worker.py), e.g. when demand was last decayed."""
+    __tablename__ = 'market_sync_state'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.DateTime, nullable=False)
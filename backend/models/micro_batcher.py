@@ -0,0 +1,102 @@
+"""
+Micro-batching for per-request model inference.
+
+Requests that arrive within a few milliseconds of each other are gathered
+into one batch and run through the model together, so a burst of uploads
+costs one forward pass instead of one per image. A single worker thread
+owns the model: the first queued item opens a window of `max_wait_ms`, the
+batch closes when the window ends or `max_batch_size` items are queued, and
+every caller gets its own row of the output back.
+
+The worker thread is started on first use in each process, so the batcher is
+safe to create before gunicorn forks.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_size=16, max_wait_ms=5.0, name='batcher'):
+        """predict_batch(inputs) takes an array stacked along a new first axis and
+        returns one output row per input."""
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            # A forked child inherits the queue object but not the thread
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def submit(self, item):
+        """Queue one input; the returned Future resolves to its output row."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Callers that gave up (cancelled futures) are dropped from the batch
+            live = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            items = [item for item, _ in live]
+            futures = [future for _, future in live]
+            try:
+                outputs = self.predict_batch(np.stack(items))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            self.largest_batch = max(self.largest_batch, len(items))
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
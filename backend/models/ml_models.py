@@ -4,13 +4,38 @@ Loads real trained scikit-learn/TensorFlow models with Gemini fallback.
 """
 import os
 import json
+import threading
 import numpy as np
-import joblib
+
+from models.cnn_runtime import BACKENDS, EXPORT_FILES, export_meta_path, load_disease_runner, preprocess_leaf_image
+from models.micro_batcher import MicroBatcher
+from models.model_registry import model_registry
+from models.tree_arrays import load_tree_model, load_label_encoder, trees_path, classes_path
+from services.image_cache import image_cache
+from services.prediction_cache import prediction_cache, quantize
 
 # Paths
 ML_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml' if os.path.exists(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml')) else '')
 SAVED_MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ml', 'saved_models')
 
+# Models served by the flat-array engine from their memory-mapped .trees export
+# (see models/tree_arrays.py) instead of the scikit-learn pickle. Predictions are
+# identical; single-row latency is far lower and gunicorn workers share one copy
+# of the node arrays. Comma separated: crop, fertilizer, yield.
+MODEL_MMAP = {name.strip() for name in os.getenv('MODEL_MMAP', '').split(',') if name.strip()}
+
+# Disease CNN runtime: auto (an up-to-date TFLite/ONNX export, else the Keras .h5),
+# keras, tflite or onnx. See models/cnn_runtime.py and export_disease_model.py.
+DISEASE_MODEL_BACKEND = os.getenv('DISEASE_MODEL_BACKEND', 'auto')
+DISEASE_MODEL_THREADS = int(os.getenv('DISEASE_MODEL_THREADS', 0)) or None
+# Concurrent uploads arriving within DISEASE_BATCH_WAIT_MS of each other share
+# one forward pass of up to DISEASE_BATCH_MAX_SIZE images (1, the default, disables
+# batching). Only worth enabling when each process serves several requests at once
+# (GUNICORN_THREADS > 1, i.e. gthread workers): a sync worker handles one request at
+# a time, so its batches always hold one image and every request just waits out the window.
+DISEASE_BATCH_MAX_SIZE = int(os.getenv('DISEASE_BATCH_MAX_SIZE', 1))
+DISEASE_BATCH_WAIT_MS = float(os.getenv('DISEASE_BATCH_WAIT_MS', 5))
+
 
 # ═══════════════════════════════════════════════════════════════════
 # 1. CROP RECOMMENDATION — RandomForestClassifier
@@ -19,6 +44,8 @@ class CropRecommender:
     def __init__(self):
         self.model = None
         self.label_encoder = None
+        self.class_names = None
+        self.model_version = ''
         self._load_model()
     
     def _load_model(self):
@@ -26,8 +53,13 @@ class CropRecommender:
             model_path = os.path.join(SAVED_MODELS_DIR, 'crop_model.pkl')
             encoder_path = os.path.join(SAVED_MODELS_DIR, 'crop_label_encoder.pkl')
             if os.path.exists(model_path) and os.path.exists(encoder_path):
-                self.model = joblib.load(model_path)
-                self.label_encoder = joblib.load(encoder_path)
+                flat = 'crop' in MODEL_MMAP
+                self.model = load_tree_model(model_path, flat)
+                self.label_encoder = load_label_encoder(encoder_path, flat)
+                # Decode the forest's class columns once so predictions can be
+                # mapped back to crop names with plain array indexing
+                labels = self.label_encoder.inverse_transform(self.model.classes_)
+                self.class_names = np.array([str(label).capitalize() for label in labels])
                 print("✅ Crop RandomForest model loaded")
             else:
                 print("⚠️ Crop model files not found — using Gemini fallback")
@@ -40,16 +72,47 @@ class CropRecommender:
         Returns: (crop_name: str, confidence: float)
         """
         if self.model is not None and self.label_encoder is not None:
-            features = np.array(data).reshape(1, -1) if len(np.array(data).shape) == 1 else data
-            pred_idx = self.model.predict(features)[0]
-            proba = self.model.predict_proba(features)[0]
-            confidence = float(round(max(proba), 4))
-            crop_name = self.label_encoder.inverse_transform([pred_idx])[0]
-            return crop_name.capitalize(), confidence
+            features = quantize(np.asarray(data, dtype=float).ravel())
+            return prediction_cache.get_or_compute(
+                'crop', (self.model_version, features), lambda: self._predict_ml(features)
+            )
         
         # Gemini fallback
         return self._gemini_fallback(data)
     
+    def _predict_ml(self, features):
+        # RandomForest.predict is argmax(predict_proba), so one pass gives both
+        proba = self.model.predict_proba(np.array([features]))[0]
+        best = int(np.argmax(proba))
+        return str(self.class_names[best]), float(round(proba[best], 4))
+    
+    def predict_many(self, data, top_k=3):
+        """
+        data: numpy array of shape (N, 7) — one [N, P, K, temp, humidity, ph, rainfall] row per farm
+        Returns: list of N lists, each holding up to top_k (crop_name, confidence) pairs, best first
+        """
+        features = np.asarray(data, dtype=float)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        
+        if self.model is not None and self.label_encoder is not None:
+            proba = self.model.predict_proba(features)
+            k = max(1, min(int(top_k), proba.shape[1]))
+            # argpartition keeps this O(classes) per row; only the k winners get sorted
+            top_idx = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+            top_proba = np.take_along_axis(proba, top_idx, axis=1)
+            order = np.argsort(-top_proba, axis=1, kind='stable')
+            top_idx = np.take_along_axis(top_idx, order, axis=1)
+            top_proba = np.round(np.take_along_axis(top_proba, order, axis=1), 4)
+            top_names = self.class_names[top_idx]
+            return [
+                [(str(name), float(conf)) for name, conf in zip(names, confs)]
+                for names, confs in zip(top_names, top_proba)
+            ]
+        
+        # Gemini fallback (one call per row)
+        return [[self._gemini_fallback(row)] for row in features]
+    
     def _gemini_fallback(self, data):
         try:
             from services.gemini_service import gemini_service
@@ -77,16 +140,18 @@ class FertilizerRecommender:
         self.le_soil = None
         self.le_crop = None
         self.le_fert = None
+        self.model_version = ''
         self._load_model()
     
     def _load_model(self):
         try:
             base = SAVED_MODELS_DIR
             if os.path.exists(os.path.join(base, 'fertilizer_model.pkl')):
-                self.model = joblib.load(os.path.join(base, 'fertilizer_model.pkl'))
-                self.le_soil = joblib.load(os.path.join(base, 'fertilizer_soil_encoder.pkl'))
-                self.le_crop = joblib.load(os.path.join(base, 'fertilizer_crop_encoder.pkl'))
-                self.le_fert = joblib.load(os.path.join(base, 'fertilizer_label_encoder.pkl'))
+                flat = 'fertilizer' in MODEL_MMAP
+                self.model = load_tree_model(os.path.join(base, 'fertilizer_model.pkl'), flat)
+                self.le_soil = load_label_encoder(os.path.join(base, 'fertilizer_soil_encoder.pkl'), flat)
+                self.le_crop = load_label_encoder(os.path.join(base, 'fertilizer_crop_encoder.pkl'), flat)
+                self.le_fert = load_label_encoder(os.path.join(base, 'fertilizer_label_encoder.pkl'), flat)
                 print("✅ Fertilizer DecisionTree model loaded")
             else:
                 print("⚠️ Fertilizer model files not found — using Gemini fallback")
@@ -100,25 +165,40 @@ class FertilizerRecommender:
         """
         if self.model is not None:
             try:
-                # Encode categoricals safely
-                soil_enc = self._safe_encode(self.le_soil, soil_type, 'Loamy')
-                crop_enc = self._safe_encode(self.le_crop, crop.lower(), 'rice')
-                
-                features = np.array([[
-                    temperature, humidity, moisture,
-                    soil_enc, crop_enc,
-                    float(data[0]), float(data[1]), float(data[2])
-                ]])
-                
-                pred_idx = self.model.predict(features)[0]
-                fertilizer = self.le_fert.inverse_transform([pred_idx])[0]
-                return fertilizer
-            except Exception as e:
+                numeric = quantize([temperature, humidity, moisture, data[0], data[1], data[2]])
+                key = (self.model_version, numeric, str(crop).lower(), str(soil_type))
+                fertilizer = prediction_cache.get_or_compute(
+                    'fertilizer', key, lambda: self._predict_ml(numeric, str(crop).lower(), str(soil_type)),
+                    cacheable=lambda result: result is not None
+                )
+                if fertilizer is not None:
+                    return fertilizer
+            except (TypeError, ValueError, IndexError) as e:
                 print(f"Fertilizer ML prediction error: {e}")
         
         # Gemini fallback
         return self._gemini_fallback(data)
     
+    def _predict_ml(self, numeric, crop, soil_type):
+        """Fertilizer name from the DecisionTree, or None if prediction fails."""
+        try:
+            temperature, humidity, moisture, n, p, k = numeric
+            # Encode categoricals safely
+            soil_enc = self._safe_encode(self.le_soil, soil_type, 'Loamy')
+            crop_enc = self._safe_encode(self.le_crop, crop, 'rice')
+            
+            features = np.array([[
+                temperature, humidity, moisture,
+                soil_enc, crop_enc,
+                n, p, k
+            ]])
+            
+            pred_idx = self.model.predict(features)[0]
+            return str(self.le_fert.inverse_transform([pred_idx])[0])
+        except Exception as e:
+            print(f"Fertilizer ML prediction error: {e}")
+            return None
+    
     def _safe_encode(self, encoder, value, default):
         try:
             return encoder.transform([value])[0]
@@ -144,14 +224,16 @@ class YieldPredictor:
     def __init__(self):
         self.model = None
         self.le_crop = None
+        self.model_version = ''
         self._load_model()
     
     def _load_model(self):
         try:
             base = SAVED_MODELS_DIR
             if os.path.exists(os.path.join(base, 'yield_model.pkl')):
-                self.model = joblib.load(os.path.join(base, 'yield_model.pkl'))
-                self.le_crop = joblib.load(os.path.join(base, 'yield_crop_encoder.pkl'))
+                flat = 'yield' in MODEL_MMAP
+                self.model = load_tree_model(os.path.join(base, 'yield_model.pkl'), flat)
+                self.le_crop = load_label_encoder(os.path.join(base, 'yield_crop_encoder.pkl'), flat)
                 print("✅ Yield GradientBoosting model loaded")
             else:
                 print("⚠️ Yield model files not found — using Gemini fallback")
@@ -165,22 +247,36 @@ class YieldPredictor:
         """
         if self.model is not None:
             try:
-                crop_enc = self._safe_encode(self.le_crop, crop_name.lower(), 'rice')
-                area = float(data[1])
-                rainfall = float(data[2])
-                fertilizer = float(data[3])
-                temperature = float(data[4]) if len(data) > 4 else 25.0
-                humidity = float(data[5]) if len(data) > 5 else 70.0
-                
-                features = np.array([[crop_enc, area, rainfall, fertilizer, temperature, humidity]])
-                pred = self.model.predict(features)[0]
-                return round(float(pred), 2)
-            except Exception as e:
+                numeric = quantize([
+                    data[1], data[2], data[3],
+                    data[4] if len(data) > 4 else 25.0,
+                    data[5] if len(data) > 5 else 70.0
+                ])
+                key = (self.model_version, numeric, str(crop_name).lower())
+                predicted = prediction_cache.get_or_compute(
+                    'yield', key, lambda: self._predict_ml(numeric, str(crop_name).lower()),
+                    cacheable=lambda result: result is not None
+                )
+                if predicted is not None:
+                    return predicted
+            except (TypeError, ValueError, IndexError) as e:
                 print(f"Yield ML prediction error: {e}")
         
         # Gemini fallback
         return self._gemini_fallback(data)
     
+    def _predict_ml(self, numeric, crop_name):
+        """Yield in tons from the GradientBoosting model, or None if prediction fails."""
+        try:
+            area, rainfall, fertilizer, temperature, humidity = numeric
+            crop_enc = self._safe_encode(self.le_crop, crop_name, 'rice')
+            features = np.array([[crop_enc, area, rainfall, fertilizer, temperature, humidity]])
+            pred = self.model.predict(features)[0]
+            return round(float(pred), 2)
+        except Exception as e:
+            print(f"Yield ML prediction error: {e}")
+            return None
+    
     def _safe_encode(self, encoder, value, default):
         try:
             return encoder.transform([value])[0]
@@ -222,22 +318,27 @@ class SoilHealthAnalyzer:
         advice = f"Soil Health Score: {health_score}/100 ({status}). "
         advice += " ".join(result['recommendations'])
         
-        # Get AI-enhanced advice
-        recommended_crops = self._get_crop_suggestions(n, p, k, ph)
-        
-        # Try to get richer advice from Gemini
+        # Try to get richer advice from Gemini; start the call first and build the
+        # rule-based crop suggestions while it is in flight
+        advice_future = None
         try:
             from services.gemini_service import gemini_service
             prompt = f"""Analyze soil: N:{n}, P:{p}, K:{k}, pH:{ph}, Moisture:{moisture}%.
             Health Score: {health_score}/100 ({status}).
             Deficiencies: {', '.join(result['deficiencies']) if result['deficiencies'] else 'None'}.
             Give 2-3 sentences of practical advice for an Indian farmer. Return plain text only."""
-            ai_advice = gemini_service.generate_response(prompt, language)
-            if ai_advice:
-                advice = f"Score: {health_score}/100. {ai_advice.strip()}"
+            advice_future = gemini_service.submit(gemini_service.generate_response, prompt, language)
         except Exception:
             pass
         
+        recommended_crops = self._get_crop_suggestions(n, p, k, ph)
+        
+        # Keep the rule-based advice if Gemini fails or misses its deadline
+        if advice_future is not None:
+            ai_advice = gemini_service.gather([advice_future])[0]
+            if ai_advice:
+                advice = f"Score: {health_score}/100. {ai_advice.strip()}"
+        
         return status, advice, recommended_crops, health_score, result
     
     def _get_crop_suggestions(self, n, p, k, ph):
@@ -264,8 +365,12 @@ class SoilHealthAnalyzer:
 class DiseaseDetector:
     def __init__(self):
         self.cnn_model = None
+        self.backend = None
+        self.batcher = None
         self.class_names = []
         self.treatments = {}
+        self.model_version = ''
+        self._lock = threading.Lock()
         self._load_model()
     
     def _load_model(self):
@@ -279,21 +384,42 @@ class DiseaseDetector:
                 self.treatments = config.get('treatments', {})
             
             # Try loading CNN model
-            model_path = os.path.join(SAVED_MODELS_DIR, 'disease_model.h5')
-            if os.path.exists(model_path):
-                import tensorflow as tf
-                self.cnn_model = tf.keras.models.load_model(model_path)
-                print("✅ Disease CNN (MobileNetV2) model loaded")
+            if DISEASE_MODEL_BACKEND != 'auto' and DISEASE_MODEL_BACKEND not in BACKENDS:
+                print(f"⚠️ DISEASE_MODEL_BACKEND: unknown backend '{DISEASE_MODEL_BACKEND}', using auto")
+            backend = DISEASE_MODEL_BACKEND if DISEASE_MODEL_BACKEND in BACKENDS else 'auto'
+            self.cnn_model = load_disease_runner(SAVED_MODELS_DIR, backend, DISEASE_MODEL_THREADS)
+            if self.cnn_model is not None:
+                self.backend = self.cnn_model.backend
+                if DISEASE_BATCH_MAX_SIZE > 1:
+                    self.batcher = MicroBatcher(
+                        self.cnn_model.predict_batch, DISEASE_BATCH_MAX_SIZE, DISEASE_BATCH_WAIT_MS, name='disease-cnn'
+                    )
+                print(f"✅ Disease CNN (MobileNetV2) model loaded ({self.backend})")
             else:
                 print("ℹ️ No CNN model — using Gemini Vision for disease detection")
         except Exception as e:
             print(f"⚠️ Disease model loading: {e}")
     
+    def predict_probabilities(self, image_data):
+        """Class probabilities for one PIL image, batched with concurrent requests."""
+        img_array = preprocess_leaf_image(image_data)
+        if self.batcher is not None:
+            return self.batcher.predict(img_array)
+        with self._lock:
+            return self.cnn_model.predict_batch(img_array[np.newaxis])[0]
+    
     def predict(self, image_data, language='en'):
         """
         image_data: PIL Image
         Returns: (disease_name, symptoms, treatment_steps)
+        Near-identical photos are answered from the image cache (services/image_cache.py).
         """
+        return image_cache.get_or_compute(
+            'disease', image_data, (language, self.model_version), lambda: self._predict(image_data, language),
+            cacheable=lambda result: result[0] != "Unknown"
+        )
+    
+    def _predict(self, image_data, language):
         # Try CNN first (if model exists)
         if self.cnn_model is not None and image_data is not None:
             try:
@@ -306,15 +432,9 @@ class DiseaseDetector:
     
     def _cnn_predict(self, image_data, language):
         """Run MobileNetV2 CNN inference."""
-        import tensorflow as tf
-        
-        img = image_data.resize((224, 224))
-        img_array = np.array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        predictions = self.cnn_model.predict(img_array, verbose=0)
-        pred_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][pred_idx])
+        predictions = self.predict_probabilities(image_data)
+        pred_idx = np.argmax(predictions)
+        confidence = float(predictions[pred_idx])
         
         disease_name = self.class_names[pred_idx] if pred_idx < len(self.class_names) else "Unknown"
         
@@ -347,12 +467,34 @@ class DiseaseDetector:
 
 
 # ═══════════════════════════════════════════════════════════════════
-# SINGLETON INSTANCES
+# SINGLETON INSTANCES — built on first use (see models/model_registry.py)
 # ═══════════════════════════════════════════════════════════════════
-print("\n🧠 Loading ML Models...")
-crop_model = CropRecommender()
-fertilizer_model = FertilizerRecommender()
-yield_model = YieldPredictor()
-soil_model = SoilHealthAnalyzer()
-disease_model = DiseaseDetector()
-print("🧠 All models ready!\n")
+def _artifacts(*pickles):
+    """Files a tree model is built from: its pickles and their flat exports."""
+    paths = []
+    for name in pickles:
+        path = os.path.join(SAVED_MODELS_DIR, name)
+        paths += [path, os.path.join(trees_path(path), 'meta.json'), classes_path(path)]
+    return paths
+
+
+model_registry.register('crop', CropRecommender, _artifacts('crop_model.pkl', 'crop_label_encoder.pkl'))
+model_registry.register('fertilizer', FertilizerRecommender, _artifacts(
+    'fertilizer_model.pkl', 'fertilizer_soil_encoder.pkl', 'fertilizer_crop_encoder.pkl', 'fertilizer_label_encoder.pkl'
+))
+model_registry.register('yield', YieldPredictor, _artifacts('yield_model.pkl', 'yield_crop_encoder.pkl'))
+model_registry.register('soil', SoilHealthAnalyzer)
+model_registry.register('disease', DiseaseDetector, [
+    os.path.join(SAVED_MODELS_DIR, 'disease_model.h5'), os.path.join(SAVED_MODELS_DIR, 'disease_classes.json')
+] + [
+    path for name in EXPORT_FILES.values()
+    for path in (os.path.join(SAVED_MODELS_DIR, name), export_meta_path(os.path.join(SAVED_MODELS_DIR, name)))
+])
+# Cached predictions of a reloaded model are stale
+model_registry.on_reload(prediction_cache.invalidate)
+
+crop_model = model_registry.lazy('crop')
+fertilizer_model = model_registry.lazy('fertilizer')
+yield_model = model_registry.lazy('yield')
+soil_model = model_registry.lazy('soil')
+disease_model = model_registry.lazy('disease')
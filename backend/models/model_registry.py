@@ -0,0 +1,145 @@
+"""
+Lazy registry for the ML model singletons.
+
+Each model is registered with a factory and built the first time it is used,
+so a worker that only serves market or location requests never unpickles a
+forest or imports TensorFlow. Loading is guarded by a per-model lock, so
+concurrent first requests build a model exactly once.
+
+Names listed in MODEL_PRELOAD (config) are built at app import. Under
+gunicorn with preload_app (gunicorn.conf.py) that happens once in the master,
+and the forked workers share the loaded, read-only model pages copy-on-write.
+
+A model may list the artifact files it is built from. Their size and mtime
+are fingerprinted into `model_version` on each built instance, and checked
+again at most every MODEL_RELOAD_CHECK_SECONDS: when the files change (a
+retrain or re-export) the model is rebuilt and reload listeners, such as
+the prediction cache, are told to drop results from the old version.
+"""
+import hashlib
+import os
+import threading
+import time
+
+MODEL_RELOAD_CHECK_SECONDS = float(os.getenv('MODEL_RELOAD_CHECK_SECONDS', 30))
+
+
+def files_version(paths):
+    """Short fingerprint of the files' sizes and mtimes ('' when none exist)."""
+    parts = []
+    for path in sorted(paths):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+    if not parts:
+        return ''
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._factories = {}
+        self._files = {}
+        self._instances = {}
+        self._versions = {}
+        self._checked_at = {}
+        self._locks = {}
+        self._timings = {}
+        self._listeners = []
+        self._guard = threading.Lock()
+
+    def register(self, name, factory, files=()):
+        """Register `factory()` as the builder for `name`, built from `files`. Nothing is loaded yet."""
+        with self._guard:
+            self._factories[name] = factory
+            self._files[name] = tuple(files)
+            self._locks[name] = threading.Lock()
+
+    def on_reload(self, callback):
+        """Call `callback(name)` whenever a loaded model is rebuilt because its files changed."""
+        self._listeners.append(callback)
+
+    def _files_changed(self, name):
+        if MODEL_RELOAD_CHECK_SECONDS <= 0 or not self._files[name]:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at.get(name, 0.0) < MODEL_RELOAD_CHECK_SECONDS:
+            return False
+        self._checked_at[name] = now
+        return files_version(self._files[name]) != self._versions.get(name)
+
+    def get(self, name):
+        """The model instance for `name`, building it on first use or after its files change."""
+        instance = self._instances.get(name)
+        if instance is not None and not self._files_changed(name):
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._locks[name]:
+            current = self._instances.get(name)
+            version = files_version(self._files[name])
+            if current is not None and version == self._versions.get(name):
+                return current
+            if current is not None:
+                print(f"🧠 Model '{name}' files changed; reloading")
+
+            start = time.perf_counter()
+            instance = self._factories[name]()
+            instance.model_version = version
+            self._timings[name] = {
+                "load_seconds": round(time.perf_counter() - start, 3),
+                "loaded_at": time.time(),
+                "pid": os.getpid(),
+                "version": version
+            }
+            print(f"🧠 Model '{name}' ready in {self._timings[name]['load_seconds']}s")
+            self._versions[name] = version
+            self._checked_at[name] = time.monotonic()
+            self._instances[name] = instance
+        if current is not None:
+            for callback in self._listeners:
+                callback(name)
+        return instance
+
+    def lazy(self, name):
+        """A stand-in that loads `name` on first attribute access."""
+        return LazyModel(self, name)
+
+    def preload(self, names):
+        """Build the named models now; unknown names are reported and skipped."""
+        for name in names:
+            if name not in self._factories:
+                print(f"⚠️ MODEL_PRELOAD: unknown model '{name}'")
+                continue
+            self.get(name)
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def stats(self):
+        return {
+            name: {"loaded": name in self._instances, **self._timings.get(name, {})}
+            for name in self._factories
+        }
+
+
+class LazyModel:
+    """Forwards attribute access to the registry's instance, so `crop_model.predict(...)`
+    keeps working for callers that imported the module-level singleton."""
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._registry.is_loaded(self._name) else "not loaded"
+        return f"<LazyModel {self._name} ({state})>"
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,333 @@
+"""
+Flat NumPy storage for the tree models in ml/saved_models.
+
+scikit-learn copies every tree's nodes into its own buffers when a pickle is
+loaded (even with joblib mmap_mode='r'), so each gunicorn worker holds a
+private copy of every forest. This module exports a fitted model's nodes into
+plain .npy files instead, compiled for TreeModel's traversal (see
+_compile_arrays):
+
+    <name>.trees/
+        split_feature.npy    int64   feature tested per node, 0 at leaves
+        split_threshold.npy  float64 threshold per node, +inf at leaves
+        children.npy         int64   (right, left) child pairs, leaves pointing at themselves
+        leaf_output.npy      float64 per-node output as it is accumulated
+                                     (class probabilities or regression value)
+        roots.npy            int32   index of each tree's root node
+        meta.json            model kind, classes, learning rate, max depth, source pickle hash, ...
+
+Exports written before the compiled arrays existed hold sklearn's node layout
+instead (feature.npy, threshold.npy, left.npy, right.npy and value.npy next to
+roots.npy, see ARRAYS); TreeModel compiles those in memory when it loads them.
+
+The trees of an ensemble are concatenated into single arrays. TreeModel opens
+them with mmap_mode='r' and traverses the compiled arrays in place, so every
+worker maps the same page-cache pages instead of building its own copies, and
+predicts with the same float32/float64 arithmetic as scikit-learn.
+
+Label encoders are exported as <name>.classes.json and served by LabelCodes,
+so a worker using flat models never imports scikit-learn at all.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+COMPILED = ("split_feature", "split_threshold", "children", "leaf_output")
+
+FOREST_CLASSIFIER = "forest_classifier"
+TREE_CLASSIFIER = "tree_classifier"
+GB_REGRESSOR = "gb_regressor"
+
+
+def trees_path(pickle_path):
+    """Directory holding the flat export of a model pickle (crop_model.pkl -> crop_model.trees)."""
+    return os.path.splitext(pickle_path)[0] + '.trees'
+
+
+def classes_path(pickle_path):
+    """JSON file holding a label encoder's classes (crop_label_encoder.pkl -> crop_label_encoder.classes.json)."""
+    return os.path.splitext(pickle_path)[0] + '.classes.json'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _flatten(trees):
+    """Concatenate sklearn Tree objects into absolute-indexed node arrays."""
+    parts = {name: [] for name in ARRAYS}
+    offset = 0
+    for tree in trees:
+        n = tree.node_count
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        parts["feature"].append(tree.feature.astype(np.int32))
+        parts["threshold"].append(tree.threshold.astype(np.float64))
+        parts["left"].append(np.where(left == -1, -1, left + offset).astype(np.int32))
+        parts["right"].append(np.where(right == -1, -1, right + offset).astype(np.int32))
+        parts["value"].append(tree.value.reshape(n, -1).astype(np.float64))
+        parts["roots"].append(np.array([offset], dtype=np.int32))
+        offset += n
+    return {name: np.ascontiguousarray(np.concatenate(chunks)) for name, chunks in parts.items()}
+
+
+def _max_depth(left, right, roots, leaf):
+    depth = 0
+    frontier = roots
+    while not leaf[frontier].all():
+        frontier = np.concatenate([left[frontier[~leaf[frontier]]], right[frontier[~leaf[frontier]]]])
+        depth += 1
+    return depth
+
+
+def _compile_arrays(arrays, meta):
+    """
+    Node arrays for a branch-free traversal: leaves become self-loops on an
+    always-true split, so every tree advances one level per step for exactly
+    max-depth steps. Index arrays are int64 (np.take's native index type on
+    64-bit platforms) so they can be used straight from the memory map.
+    Returns (compiled arrays, max depth).
+    """
+    feature, left, right = arrays["feature"], arrays["left"], arrays["right"]
+    leaf = feature < 0
+    nodes = np.arange(len(feature), dtype=np.int64)
+    compiled = {
+        "split_feature": np.where(leaf, 0, feature).astype(np.int64),
+        # X <= inf always holds (NaN aside), and both children of a leaf are the leaf itself
+        "split_threshold": np.where(leaf, np.inf, arrays["threshold"]).astype(np.float64),
+        # children[2 * node] is taken when the split test is False (right), [2 * node + 1] when True (left)
+        "children": np.stack([np.where(leaf, nodes, right), np.where(leaf, nodes, left)], axis=1)
+                      .ravel().astype(np.int64),
+    }
+    # Per-leaf outputs in the dtype/shape they are accumulated in
+    if meta["kind"] == GB_REGRESSOR:
+        compiled["leaf_output"] = meta["learning_rate"] * np.asarray(arrays["value"][:, 0], dtype=np.float64)
+    else:
+        compiled["leaf_output"] = np.asarray(arrays["value"], dtype=np.float64)
+    return compiled, _max_depth(left, right, np.asarray(arrays["roots"]), leaf)
+
+
+def _model_arrays(model, source=None):
+    """sklearn's node layout (ARRAYS) of a fitted RandomForestClassifier,
+    DecisionTreeClassifier or squared-error GradientBoostingRegressor, and its meta."""
+    kind = type(model).__name__
+    meta = {"n_features": int(model.n_features_in_)}
+    if source:
+        meta["source_sha256"] = file_sha256(source)
+
+    if kind == "RandomForestClassifier":
+        estimators = model.estimators_
+        meta["kind"] = FOREST_CLASSIFIER
+    elif kind == "DecisionTreeClassifier":
+        estimators = [model]
+        meta["kind"] = TREE_CLASSIFIER
+    elif kind == "GradientBoostingRegressor":
+        if model.loss != "squared_error":
+            raise ValueError(f"Only squared_error gradient boosting can be exported, not {model.loss}")
+        estimators = list(model.estimators_[:, 0])
+        meta["kind"] = GB_REGRESSOR
+        meta["learning_rate"] = float(model.learning_rate)
+        meta["init"] = 0.0 if model.init_ == "zero" else float(np.ravel(model.init_.constant_)[0])
+    else:
+        raise ValueError(f"Unsupported model type: {kind}")
+
+    if meta["kind"] != GB_REGRESSOR:
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output classifiers can be exported")
+        meta["classes"] = model.classes_.tolist()
+
+    arrays = _flatten([estimator.tree_ for estimator in estimators])
+    if meta["kind"] == FOREST_CLASSIFIER:
+        # Each forest member votes with its normalised leaf distribution, exactly
+        # as DecisionTreeClassifier.predict_proba computes it
+        value = arrays["value"]
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        arrays["value"] = value / normalizer
+    meta["n_trees"] = len(estimators)
+    meta["n_nodes"] = int(arrays["feature"].shape[0])
+    return arrays, meta
+
+
+def export_tree_model(model, out_dir, source=None):
+    """Write a fitted RandomForestClassifier, DecisionTreeClassifier or squared-error
+    GradientBoostingRegressor to out_dir in the layout described above. `source`
+    is the pickle it came from; its hash lets loaders detect a stale export."""
+    arrays, meta = _model_arrays(model, source)
+    compiled, meta["max_depth"] = _compile_arrays(arrays, meta)
+    # Only the compiled arrays are kept: leaf_output would otherwise duplicate value
+    compiled["roots"] = arrays["roots"]
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, array in compiled.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def export_label_encoder(encoder, path, source=None):
+    exported = {"classes": encoder.classes_.tolist()}
+    if source:
+        exported["source_sha256"] = file_sha256(source)
+    with open(path, 'w') as f:
+        json.dump(exported, f)
+
+
+class TreeModel:
+    """Predicts from a flat export. Exposes the parts of the sklearn API the app uses:
+    classes_, n_features_in_, predict_proba (classifiers) and predict.
+
+    It traverses the compiled arrays (see _compile_arrays) straight from the
+    memory map: every tree of the ensemble advances one level per step, for
+    all rows at once, for exactly max-depth steps. Tree outputs are then added
+    strictly in tree order, as scikit-learn does, so results are bit-for-bit
+    identical to the fitted model's (benchmark_tree_models.py checks this on
+    the bundled datasets). Exports written before the compiled arrays existed
+    are compiled in memory at load instead."""
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.kind = self.meta["kind"]
+        self.n_features_in_ = self.meta["n_features"]
+        if "classes" in self.meta:
+            self.classes_ = np.array(self.meta["classes"])
+
+        if all(os.path.exists(os.path.join(path, f"{name}.npy")) for name in COMPILED) and "max_depth" in self.meta:
+            compiled = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in COMPILED}
+            self._depth = self.meta["max_depth"]
+        else:
+            print(f"ℹ️ {path} has no compiled traversal arrays; re-run export_model_arrays.py to share them between workers")
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+            compiled, self._depth = _compile_arrays(arrays, self.meta)
+        # The int64 index arrays are used in place; only 32-bit platforms need intp copies
+        self._split_feature = compiled["split_feature"] if compiled["split_feature"].dtype == np.intp \
+            else compiled["split_feature"].astype(np.intp)
+        self._children = compiled["children"] if compiled["children"].dtype == np.intp \
+            else compiled["children"].astype(np.intp)
+        self._split_threshold = compiled["split_threshold"]
+        self._leaf_output = compiled["leaf_output"]
+        # One entry per tree, so a private copy costs nothing
+        self._roots = np.asarray(np.load(os.path.join(path, 'roots.npy')), dtype=np.intp)
+
+    def split_ranges(self):
+        """(lowest, highest) split threshold per feature; 0 for features no tree splits on."""
+        internal = np.isfinite(self._split_threshold)
+        feature = self._split_feature[internal]
+        threshold = self._split_threshold[internal]
+        lo = np.full(self.n_features_in_, np.inf)
+        hi = np.full(self.n_features_in_, -np.inf)
+        np.minimum.at(lo, feature, threshold)
+        np.maximum.at(hi, feature, threshold)
+        return np.where(np.isfinite(lo), lo, 0.0), np.where(np.isfinite(hi), hi, 0.0)
+
+    def _check(self, X):
+        # sklearn trees compare float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}")
+        return X
+
+    def apply(self, X):
+        """Leaf node index reached in every tree: array of shape (n_rows, n_trees)."""
+        X = self._check(X)
+        n_rows, n_features = X.shape
+        # 1-D takes on the flattened row-major X are much cheaper than 2-D fancy indexing
+        values = np.ascontiguousarray(X).ravel()
+        row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, np.newaxis]
+        node = np.repeat(self._roots[np.newaxis, :], n_rows, axis=0)
+        for _ in range(self._depth):
+            go_left = np.take(values, row_offset + np.take(self._split_feature, node)) <= np.take(self._split_threshold, node)
+            node = np.take(self._children, 2 * node + go_left)
+        return node
+
+    def predict_proba(self, X):
+        if self.kind == GB_REGRESSOR:
+            raise AttributeError("predict_proba is not available for regressors")
+        leaves = self.apply(X)
+        if self.kind == TREE_CLASSIFIER:
+            proba = self._leaf_output[leaves[:, 0]]
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            return proba
+        # Sum the trees' votes in order, then average, like RandomForestClassifier.
+        # Reducing over the middle (tree) axis adds whole class rows one tree at a
+        # time; numpy only uses pairwise summation along the contiguous last axis.
+        proba = np.add.reduce(self._leaf_output[leaves], axis=1)
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        if self.kind == GB_REGRESSOR:
+            leaves = self.apply(X)
+            # raw = init, then += learning_rate * stage value in stage order; the
+            # stages lie along the last axis, so use cumsum rather than a pairwise sum
+            stages = np.empty((leaves.shape[0], leaves.shape[1] + 1), dtype=np.float64)
+            stages[:, 0] = self.meta["init"]
+            stages[:, 1:] = self._leaf_output[leaves]
+            return np.cumsum(stages, axis=1)[:, -1]
+        if self.kind == TREE_CLASSIFIER:
+            # DecisionTreeClassifier takes the argmax of the raw leaf values
+            return self.classes_.take(np.argmax(self._leaf_output[self.apply(X)[:, 0]], axis=1))
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+class LabelCodes:
+    """LabelEncoder.transform / inverse_transform over an exported classes list."""
+
+    def __init__(self, path):
+        with open(path) as f:
+            self.classes_ = np.array(json.load(f)["classes"])
+
+    def transform(self, values):
+        values = np.asarray(values)
+        idx = np.searchsorted(self.classes_, values)
+        idx = np.clip(idx, 0, len(self.classes_) - 1)
+        if not np.array_equal(self.classes_[idx], values):
+            raise ValueError(f"y contains previously unseen labels: {values[self.classes_[idx] != values].tolist()}")
+        return idx
+
+    def inverse_transform(self, codes):
+        return self.classes_[np.asarray(codes, dtype=np.int64)]
+
+
+def _export_is_current(pickle_path, export_path):
+    """True when export_path exists and was made from the current pickle (by content hash,
+    since checkouts and copies do not preserve mtimes)."""
+    if not os.path.exists(export_path):
+        return False
+    if os.path.exists(pickle_path):
+        with open(export_path) as f:
+            recorded = json.load(f).get("source_sha256")
+        if recorded != file_sha256(pickle_path):
+            print(f"⚠️ {export_path} was not exported from the current {os.path.basename(pickle_path)}; "
+                  f"re-run export_model_arrays.py. Using the pickle.")
+            return False
+    return True
+
+
+def load_tree_model(pickle_path, flat):
+    """The flat, memory-mapped export of pickle_path when `flat` and it is up to date, else joblib.load."""
+    if flat and _export_is_current(pickle_path, os.path.join(trees_path(pickle_path), 'meta.json')):
+        return TreeModel(trees_path(pickle_path))
+    import joblib
+    return joblib.load(pickle_path)
+
+
+def load_label_encoder(pickle_path, flat):
+    if flat and _export_is_current(pickle_path, classes_path(pickle_path)):
+        return LabelCodes(classes_path(pickle_path))
+    import joblib
+    return joblib.load(pickle_path)
@@ -1,28 +1,47 @@
 from flask import Blueprint, request, jsonify
 from services.gemini_service import gemini_service
-import json
+from services.navigation import navigation_for
+from services.sse import sse_response, wants_stream
 
 chatbot_bp = Blueprint('chatbot_bp', __name__)
 
-# Navigation map: intent → route info
-NAVIGATION_MAP = {
-    'navigate_dashboard': {'route': '/dashboard', 'label': 'Dashboard'},
-    'navigate_crop': {'route': '/crop', 'label': 'Crop Recommendation'},
-    'navigate_fertilizer': {'route': '/fertilizer', 'label': 'Fertilizer'},
-    'navigate_yield': {'route': '/yield', 'label': 'Yield Prediction'},
-    'navigate_soil': {'route': '/soil', 'label': 'Soil Health'},
-    'navigate_disease': {'route': '/disease', 'label': 'Disease Detection'},
-    'navigate_advisory': {'route': '/advisory', 'label': 'Advisory'},
-    'navigate_community': {'route': '/community', 'label': 'Community'},
-    'navigate_simulator': {'route': '/simulator', 'label': 'Farm Simulator'},
-    'navigate_market': {'route': '/market', 'label': 'Market Insights'},
-    'navigate_risk': {'route': '/risk', 'label': 'Risk Assessment'},
-    'navigate_farm3d': {'route': '/farm3d', 'label': '3D Farm View'},
-    'navigate_schemes': {'route': '/schemes', 'label': 'Govt Schemes'},
-    'navigate_developer': {'route': '/developer', 'label': 'Developer'},
-    'navigate_login': {'route': '/login', 'label': 'Login'},
-    'navigate_register': {'route': '/register', 'label': 'Register'},
-}
+def _chat_payload(result, language):
+    intent = result.get('intent', 'general_query')
+    response_data = {
+        "success": True,
+        "response": result.get('response'),
+        "intent": intent,
+        "language_detected": result.get('language_detected', language)
+    }
+
+    # If navigation intent detected, include navigation info
+    navigation = navigation_for(intent)
+    if navigation:
+        response_data["navigation"] = navigation
+    return response_data
+
+
+def _chat_events(message, language):
+    """
+    Streamed /chat:
+        intent  {"intent", "navigation"?}   as soon as Gemini has produced the intent
+        token   {"text"}                    pieces of the answer, in order
+        done    the same body as the non-streaming response
+        error   {"success": false, "response"}
+    """
+    for event, value in gemini_service.stream_farming_intent(message, language):
+        if event == "intent":
+            payload = {"intent": value}
+            navigation = navigation_for(value)
+            if navigation:
+                payload["navigation"] = navigation
+            yield "intent", payload
+        elif event == "token":
+            yield "token", {"text": value}
+        elif event == "done":
+            yield "done", _chat_payload(value, language)
+        else:
+            yield "error", {"success": False, "response": value.get('response')}
 
 
 @chatbot_bp.route('/chat', methods=['POST'])
@@ -34,26 +53,13 @@ def chat():
     if not message:
         return jsonify({"success": False, "error": "No message provided"})
 
+    # Streaming: the answer is sent token by token as Gemini generates it
+    if wants_stream(data):
+        return sse_response(_chat_events(message, language))
+
     try:
         result = gemini_service.process_farming_intent(message, language)
-        
-        intent = result.get('intent', 'general_query')
-        response_data = {
-            "success": True,
-            "response": result.get('response'),
-            "intent": intent,
-            "language_detected": result.get('language_detected', language)
-        }
-
-        # If navigation intent detected, include navigation info
-        nav_info = NAVIGATION_MAP.get(intent)
-        if nav_info:
-            response_data["navigation"] = {
-                "route": nav_info['route'],
-                "label": nav_info['label']
-            }
-
-        return jsonify(response_data)
+        return jsonify(_chat_payload(result, language))
     except Exception as e:
         return jsonify({
             "success": False,
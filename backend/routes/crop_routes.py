@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
-from models.ml_models import crop_model
+from models.ml_models import crop_model, fertilizer_model
 from services.location_service import convert_simple_to_technical, get_soil_data_by_type, SOIL_TYPE_DATA
+from services.simple_recommendations import simple_table, simple_soil_class, FERTILIZER_MOISTURE
 from services.decision_engine import run_decision_engine
+from services.gemini_service import gemini_service
 import numpy as np
 
 crop_bp = Blueprint('crop_bp', __name__)
@@ -26,13 +28,19 @@ def recommend_crop():
         
         # --- Decision engine integration (NEW) ---
         decision = None
+        decision_future = None
         try:
             decision_inputs = {
                 "N": features[0], "P": features[1], "K": features[2],
                 "temperature": features[3], "humidity": features[4],
                 "ph": features[5], "rainfall": features[6],
             }
-            decision = run_decision_engine(decision_inputs, prediction, language)
+            if language and language != 'en':
+                # The engine's own translations don't depend on the message
+                # translation below, so run both Gemini round-trips concurrently
+                decision_future = gemini_service.submit(run_decision_engine, decision_inputs, prediction, language)
+            else:
+                decision = run_decision_engine(decision_inputs, prediction, language)
         except Exception as de_err:
             current_app.logger.warning("Decision engine error: %s", de_err)
         # --- End decision engine integration ---
@@ -40,13 +48,9 @@ def recommend_crop():
         # Translate message and prediction if needed
         message = f"Based on the soil and weather conditions, {prediction} is the best suitable crop."
         if language and language != 'en':
-            from services.gemini_service import gemini_service
-            translated_pred = gemini_service.translate_text(prediction, language)
-            prompt = f"Translate the following recommendation message. Replace the English crop name with the translated crop name. Return ONLY the translated string:\n\n{message}"
-            translated_msg = gemini_service.generate_response(prompt, language)
-            
-            prediction = translated_pred if translated_pred else prediction
-            message = translated_msg.strip() if translated_msg else message
+            prediction, message = gemini_service.translate_many([prediction, message], language)
+        if decision_future is not None:
+            decision = gemini_service.gather([decision_future])[0]
 
         return jsonify({
             "success": True,
@@ -59,6 +63,79 @@ def recommend_crop():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# Upper bound on rows per batch request so one call can't pin a worker
+MAX_BATCH_SIZE = 5000
+FEATURE_KEYS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+FEATURE_DEFAULTS = {'temperature': 25, 'humidity': 70, 'ph': 6.5, 'rainfall': 100}
+
+
+def _positive_int(value):
+    """`value` as an int when it is a positive integer (or a string of one), else None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, int) and value > 0:
+        return value
+    return None
+
+
+@crop_bp.route('/recommend-batch', methods=['POST'])
+def recommend_crop_batch():
+    """
+    Score many farms in one request.
+    Accepts: {
+        farms: [{"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82, "ph": 6.5, "rainfall": 202.9}, ...],
+        top_k: 3 (optional)
+    }
+    """
+    try:
+        data = request.json or {}
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Request body must be a JSON object"}), 400
+        farms = data.get('farms') or []
+        
+        top_k = _positive_int(data.get('top_k', 3))
+        if top_k is None:
+            return jsonify({"success": False, "error": "'top_k' must be a positive integer"}), 400
+        
+        if not isinstance(farms, list) or not farms:
+            return jsonify({"success": False, "error": "Please provide a non-empty 'farms' list"}), 400
+        if len(farms) > MAX_BATCH_SIZE:
+            return jsonify({"success": False, "error": f"At most {MAX_BATCH_SIZE} farms per request"}), 400
+        for index, farm in enumerate(farms):
+            if not isinstance(farm, dict):
+                return jsonify({"success": False, "error": f"Invalid farm entry at index {index}: expected an object"}), 400
+        
+        try:
+            features = np.array([
+                [float(farm[key]) if key in farm else float(FEATURE_DEFAULTS[key]) for key in FEATURE_KEYS]
+                for farm in farms
+            ])
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": f"Invalid farm entry: {e}"}), 400
+        
+        ranked = crop_model.predict_many(features, top_k=top_k)
+        
+        results = []
+        for farm, top_crops in zip(farms, ranked):
+            crop, confidence = top_crops[0]
+            results.append({
+                "id": farm.get('id'),
+                "crop": crop,
+                "confidence": confidence,
+                "top_crops": [{"crop": name, "confidence": conf} for name, conf in top_crops]
+            })
+        
+        return jsonify({
+            "success": True,
+            "count": len(results),
+            "results": results
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @crop_bp.route('/recommend-simple', methods=['POST'])
 def recommend_crop_simple():
     """
@@ -97,13 +174,29 @@ def recommend_crop_simple():
             float(technical.get('rainfall', 100))
         ]
         
-        prediction, confidence = crop_model.predict(np.array([features]))
+        # Inputs from the simple-mode choices are answered from the precomputed
+        # table (build_simple_recommendations.py); anything else runs the models
+        soil_class = simple_soil_class(data)
+        precomputed = simple_table.lookup(features, soil_class)
+        if precomputed:
+            prediction, confidence = precomputed['crop'], precomputed['confidence']
+            fertilizer = precomputed['fertilizer']
+        else:
+            prediction, confidence = crop_model.predict(np.array([features]))
+            fertilizer = None
+            if fertilizer_model.model is not None:
+                fertilizer = fertilizer_model.predict(
+                    [features[0], features[1], features[2], features[5]], crop=prediction.lower(),
+                    soil_type=soil_class, temperature=features[3], humidity=features[4],
+                    moisture=FERTILIZER_MOISTURE
+                )
         
         # Get soil type info for response
         soil_info = SOIL_TYPE_DATA.get(data.get('soil_type', ''), {})
         
         # --- Decision engine integration (NEW) ---
         decision = None
+        decision_future = None
         try:
             decision_inputs = {
                 "N": technical.get('N', features[0]),
@@ -114,7 +207,14 @@ def recommend_crop_simple():
                 "ph": technical.get('ph', features[5]),
                 "rainfall": technical.get('rainfall', features[6]),
             }
-            decision = run_decision_engine(decision_inputs, prediction, language)
+            if language and language != 'en':
+                # The engine's own translations don't depend on the message
+                # translation below, so run both Gemini round-trips concurrently
+                decision_future = gemini_service.submit(run_decision_engine, decision_inputs, prediction, language)
+            elif precomputed:
+                decision = precomputed['decision']
+            else:
+                decision = run_decision_engine(decision_inputs, prediction, language)
         except Exception as de_err:
             current_app.logger.warning("Decision engine error (simple): %s", de_err)
         # --- End decision engine integration ---
@@ -122,18 +222,15 @@ def recommend_crop_simple():
         # Translate message and prediction if needed
         message = f"Based on your location and soil, {prediction} is the best crop for you!"
         if language and language != 'en':
-            from services.gemini_service import gemini_service
-            translated_pred = gemini_service.translate_text(prediction, language)
-            prompt = f"Translate the following recommendation message. Replace the English crop name with the translated crop name. Return ONLY the translated string:\n\n{message}"
-            translated_msg = gemini_service.generate_response(prompt, language)
-            
-            prediction = translated_pred if translated_pred else prediction
-            message = translated_msg.strip() if translated_msg else message
+            prediction, message = gemini_service.translate_many([prediction, message], language)
+        if decision_future is not None:
+            decision = gemini_service.gather([decision_future])[0]
 
         return jsonify({
             "success": True,
             "crop": prediction,
             "confidence": confidence,
+            "fertilizer": fertilizer,
             "message": message,
             "location": {
                 "state": data.get('state'),
@@ -1,26 +1,23 @@
 from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from models.cnn_runtime import IMG_SIZE
 from models.ml_models import disease_model
-import os
-from PIL import Image
-import io
+from services.image_ingest import open_upload, ImageRejected
 
 disease_bp = Blueprint('disease_bp', __name__)
 
+# Gemini Vision gets a larger view of the leaf than the CNN's 224x224 input
+GEMINI_IMAGE_MIN_SIDE = 768
+
 @disease_bp.route('/detect', methods=['POST'])
 def detect_disease():
     try:
         language = request.form.get('language', 'en')
         image_data = None
         if 'image' in request.files:
-            file = request.files['image']
-            # Convert file bytes to PIL Image for the GenAI SDK securely
-            image_bytes = file.read()
-            if image_bytes:
-                image_data = Image.open(io.BytesIO(image_bytes))
-                
-                # If the image is transparent PNG or similar, convert to RGB
-                if image_data.mode != 'RGB':
-                    image_data = image_data.convert('RGB')
+            # Decoded straight from the upload stream, at reduced resolution for JPEGs
+            side = IMG_SIZE if disease_model.cnn_model is not None else GEMINI_IMAGE_MIN_SIDE
+            image_data = open_upload(request.files['image'], (side, side))
         
         name, symptoms, treatment_steps = disease_model.predict(image_data, language)
         
@@ -31,6 +28,11 @@ def detect_disease():
             "treatment_steps": treatment_steps,
             "confidence": 0.95 # Generic confidence, could extract from Gemini output later
         })
+    except ImageRejected as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    except RequestEntityTooLarge:
+        # Body over MAX_CONTENT_LENGTH, refused before it was read
+        return jsonify({"success": False, "error": "Upload is too large"}), 413
     except Exception as e:
         print("Disease Route Error", e)
         return jsonify({"success": False, "error": str(e)}), 500
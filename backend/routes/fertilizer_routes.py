@@ -20,12 +20,7 @@ def recommend_fertilizer():
         
         if language and language != 'en':
             from services.gemini_service import gemini_service
-            trans_pred = gemini_service.translate_text(prediction, language)
-            prompt = f"Translate the following recommendation message. Replace the fertilizer and crop names with their translations. Return ONLY the translated string:\n\n{message}"
-            trans_msg = gemini_service.generate_response(prompt, language)
-            
-            prediction = trans_pred if trans_pred else prediction
-            message = trans_msg.strip() if trans_msg else message
+            prediction, message = gemini_service.translate_many([prediction, message], language)
 
         return jsonify({
             "success": True,
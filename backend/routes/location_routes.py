@@ -10,6 +10,8 @@ from services.location_service import (
     get_soil_data_by_type,
     convert_simple_to_technical,
     get_location_details,
+    get_soil_by_coordinates,
+    get_state_soil_summary,
     STATES_DISTRICTS,
     SOIL_TYPE_DATA,
     WATER_AVAILABILITY
@@ -65,17 +67,27 @@ def get_weather():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@location_bp.route('/weather/cache-stats', methods=['GET'])
+def get_weather_cache_stats():
+    """Hit ratios of the geo-bucketed weather cache"""
+    from services.weather_cache import weather_cache
+    return jsonify({"success": True, **weather_cache.stats()})
+
+
 @location_bp.route('/soil/regional', methods=['POST'])
 def get_soil_by_region():
     """
     Get average soil data for a region.
-    Accepts: {state, district}
+    Accepts: {state, district} or {lat, lon} (nearest district)
     """
     try:
         data = request.json
         state = data.get('state')
         district = data.get('district')
         
+        if (not state or not district) and data.get('lat') is not None and data.get('lon') is not None:
+            return jsonify(get_soil_by_coordinates(float(data['lat']), float(data['lon'])))
+        
         if not state or not district:
             return jsonify({
                 "success": False,
@@ -88,6 +100,21 @@ def get_soil_by_region():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@location_bp.route('/soil/state-summary', methods=['GET'])
+def get_soil_state_summary():
+    """
+    Soil aggregates for every state in one call (or ?state=<name> for one).
+    Each state has mean/min/max/std of N, P, K, pH and its dominant soil type.
+    """
+    state = request.args.get('state')
+    if state:
+        summary = get_state_soil_summary(state)
+        if summary is None:
+            return jsonify({"success": False, "error": f"No soil data for {state}"}), 404
+        return jsonify({"success": True, "state": state, "summary": summary})
+    return jsonify({"success": True, "states": get_state_soil_summary()})
+
+
 @location_bp.route('/soil/soilgrids', methods=['POST'])
 def get_soilgrids_data():
     """
@@ -260,7 +287,7 @@ def convert_simple_inputs():
 def reverse_geocode():
     """
     Reverse geocode coordinates to get state and district.
-    Accepts: {lat, lon}
+    Accepts: {lat, lon, offline (optional)}
     """
     try:
         data = request.json
@@ -273,7 +300,7 @@ def reverse_geocode():
                 "error": "Please provide lat and lon"
             }), 400
             
-        location_data = get_location_details(lat, lon)
+        location_data = get_location_details(float(lat), float(lon), offline=bool(data.get('offline')))
         return jsonify(location_data)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
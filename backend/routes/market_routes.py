@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 import random
 from datetime import datetime, timedelta
 from services.market_service import MarketService
+from services.market_sync import record_demand, sync_status
 
 market_bp = Blueprint('market', __name__)
 
@@ -314,9 +315,8 @@ def get_states():
     try:
         states = MarketService.get_states()
         if not states:
-            # If no states, trigger a sync to populate the database initially
-            MarketService.sync_market_data(limit=1000)
-            states = MarketService.get_states()
+            # Empty database: the background sync does the initial nationwide fetch
+            record_demand()
 
         return jsonify({'success': True, 'states': states})
     except Exception as e:
@@ -365,3 +365,10 @@ def get_market_insights():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@market_bp.route('/sync-status', methods=['GET'])
+def get_sync_status():
+    """Background market sync metrics: tuple counts, staleness, records fetched and latency."""
+    try:
+        return jsonify({'success': True, 'sync': sync_status()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
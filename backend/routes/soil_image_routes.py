@@ -1,6 +1,8 @@
+import tempfile
+
 from flask import Blueprint, request, jsonify
 from services.soil_image_analyzer import soil_analyzer
-import os
+from services.image_ingest import IMAGE_BATCH_MAX_BYTES, MULTIPART_OVERHEAD, ImageRejected, read_upload_batch
 
 soil_image_bp = Blueprint('soil_image_bp', __name__)
 
@@ -15,16 +17,46 @@ def analyze_soil_image():
         return jsonify({"success": False, "error": "No selected file"}), 400
 
     try:
-        # Read file into memory
-        image_bytes = file.read()
-        
-        # Analyze
-        result = soil_analyzer.analyze_image(image_bytes)
+        # Analyze (decoded straight from the upload stream)
+        result = soil_analyzer.analyze_image(file)
         
         if result['success']:
             return jsonify(result)
         else:
             return jsonify(result), 500
             
+    except ImageRejected as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@soil_image_bp.route('/analyze-images', methods=['POST'])
+def analyze_soil_images():
+    """
+    Batch analysis for village surveys.
+    Accepts multipart uploads: any number of image files and/or .zip archives of
+    images, under any field name (e.g. several 'images').
+    Returns per-image results in upload order and a village soil summary.
+    """
+    # The app-wide MAX_CONTENT_LENGTH fits one photo; batches get their own
+    # limit, still enforced before the body is read
+    request.max_content_length = IMAGE_BATCH_MAX_BYTES + MULTIPART_OVERHEAD
+    uploads = [f for _, f in request.files.items(multi=True) if f.filename]
+    if not uploads:
+        return jsonify({"success": False, "error": "No images provided"}), 400
+
+    try:
+        # Images are copied to disk and decoded from there; removed when the request ends
+        with tempfile.TemporaryDirectory(prefix='soil-batch-') as directory:
+            items = read_upload_batch(uploads, directory)
+            if not items:
+                return jsonify({"success": False, "error": "No images found in the upload"}), 400
+
+            result = soil_analyzer.analyze_batch(items)
+        return jsonify({"success": True, **result})
+
+    except ImageRejected as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1,8 +1,39 @@
 from flask import Blueprint, request, jsonify
 from services.gemini_service import gemini_service
+from services.navigation import navigation_for
+from services.sse import sse_response, wants_stream
 
 voice_bp = Blueprint('voice_bp', __name__)
 
+
+def _target_for(result, intent):
+    navigation = navigation_for(intent)
+    return result.get('target') or (navigation['route'] if navigation else None)
+
+
+def _voice_events(text, language):
+    """
+    Streamed /process: "intent" {"intent", "target"} first, so the client can
+    navigate before the answer is spoken, then "token" {"text"} pieces, then
+    "done" with the non-streaming body (or "error").
+    """
+    for event, value in gemini_service.stream_farming_intent(text, language):
+        if event == "intent":
+            yield "intent", {"intent": value, "target": _target_for({}, value)}
+        elif event == "token":
+            yield "token", {"text": value}
+        elif event == "done":
+            yield "done", {
+                "success": True,
+                "intent": value.get('intent'),
+                "response": value.get('response'),
+                "target": _target_for(value, value.get('intent')),
+                "entities": value.get('entities', {})
+            }
+        else:
+            yield "error", {"success": False, "response": value.get('response')}
+
+
 @voice_bp.route('/process', methods=['POST'])
 def process_voice():
     data = request.json
@@ -12,6 +43,9 @@ def process_voice():
     if not text:
         return jsonify({"success": False, "message": "No text provided"})
 
+    if wants_stream(data):
+        return sse_response(_voice_events(text, language))
+
     result = gemini_service.process_farming_intent(text, language)
     
     if result:
@@ -19,7 +53,7 @@ def process_voice():
             "success": True, 
             "intent": result.get('intent'),
             "response": result.get('response'),
-            "target": result.get('target', None),
+            "target": _target_for(result, result.get('intent')),
             "entities": result.get('entities', {})
         })
     else:
@@ -26,7 +26,7 @@ def predict_yield():
         if language and language != 'en':
             from services.gemini_service import gemini_service
             prompt = f"Translate the following message. Return ONLY the translated string:\n\n{message}"
-            trans_msg = gemini_service.generate_response(prompt, language)
+            trans_msg = gemini_service.generate_response(prompt, language, cache=True)
             message = trans_msg.strip() if trans_msg else message
 
         return jsonify({
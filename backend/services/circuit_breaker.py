@@ -0,0 +1,88 @@
+"""
+Circuit breaker for remote calls (used per Gemini key/model route).
+
+A breaker starts CLOSED. After `failure_threshold` consecutive failures (or a
+single quota error) it goes OPEN and rejects calls for `cooldown_seconds`.
+Then it goes HALF_OPEN and lets one trial call through: success closes it,
+failure re-opens it. Successful calls also feed an exponentially weighted
+latency average used to rank routes.
+"""
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, cooldown_seconds=60, latency_alpha=0.3):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.latency_alpha = latency_alpha
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.latency = None  # EWMA of successful call latency, seconds
+        self.successes = 0
+        self.total_failures = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _cooled_down(self, now):
+        return now - self.opened_at >= self.cooldown_seconds
+
+    def available(self):
+        """True if a call would currently be let through (does not change state)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return self._cooled_down(time.monotonic())
+            return not self._trial_in_flight
+
+    def allow_request(self):
+        """Claim permission for one call. Moves OPEN → HALF_OPEN once the cooldown has elapsed."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if not self._cooled_down(time.monotonic()):
+                    return False
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self, latency):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.successes += 1
+            self._trial_in_flight = False
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = self.latency_alpha * latency + (1 - self.latency_alpha) * self.latency
+
+    def record_failure(self, trip=False):
+        """Count a failure; trip=True opens the circuit immediately (e.g. quota exhausted)."""
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self._trial_in_flight = False
+            if trip or self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "successes": self.successes,
+                "failures": self.total_failures,
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            }
@@ -8,6 +8,10 @@ of the existing ML crop prediction pipeline.
 
 from typing import TypedDict, Optional
 
+import numpy as np
+
+from services.prediction_cache import prediction_cache, quantize
+
 # ──────────────────────────────────────────────────────────────────
 # Section 1: Type definitions
 # ──────────────────────────────────────────────────────────────────
@@ -176,6 +180,15 @@ def compute_profitability_score(inputs: CropInputs, crop: str) -> float:
     return round(min(100.0, max(0.0, profitability)), 2)
 
 
+def risk_level_for(risk_score: float) -> str:
+    """Map a combined risk score (0–100) to its Low/Medium/High label."""
+    if risk_score < 30:
+        return "Low"
+    if risk_score <= 65:
+        return "Medium"
+    return "High"
+
+
 def compute_risk_score(inputs: CropInputs) -> tuple[float, str]:
     """
     Assess environmental risk based on rainfall, temperature, and pH.
@@ -225,14 +238,7 @@ def compute_risk_score(inputs: CropInputs) -> tuple[float, str]:
         0.4 * rainfall_risk + 0.35 * temperature_risk + 0.25 * ph_risk, 2
     )
 
-    if risk_score < 30:
-        risk_level = "Low"
-    elif risk_score <= 65:
-        risk_level = "Medium"
-    else:
-        risk_level = "High"
-
-    return risk_score, risk_level
+    return risk_score, risk_level_for(risk_score)
 
 
 # ──────────────────────────────────────────────────────────────────
@@ -258,6 +264,203 @@ def compute_final_score(
     return round(min(100.0, max(0.0, final)), 2)
 
 
+# ──────────────────────────────────────────────────────────────────
+# Section 3b: Vectorized scoring across all crops
+# ──────────────────────────────────────────────────────────────────
+
+# Parameters scored for suitability, in matrix column order.
+SCORED_PARAMS: tuple[str, ...] = ("n", "p", "k", "temperature", "ph", "humidity")
+
+# Crop order shared by every matrix below.
+CROP_NAMES: tuple[str, ...] = tuple(CROP_REQUIREMENTS)
+
+# (crops × params) ideal-range bounds, built once at import.
+IDEAL_MIN = np.array(
+    [[CROP_REQUIREMENTS[crop][param][0] for param in SCORED_PARAMS] for crop in CROP_NAMES],
+    dtype=float,
+)
+IDEAL_MAX = np.array(
+    [[CROP_REQUIREMENTS[crop][param][1] for param in SCORED_PARAMS] for crop in CROP_NAMES],
+    dtype=float,
+)
+# Same tolerance rule as _parameter_score: 30% of the span, at least 1 unit.
+IDEAL_TOLERANCE = np.maximum((IDEAL_MAX - IDEAL_MIN) * 0.3, 1.0)
+
+BASE_PROFITABILITY_VECTOR = np.array(
+    [CROP_BASE_PROFITABILITY.get(crop, 60.0) for crop in CROP_NAMES], dtype=float
+)
+STATIC_MARKET_TREND_VECTOR = np.array(
+    [STATIC_MARKET_TRENDS.get(crop, 0.5) for crop in CROP_NAMES], dtype=float
+)
+
+
+def _product_error(a: np.ndarray, b: float) -> np.ndarray:
+    """Rounding error of a * b, exactly: a * b == fl(a * b) + error (Dekker's two-product)."""
+    def split(x):
+        c = 134217729.0 * x  # 2**27 + 1
+        high = c - (c - x)
+        return high, x - high
+
+    a_high, a_low = split(a)
+    b_high, b_low = split(np.float64(b))
+    product = a * b
+    return ((a_high * b_high - product) + a_high * b_low + a_low * b_high) + a_low * b_low
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """
+    Built-in round(v, 2) applied elementwise, without a Python loop.
+
+    np.round(v, 2) rounds fl(v * 100), which can land exactly on .5 when the
+    true v * 100 is slightly above or below it (and vice versa for ties that
+    the built-in breaks by the exact decimal value). Away from .5 the product
+    error cannot change the nearest integer, so only exact .5 products are
+    resolved by the sign of the error; true ties go to even, as round() does.
+    """
+    values = np.asarray(values, dtype=float)
+    scaled = values * 100.0
+    error = _product_error(values, 100.0)
+    floor = np.floor(scaled)
+    tie = scaled - floor == 0.5
+    rounded = np.where(tie & (error > 0), floor + 1.0, np.where(tie & (error < 0), floor, np.rint(scaled)))
+    return rounded / 100.0
+
+
+def _as_batch(inputs: CropInputs | list[CropInputs]) -> list[CropInputs]:
+    return [inputs] if isinstance(inputs, dict) else list(inputs)
+
+
+def compute_suitability_matrix(features: np.ndarray) -> np.ndarray:
+    """
+    Vectorized compute_suitability_score for every crop at once.
+
+    features has shape (batch, len(SCORED_PARAMS)). Returns a
+    (batch, len(CROP_NAMES)) array of suitability scores using the
+    same in-range / ±30% linear decay rule, broadcast over all crops.
+    """
+    values = np.asarray(features, dtype=float)[:, np.newaxis, :]
+    distance = np.maximum(IDEAL_MIN - values, 0.0) + np.maximum(values - IDEAL_MAX, 0.0)
+    # distance >= 0, so only the lower bound of [0, 100] needs clamping
+    param_scores = np.round(np.maximum(100.0 * (1.0 - distance / IDEAL_TOLERANCE), 0.0), 2)
+    # Left-to-right sum then divide, matching sum(scores) / len(scores)
+    total = param_scores[:, :, 0]
+    for j in range(1, len(SCORED_PARAMS)):
+        total = total + param_scores[:, :, j]
+    # Means of 2-decimal scores often land on an exact ...5 tie, where
+    # np.round and the built-in round disagree; use round() for parity
+    return _round2(total / len(SCORED_PARAMS))
+
+
+def compute_profitability_matrix(market_trends: np.ndarray) -> np.ndarray:
+    """
+    Vectorized compute_profitability_score for every crop at once.
+
+    market_trends has shape (batch,) and may contain NaN where no
+    trend was supplied; those rows fall back to STATIC_MARKET_TRENDS.
+    Returns a (batch, len(CROP_NAMES)) array.
+    """
+    trends = np.asarray(market_trends, dtype=float)[:, np.newaxis]
+    trends = np.where(np.isnan(trends), STATIC_MARKET_TREND_VECTOR, trends)
+    profitability = BASE_PROFITABILITY_VECTOR * 0.7 + (trends * 100) * 0.3
+    return _round2(np.clip(profitability, 0.0, 100.0))
+
+
+def compute_risk_vector(
+    rainfall: np.ndarray,
+    temperature: np.ndarray,
+    ph: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized compute_risk_score over a batch of inputs.
+
+    Returns a (batch,) array of combined risk scores; use
+    risk_level_for() to map a score to its Low/Medium/High label.
+    """
+    rainfall = np.asarray(rainfall, dtype=float)
+    temperature = np.asarray(temperature, dtype=float)
+    ph = np.asarray(ph, dtype=float)
+
+    rainfall_risk = np.minimum(
+        100.0,
+        np.maximum(50 - rainfall, 0.0) / 50 * 100 + np.maximum(rainfall - 300, 0.0) / 200 * 100,
+    )
+    temperature_risk = np.minimum(
+        100.0,
+        np.maximum(10 - temperature, 0.0) / 10 * 100 + np.maximum(temperature - 42, 0.0) / 10 * 100,
+    )
+    ph_risk = np.minimum(
+        100.0,
+        np.maximum(5.0 - ph, 0.0) / 2.0 * 100 + np.maximum(ph - 8.5, 0.0) / 2.0 * 100,
+    )
+    return _round2(0.4 * rainfall_risk + 0.35 * temperature_risk + 0.25 * ph_risk)
+
+
+def score_all_crops(inputs: CropInputs | list[CropInputs]) -> dict:
+    """
+    Score one input (or a batch of inputs) against every crop in
+    CROP_REQUIREMENTS in a single broadcast pass.
+
+    Returns a dict of NumPy arrays:
+        crops          — tuple of crop names (column order)
+        suitability    — (batch, crops)
+        profitability  — (batch, crops)
+        risk           — (batch,)  risk is crop-independent
+        final          — (batch, crops)
+    """
+    batch = _as_batch(inputs)
+    features = np.array(
+        [[row[param] for param in SCORED_PARAMS] for row in batch], dtype=float
+    ).reshape(len(batch), len(SCORED_PARAMS))
+    market_trends = np.array(
+        [np.nan if row.get("market_trend") is None else row["market_trend"] for row in batch],
+        dtype=float,
+    )
+
+    suitability = compute_suitability_matrix(features)
+    profitability = compute_profitability_matrix(market_trends)
+    risk = compute_risk_vector(
+        [row["rainfall"] for row in batch],
+        [row["temperature"] for row in batch],
+        [row["ph"] for row in batch],
+    )
+    final = _round2(
+        np.clip(0.4 * suitability + 0.3 * profitability + 0.3 * (100 - risk[:, np.newaxis]), 0.0, 100.0)
+    )
+
+    return {
+        "crops": CROP_NAMES,
+        "suitability": suitability,
+        "profitability": profitability,
+        "risk": risk,
+        "final": final,
+    }
+
+
+def rank_crops(inputs: CropInputs) -> list[dict]:
+    """
+    Return every crop in CROP_REQUIREMENTS ranked by final score
+    (ties broken by suitability), as a list of plain dicts.
+    """
+    table = score_all_crops(inputs)
+    risk = float(table["risk"][0])
+    risk_level = risk_level_for(risk)
+    suitability = table["suitability"][0]
+    final = table["final"][0]
+    order = np.lexsort((-suitability, -final))
+
+    return [
+        {
+            "crop": CROP_NAMES[i].capitalize(),
+            "final_score": float(final[i]),
+            "suitability": float(suitability[i]),
+            "profitability": float(table["profitability"][0][i]),
+            "risk": risk,
+            "risk_level": risk_level,
+        }
+        for i in order
+    ]
+
+
 # ──────────────────────────────────────────────────────────────────
 # Section 4: Explanation generator
 # ──────────────────────────────────────────────────────────────────
@@ -361,24 +564,23 @@ def get_alternative_crops(inputs: CropInputs, predicted_crop: str) -> list[str]:
     """
     Calculate suitability scores for all crops and return the top 2-3
     alternatives (excluding the predicted crop).
+
+    All crops are scored in a single compute_suitability_matrix() pass.
     """
-    alternatives = []
+    features = np.array([[inputs[param] for param in SCORED_PARAMS]], dtype=float)
+    scores = compute_suitability_matrix(features)[0]
     predicted_lower = predicted_crop.lower()
-    
-    for crop in CROP_REQUIREMENTS.keys():
-        if crop == predicted_lower:
-            continue
-            
-        score = compute_suitability_score(inputs, crop)
-        # Only consider crops that have a reasonable soil match (score >= 40)
-        if score >= 40:
-            alternatives.append((crop, score))
-            
-    # Sort by suitability score descending
-    alternatives.sort(key=lambda x: x[1], reverse=True)
-    
+
+    # Only consider crops that have a reasonable soil match (score >= 40),
+    # sorted by suitability descending; stable so CROP_REQUIREMENTS order breaks ties
+    order = np.argsort(-scores, kind="stable")
+    alternatives = [
+        CROP_NAMES[i] for i in order
+        if scores[i] >= 40 and CROP_NAMES[i] != predicted_lower
+    ]
+
     # Return top 2 or 3 fallback crops as capitalized strings
-    return [crop.capitalize() for crop, _ in alternatives[:3]]
+    return [crop.capitalize() for crop in alternatives[:3]]
 
 # ──────────────────────────────────────────────────────────────────
 # Section 5: Public entry point
@@ -403,6 +605,8 @@ def run_decision_engine(inputs: dict, predicted_crop: str, language: str = 'en')
     -------
     dict
         Complete decision result with scores, risk level, and explanation.
+        Results are memoized per (rounded inputs, crop, language); see
+        services/prediction_cache.py.
 
     Raises
     ------
@@ -414,19 +618,39 @@ def run_decision_engine(inputs: dict, predicted_crop: str, language: str = 'en')
     if missing:
         raise ValueError(f"Missing required input keys: {', '.join(sorted(missing))}")
 
-    # Cast to CropInputs
+    # Cast to CropInputs, rounded so equal inputs share a cache entry
+    n, p, k, temperature, humidity, ph, rainfall = quantize(
+        inputs[key] for key in ("N", "P", "K", "temperature", "humidity", "ph", "rainfall")
+    )
+    market_trend = inputs.get("market_trend")
     crop_inputs: CropInputs = {
-        "n": float(inputs["N"]),
-        "p": float(inputs["P"]),
-        "k": float(inputs["K"]),
-        "temperature": float(inputs["temperature"]),
-        "humidity": float(inputs["humidity"]),
-        "ph": float(inputs["ph"]),
-        "rainfall": float(inputs["rainfall"]),
-        "market_trend": inputs.get("market_trend"),
+        "n": n,
+        "p": p,
+        "k": k,
+        "temperature": temperature,
+        "humidity": humidity,
+        "ph": ph,
+        "rainfall": rainfall,
+        "market_trend": None if market_trend is None else quantize([market_trend])[0],
     }
+    key = (tuple(crop_inputs.values()), predicted_crop)
 
-    # Run scoring functions
+    result = prediction_cache.get_or_compute(
+        'decision', (*key, 'en'), lambda: _decide(crop_inputs, predicted_crop)
+    )
+    if not language or language == 'en':
+        return result
+
+    # Translated results are only kept once the translation went through
+    return prediction_cache.get_or_compute(
+        'decision', (*key, language), lambda: _translate_decision(result, language),
+        cacheable=lambda translated: translated is not None
+    ) or result
+
+
+def _decide(crop_inputs: CropInputs, predicted_crop: str) -> dict:
+    """Scores, risk, explanation and alternatives in English."""
+    # Run scoring functions for the predicted crop
     suitability = compute_suitability_score(crop_inputs, predicted_crop)
     profitability = compute_profitability_score(crop_inputs, predicted_crop)
     risk_score, risk_level = compute_risk_score(crop_inputs)
@@ -444,28 +668,6 @@ def run_decision_engine(inputs: dict, predicted_crop: str, language: str = 'en')
     
     alternatives = get_alternative_crops(crop_inputs, predicted_crop)
 
-    if language and language != 'en':
-        try:
-            from services.gemini_service import gemini_service
-            
-            # Translate explanations
-            translated_expl = []
-            for exp in explanation:
-                prompt = f"Translate the following explanation. Return ONLY the translated string without quotes:\n\n{exp}"
-                trans = gemini_service.generate_response(prompt, language)
-                translated_expl.append(trans.strip() if trans else exp)
-            explanation = translated_expl
-            
-            # Translate alternatives
-            translated_alts = []
-            for alt in alternatives:
-                trans_alt = gemini_service.translate_text(alt, language)
-                translated_alts.append(trans_alt if trans_alt else alt)
-            alternatives = translated_alts
-        except Exception as e:
-            import logging
-            logging.error(f"Translation failed in decision engine: {e}")
-
     return {
         "recommended_crop": predicted_crop,
         "final_score": final_score,
@@ -476,6 +678,28 @@ def run_decision_engine(inputs: dict, predicted_crop: str, language: str = 'en')
     }
 
 
+def _translate_decision(result: dict, language: str) -> Optional[dict]:
+    """The result with explanation and alternatives translated, or None if translation failed."""
+    explanation, alternatives = result["explanation"], result["alternatives"]
+    try:
+        from services.gemini_service import gemini_service
+        
+        # Translate explanations and alternatives in one batched call
+        translated = gemini_service.translate_many(explanation + alternatives, language)
+    except Exception as e:
+        import logging
+        logging.error(f"Translation failed in decision engine: {e}")
+        return None
+    if translated == explanation + alternatives:
+        # Nothing came back translated; don't pin the English text for this language
+        return None
+    return {
+        **result,
+        "explanation": translated[:len(explanation)],
+        "alternatives": translated[len(explanation):],
+    }
+
+
 # ──────────────────────────────────────────────────────────────────
 # Section 6: Smoke test
 # ──────────────────────────────────────────────────────────────────
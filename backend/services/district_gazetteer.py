@@ -0,0 +1,93 @@
+"""
+District gazetteer: one coordinate per district in STATES_DISTRICTS.
+
+data/district_centroids.csv holds approximate district headquarters
+coordinates (regenerate with build_district_gazetteer.py). They are loaded
+once into a haversine BallTree, so nearest-district queries are O(log n) and
+need no network. This backs the nearest-district soil lookup, weather
+coordinates for any district and the offline /reverse-geocode mode.
+"""
+import csv
+import os
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'district_centroids.csv')
+EARTH_RADIUS_KM = 6371.0
+
+
+class DistrictGazetteer:
+    def __init__(self, path=GAZETTEER_PATH):
+        self.districts = []  # [(state, district)] in tree order
+        self.coordinates = {}  # (state, district) -> (lat, lon)
+        self.state_centroids = {}
+        self.tree = None
+        if not os.path.exists(path):
+            print(f"[Gazetteer] {path} not found; nearest-district lookups disabled")
+            return
+
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                key = (row['state'], row['district'])
+                self.districts.append(key)
+                self.coordinates[key] = (float(row['lat']), float(row['lon']))
+
+        points = np.array([self.coordinates[key] for key in self.districts])
+        self.tree = BallTree(np.radians(points), metric='haversine')
+
+        by_state = {}
+        for (state, _), coords in self.coordinates.items():
+            by_state.setdefault(state, []).append(coords)
+        self.state_centroids = {
+            state: tuple(np.round(np.mean(coords, axis=0), 4)) for state, coords in by_state.items()
+        }
+
+    @property
+    def available(self):
+        return self.tree is not None
+
+    def coordinates_for(self, state, district=None):
+        """District coordinate, else the state's centroid, else None."""
+        if district and (state, district) in self.coordinates:
+            return self.coordinates[(state, district)]
+        return self.state_centroids.get(state)
+
+    def nearest(self, lat, lon, k=1):
+        """The k nearest districts as [{"state", "district", "lat", "lon", "distance_km"}], closest first."""
+        if not self.available:
+            return []
+        distances, indices = self.tree.query(np.radians([[float(lat), float(lon)]]), k=min(k, len(self.districts)))
+        results = []
+        for distance, index in zip(distances[0], indices[0]):
+            state, district = self.districts[index]
+            d_lat, d_lon = self.coordinates[(state, district)]
+            results.append({
+                "state": state,
+                "district": district,
+                "lat": d_lat,
+                "lon": d_lon,
+                "distance_km": round(float(distance) * EARTH_RADIUS_KM, 1)
+            })
+        return results
+
+
+class PointIndex:
+    """BallTree over an arbitrary subset of gazetteer districts (e.g. those with soil profiles)."""
+
+    def __init__(self, gazetteer, keys):
+        self.keys = [key for key in keys if key in gazetteer.coordinates]
+        self.tree = None
+        if self.keys:
+            points = np.array([gazetteer.coordinates[key] for key in self.keys])
+            self.tree = BallTree(np.radians(points), metric='haversine')
+
+    def nearest(self, lat, lon):
+        """(key, distance_km) of the closest indexed district, or (None, None)."""
+        if self.tree is None:
+            return None, None
+        distances, indices = self.tree.query(np.radians([[float(lat), float(lon)]]), k=1)
+        return self.keys[indices[0][0]], float(distances[0][0]) * EARTH_RADIUS_KM
+
+
+gazetteer = DistrictGazetteer()
@@ -1,11 +1,34 @@
 from google import genai
 import os
 import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
+from services.circuit_breaker import CircuitBreaker
+from services.translation_cache import translation_cache
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Fan-out pool for independent Gemini calls made within one request
+GEMINI_POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", 8))
+# Cap on in-flight generate_content calls per API key (per worker process), to stay under quota
+GEMINI_MAX_CONCURRENCY_PER_KEY = int(os.environ.get("GEMINI_MAX_CONCURRENCY_PER_KEY", 4))
+# Per-request HTTP timeout for a single generate_content call (seconds)
+GEMINI_REQUEST_TIMEOUT = float(os.environ.get("GEMINI_REQUEST_TIMEOUT", 25))
+# Default seconds a caller waits on a submitted call before using its fallback; every
+# call also stops trying further routes after it. Never shorter than one request
+# timeout, or a call still within its own timeout is thrown away
+GEMINI_CALL_DEADLINE = max(float(os.environ.get("GEMINI_CALL_DEADLINE", GEMINI_REQUEST_TIMEOUT + 5)),
+                           GEMINI_REQUEST_TIMEOUT)
+# Most (key, model) routes one request will try before giving up
+GEMINI_MAX_ATTEMPTS = int(os.environ.get("GEMINI_MAX_ATTEMPTS", 4))
+# Circuit breaker: consecutive failures before a route opens, and how long it stays open
+GEMINI_BREAKER_FAILURES = int(os.environ.get("GEMINI_BREAKER_FAILURES", 3))
+GEMINI_BREAKER_COOLDOWN = float(os.environ.get("GEMINI_BREAKER_COOLDOWN", 60))
+
 LANGUAGE_MAP = {
     'en': 'English',
     'hi': 'Hindi',
@@ -24,6 +47,39 @@ LANGUAGE_MAP = {
     'zh': 'Chinese'
 }
 
+class GeminiUnavailable(Exception):
+    """Raised when no Gemini route is healthy or every attempted route failed."""
+
+
+# A JSON string field of a (possibly truncated) object: only complete escapes
+# are consumed, so a value cut off mid-escape stops just before it
+_STREAM_FIELDS = {
+    key: re.compile(r'"%s"\s*:\s*"((?:[^"\\]|\\u[0-9a-fA-F]{4}|\\[^u])*)(")?' % key)
+    for key in ("intent", "language_detected", "response")
+}
+
+
+def _partial_json_string(text, key):
+    """
+    (value, complete) of the string field `key` in JSON that is still being
+    streamed: the decoded value so far and whether its closing quote has
+    arrived, or (None, False) when the field hasn't started yet.
+    """
+    match = _STREAM_FIELDS[key].search(text)
+    if match is None:
+        return None, False
+    complete = match.group(2) is not None
+    try:
+        # strict=False: models sometimes put raw newlines inside strings
+        value = json.loads('"' + match.group(1) + '"', strict=False)
+    except ValueError:
+        return None, False
+    if not complete and value and '\ud800' <= value[-1] <= '\udbff':
+        # First half of a surrogate pair; wait for the second
+        value = value[:-1]
+    return value, complete
+
+
 # Configure Gemini from environment variable
 class GeminiService:
     def __init__(self):
@@ -41,9 +97,19 @@ class GeminiService:
         
         self.current_key_index = 0
         self.client = None
+        self.clients = {}
         self.model_name = "gemini-2.5-flash"
         self.fallback_models = ["gemini-3-flash-preview", "gemini-2.5-flash-lite", "gemini-flash-latest"]
 
+        self._key_slots = [threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY_PER_KEY) for _ in self.api_keys]
+        self._executor = ThreadPoolExecutor(max_workers=GEMINI_POOL_SIZE, thread_name_prefix='gemini')
+        # One breaker per (key index, model) route
+        self.breakers = {
+            (key_index, model): CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN)
+            for key_index in range(len(self.api_keys))
+            for model in self.all_models()
+        }
+
         self._initialize_client()
 
         # System instruction with agriculture domain + navigation support
@@ -98,9 +164,8 @@ class GeminiService:
             self.client = None
             return
 
-        current_key = self.api_keys[self.current_key_index]
         try:
-            self.client = genai.Client(api_key=current_key)
+            self.client = self._client_for(self.current_key_index)
             print(f"Successfully initialized Gemini client with key index {self.current_key_index} and model: {self.model_name}")
         except Exception as e:
             print(f"Failed to initialize Gemini client with key index {self.current_key_index}: {e}")
@@ -118,6 +183,181 @@ class GeminiService:
         print(f"Rotating API key from index {prev_index} to {self.current_key_index}...")
         self._initialize_client()
         return True
+
+    def _client_for(self, key_index):
+        """Client bound to one API key, created on first use."""
+        client = self.clients.get(key_index)
+        if client is None:
+            client = genai.Client(
+                api_key=self.api_keys[key_index],
+                http_options={'timeout': int(GEMINI_REQUEST_TIMEOUT * 1000)}
+            )
+            self.clients[key_index] = client
+        return client
+
+    def all_models(self):
+        """Primary model first, then the fallbacks, in configured order."""
+        return [self.model_name] + self.fallback_models
+
+    def _routes(self):
+        """
+        (key index, model) routes whose circuit would let a call through, best first.
+        Routes with measured latency come first, fastest first; unmeasured routes follow
+        in configured order (current key first, primary model first).
+        """
+        models = self.all_models()
+        key_order = [(self.current_key_index + i) % len(self.api_keys) for i in range(len(self.api_keys))]
+        ranked = []
+        for key_rank, key_index in enumerate(key_order):
+            for model_rank, model in enumerate(models):
+                breaker = self.breakers[(key_index, model)]
+                if not breaker.available():
+                    continue
+                latency = breaker.latency
+                ranked.append(((latency is None, latency or 0.0, key_rank, model_rank), (key_index, model)))
+        ranked.sort(key=lambda item: item[0])
+        return [route for _, route in ranked]
+
+    def is_available(self):
+        """False when Gemini is unconfigured or every route's circuit is open."""
+        return bool(self.api_keys) and any(breaker.available() for breaker in self.breakers.values())
+
+    def _generate_content(self, contents, parse=None, with_model=False):
+        """
+        Call Gemini on the healthiest routes until one succeeds, holding one of the
+        key's concurrency slots per call. If `parse` is given, its result is returned
+        and a ValueError from it moves on to the next route (without tripping the
+        breaker). with_model=True returns (result, model that answered).
+        No further route is tried once GEMINI_CALL_DEADLINE has passed, so a
+        call takes at most about that plus one GEMINI_REQUEST_TIMEOUT.
+        Raises GeminiUnavailable straight away when every circuit is open.
+        """
+        routes = self._routes()
+        if not routes:
+            raise GeminiUnavailable("All Gemini circuits are open")
+
+        deadline = time.monotonic() + GEMINI_CALL_DEADLINE
+        last_error = None
+        for key_index, model in routes[:GEMINI_MAX_ATTEMPTS]:
+            if last_error is not None and time.monotonic() >= deadline:
+                print(f"Gemini call deadline ({GEMINI_CALL_DEADLINE:g}s) passed; not trying further routes")
+                break
+            breaker = self.breakers[(key_index, model)]
+            if not breaker.allow_request():
+                continue
+            start = time.monotonic()
+            try:
+                with self._key_slots[key_index]:
+                    response = self._client_for(key_index).models.generate_content(model=model, contents=contents)
+            except Exception as e:
+                error_str = str(e)
+                # Quota errors won't clear on retry, so open that route at once
+                breaker.record_failure(trip="429" in error_str or "RESOURCE_EXHAUSTED" in error_str)
+                print(f"Model {model} failed with key index {key_index}: {e}")
+                last_error = e
+                continue
+            breaker.record_success(time.monotonic() - start)
+
+            try:
+                result = response if parse is None else parse(response)
+            except ValueError as e:
+                print(f"Model {model} returned an unparseable response: {e}")
+                last_error = e
+                continue
+            return (result, model) if with_model else result
+        raise GeminiUnavailable(f"All attempted Gemini routes failed: {last_error}")
+
+    def _generate_content_stream(self, contents):
+        """
+        Streaming _generate_content: yields the text of each chunk as Gemini produces it.
+        Routes are tried as in _generate_content until one delivers its first chunk;
+        from then on the stream is committed to that route, so a failure mid-stream
+        is raised as GeminiUnavailable instead of moving on. As there, no further
+        route is tried once GEMINI_CALL_DEADLINE has passed. The key's concurrency
+        slot is held only while waiting on Gemini for each chunk, not while the
+        consumer (e.g. a slow SSE client) takes the chunk.
+        """
+        routes = self._routes()
+        if not routes:
+            raise GeminiUnavailable("All Gemini circuits are open")
+
+        deadline = time.monotonic() + GEMINI_CALL_DEADLINE
+        last_error = None
+        for key_index, model in routes[:GEMINI_MAX_ATTEMPTS]:
+            if last_error is not None and time.monotonic() >= deadline:
+                print(f"Gemini call deadline ({GEMINI_CALL_DEADLINE:g}s) passed; not trying further routes")
+                break
+            breaker = self.breakers[(key_index, model)]
+            if not breaker.allow_request():
+                continue
+            start = time.monotonic()
+            started = False
+            recorded = False
+            try:
+                slot = self._key_slots[key_index]
+                with slot:
+                    stream = iter(self._client_for(key_index).models.generate_content_stream(model=model, contents=contents))
+                while True:
+                    with slot:
+                        chunk = next(stream, None)
+                    if chunk is None:
+                        break
+                    started = True
+                    if chunk.text:
+                        yield chunk.text
+                breaker.record_success(time.monotonic() - start)
+                recorded = True
+                return
+            except Exception as e:
+                error_str = str(e)
+                breaker.record_failure(trip="429" in error_str or "RESOURCE_EXHAUSTED" in error_str)
+                recorded = True
+                print(f"Model {model} failed with key index {key_index}{' mid-stream' if started else ''}: {e}")
+                if started:
+                    raise GeminiUnavailable(f"Gemini stream broke off: {e}")
+                last_error = e
+            finally:
+                if not recorded:
+                    # The consumer stopped reading (client went away); the route itself worked
+                    breaker.record_success(time.monotonic() - start)
+        raise GeminiUnavailable(f"All attempted Gemini routes failed: {last_error}")
+
+    def health(self):
+        """Breaker state and latency per route, for diagnostics."""
+        return {
+            f"{key_index}:{model}": breaker.snapshot()
+            for (key_index, model), breaker in self.breakers.items()
+        }
+
+    def submit(self, fn, *args, deadline=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the shared Gemini pool and return its Future.
+        The future carries a deadline (seconds from now, default GEMINI_CALL_DEADLINE)
+        that gather() honours.
+        """
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.deadline = time.monotonic() + (GEMINI_CALL_DEADLINE if deadline is None else deadline)
+        return future
+
+    def gather(self, futures, default=None):
+        """
+        Wait for futures from submit() and return their results in order.
+        A call that fails or misses its deadline yields `default`; a call still
+        running past its deadline is left to finish in the background.
+        """
+        results = []
+        for future in futures:
+            try:
+                remaining = max(0.0, future.deadline - time.monotonic())
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                future.cancel()
+                print("Pooled call missed its deadline, using fallback")
+                results.append(default)
+            except Exception as e:
+                print(f"Pooled call failed: {e}")
+                results.append(default)
+        return results
     
 
     def process_farming_intent(self, text, language='en'):
@@ -138,53 +378,17 @@ class GeminiService:
             Respond in valid JSON format only.
             """
             
-            # Retry logic with key rotation
-            # Retry logic with key rotation
-            max_retries = len(self.api_keys)
-            
-            # List of models to try in order
-            models_to_try = [self.model_name] + self.fallback_models
-
-            for key_attempt in range(max_retries):
-                for model in models_to_try:
-                    try:
-                        # Try with current configuration
-                        response = self.client.models.generate_content(
-                            model=model,
-                            contents=full_prompt
-                        )
-                        
-                        # Clean up response to ensure valid JSON
-                        response_text = response.text.strip()
-                        if response_text.startswith('```json'):
-                            response_text = response_text[7:-3]
-                        elif response_text.startswith('```'):
-                            response_text = response_text[3:-3]
-                            
-                        return json.loads(response_text)
-
-                    except Exception as e:
-                        print(f"Model {model} failed with key index {self.current_key_index}: {e}")
-                        
-                        # Check for quota/resource exhaustion
-                        error_str = str(e)
-                        if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                            # If it's a quota error, we might want to switch keys, but let's try other models first 
-                            # on the same key unless all models fail.
-                            # However, usually quota is per project/key, not per model (though sometimes per model).
-                            # Let's continue to the next model first.
-                            continue
-                        else:
-                            # If it's another error (like model not found), continue to next model
-                            continue
-                
-                # If we've tried all models on this key and failed, rotate key
-                print(f"All models failed on key index {self.current_key_index}. Rotating key...")
-                if not self._rotate_key():
-                    break # No more keys to rotate
-            
-            # If we exit the loops without returning, it means total failure
-            raise Exception("All models and keys exhausted.")
+            def parse(response):
+                # Clean up response to ensure valid JSON
+                response_text = response.text.strip()
+                if response_text.startswith('```json'):
+                    response_text = response_text[7:-3]
+                elif response_text.startswith('```'):
+                    response_text = response_text[3:-3]
+                return json.loads(response_text)
+
+            # Routed across keys/models by circuit health; fails fast when all are open
+            return self._generate_content(full_prompt, parse=parse)
 
         except Exception as e:
             print(f"Gemini API Error: {e}")
@@ -194,45 +398,118 @@ class GeminiService:
                 "success": False
             }
 
-    def generate_response(self, prompt, language='en'):
+    def stream_farming_intent(self, text, language='en'):
+        """
+        Streaming process_farming_intent. Yields (event, value) pairs:
+            ("intent", intent)   as soon as the intent has been generated
+            ("token", text)      each new piece of the response text
+            ("done", result)     the dict process_farming_intent would return
+            ("error", result)    instead of "done" when Gemini is unreachable
+        The prompt asks for the intent before the response, so the intent
+        (e.g. a navigation target) arrives ahead of the answer text.
+        """
+        if not self.client:
+            yield "error", {
+                "response": "AI service is not configured. Please check API key.",
+                "intent": "error",
+                "success": False
+            }
+            return
+
+        full_prompt = f"""
+        {self.system_prompt}
+
+        Current User Language Preference: {language}
+        User Query: {text}
+
+        Respond in valid JSON format only, writing the keys in this order:
+        "intent", "language_detected", "response".
+        """
+
+        response_text = ""
+        intent = None
+        streamed = ""
+        try:
+            for chunk in self._generate_content_stream(full_prompt):
+                response_text += chunk
+                if intent is None:
+                    value, complete = _partial_json_string(response_text, "intent")
+                    if complete:
+                        intent = value
+                        yield "intent", intent
+                value, _ = _partial_json_string(response_text, "response")
+                if value and value.startswith(streamed) and len(value) > len(streamed):
+                    yield "token", value[len(streamed):]
+                    streamed = value
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            yield "error", {
+                "response": "I'm having trouble connecting to the farm network right now. Please try again.",
+                "intent": "error",
+                "success": False
+            }
+            return
+
+        # Clean up response to ensure valid JSON
+        cleaned = response_text.strip()
+        if cleaned.startswith('```json'):
+            cleaned = cleaned[7:-3]
+        elif cleaned.startswith('```'):
+            cleaned = cleaned[3:-3]
+        try:
+            result = json.loads(cleaned)
+            if not isinstance(result, dict):
+                raise ValueError("not a JSON object")
+        except ValueError as e:
+            # Already streamed, so there's no retrying on another route: keep what was said
+            print(f"Streamed Gemini response was not valid JSON: {e}")
+            detected, _ = _partial_json_string(response_text, "language_detected")
+            result = {
+                "response": streamed or response_text.strip(),
+                "intent": intent or "general_query",
+                "language_detected": detected or language
+            }
+
+        if intent is None:
+            yield "intent", result.get('intent', 'general_query')
+        final = result.get('response')
+        if isinstance(final, str) and final.startswith(streamed) and len(final) > len(streamed):
+            yield "token", final[len(streamed):]
+        yield "done", result
+
+    def generate_response(self, prompt, language='en', cache=False):
         """
         Generic method to generate content from Gemini based on a prompt.
         Used by ML models for predictions.
+        Pass cache=True for deterministic prompts (e.g. translations) so the
+        answer is served from the persistent translation cache next time.
         """
+        if cache:
+            cached = translation_cache.get_any(prompt, language, self.all_models())
+            if cached is not None:
+                return cached
+
+        text, model = self._generate_text(prompt, language)
+        if cache and text:
+            translation_cache.set(prompt, language, model, text)
+        return text
+
+    def _generate_text(self, prompt, language='en'):
+        """generate_response without the cache: (text, model that answered), or (None, None)."""
         if not self.client:
             print("Gemini client not initialized - API key missing")
-            return None
+            return None, None
         
         target_lang = LANGUAGE_MAP.get(language, 'English')
         lang_instruction = f"\n\nRespond entirely in {target_lang}. If the language is '{language}', respond in {target_lang}. Default to English if unsure."
         full_prompt = prompt + lang_instruction
 
         try:
-            # Retry logic with key rotation
-            max_retries = len(self.api_keys)
-            models_to_try = [self.model_name] + self.fallback_models
-            
-            for key_attempt in range(max_retries):
-                for model in models_to_try:
-                    try:
-                         response = self.client.models.generate_content(
-                            model=model,
-                            contents=full_prompt
-                        )
-                         return response.text
-                    except Exception as e:
-                        print(f"Model {model} failed: {e}")
-                        # Continue to next model
-                        continue
-                
-                # If all models fail on this key, rotate
-                print(f"Quota exceeded or all models failed on key index {self.current_key_index}. Rotating key...")
-                if not self._rotate_key():
-                    return None
-            return None
+            response, model = self._generate_content(full_prompt, with_model=True)
+            return response.text, model
         except Exception as e:
             print(f"Gemini Generation Error: {e}")
-            return None
+            return None, None
 
     def analyze_image(self, prompt, image_data, language='en'):
         """
@@ -247,23 +524,8 @@ class GeminiService:
         full_prompt = prompt + lang_instruction
 
         try:
-            # For image analysis, use the vision-capable model
-            models_to_try = [self.model_name] + self.fallback_models
-            
-            for model in models_to_try:
-                try:
-                    response = self.client.models.generate_content(
-                        model=model,
-                        contents=[full_prompt, image_data]
-                    )
-                    return response.text
-                except Exception as e:
-                    print(f"Model {model} failed: {e}. Trying next...")
-                    continue
-            
-            # If all models fail (image analysis often doesn't rotate keys as strictly in this snippet, can add if needed)
-            print("All image analysis models failed.")
-            return None
+            response = self._generate_content([full_prompt, image_data])
+            return response.text
         except Exception as e:
             print(f"Gemini Image Analysis Error: {e}")
             return None
@@ -316,12 +578,95 @@ class GeminiService:
         if language == 'en' or not text:
             return text
         
+        cached = translation_cache.get_any(text, language, self.all_models())
+        if cached is not None:
+            return cached
+        
         target_lang = LANGUAGE_MAP.get(language, 'English')
         prompt = f"Translate the word or short phrase '{text}' to {target_lang}. Return ONLY the translated word/phrase, with no extra punctuation, whitespace, or explanation."
         
-        translated = self.generate_response(prompt, language='en')
+        translated, model = self._generate_text(prompt, language='en')
         if translated:
-            return translated.strip()
+            translated = translated.strip()
+            translation_cache.set(text, language, model, translated)
+            return translated
         return text
 
+    def translate_many(self, texts, language):
+        """
+        Translates several strings (names, messages, explanation lines) in a single
+        Gemini call. Results come back in the same order as `texts`; any string the
+        batch response doesn't cover is translated on its own. When the batch call
+        fails outright, the untranslated strings are returned.
+        """
+        texts = list(texts)
+        if language == 'en' or not texts:
+            return texts
+        
+        results = list(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            cached = translation_cache.get_any(text, language, self.all_models())
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+        
+        if not pending:
+            return results
+        
+        target_lang = LANGUAGE_MAP.get(language, 'English')
+        payload = json.dumps({str(n): texts[i] for n, i in enumerate(pending)}, ensure_ascii=False)
+        prompt = f"""Translate every value in the JSON object below to {target_lang}.
+        Keep the keys unchanged and keep numbers and units as they are.
+        Return ONLY a JSON object mapping each key to its translated string.
+
+        {payload}"""
+        
+        response_text, model = self._generate_text(prompt, language)
+        if not response_text:
+            # Gemini is unreachable: per-item calls would only wait out the same failures
+            print("Batch translation failed, returning untranslated text")
+            return results
+
+        try:
+            response_text = response_text.strip()
+            if response_text.startswith('```json'):
+                response_text = response_text[7:-3]
+            elif response_text.startswith('```'):
+                response_text = response_text[3:-3]
+            translated = json.loads(response_text)
+            if not isinstance(translated, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            print(f"Batch translation parse error, falling back per item: {e}")
+            translated = {}
+        
+        single_failed = False
+        for n, i in enumerate(pending):
+            value = translated.get(str(n))
+            if isinstance(value, str) and value.strip():
+                results[i] = value.strip()
+                translation_cache.set(texts[i], language, model, results[i])
+            elif not single_failed:
+                single = self._translate_single(texts[i], language)
+                if single is None:
+                    # Don't repeat a failing call for every remaining item
+                    single_failed = True
+                else:
+                    results[i] = single
+        return results
+
+    def _translate_single(self, text, language):
+        """Per-item fallback for translate_many. Returns None when Gemini gave no answer."""
+        prompt = f"Translate the following text. Return ONLY the translated string without quotes:\n\n{text}"
+        translated, model = self._generate_text(prompt, language)
+        if translated:
+            translated = translated.strip()
+            translation_cache.set(text, language, model, translated)
+            return translated
+        return None
+
 gemini_service = GeminiService()
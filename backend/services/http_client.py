@@ -0,0 +1,136 @@
+"""
+Shared HTTP client for external APIs (OpenWeatherMap, SoilGrids, Google
+geocoding, data.gov.in).
+
+Each upstream host gets its own pooled requests.Session, so repeat calls reuse
+keep-alive connections instead of paying DNS + TCP + TLS setup every time.
+Timeouts are set per host. Connection errors, timeouts, 429 and 5xx responses
+are retried with jittered exponential backoff (Retry-After is honoured up to
+the backoff cap). Per-host request metrics are exposed via stats().
+"""
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connection pools kept per session, and connections kept per pool
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 16))
+# Retries after the first attempt on connection errors, timeouts, 429 and 5xx
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.5))
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 8))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv('HTTP_DEFAULT_TIMEOUT', 10))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Read timeouts per upstream host, in seconds
+HOST_TIMEOUTS = {
+    'api.openweathermap.org': 5,
+    'rest.isric.org': 10,
+    'maps.googleapis.com': 5,
+    'api.data.gov.in': 30,
+}
+# e.g. HTTP_HOST_TIMEOUTS="api.data.gov.in=20,rest.isric.org=15"
+for _entry in filter(None, os.getenv('HTTP_HOST_TIMEOUTS', '').split(',')):
+    _host, _, _seconds = _entry.partition('=')
+    HOST_TIMEOUTS[_host.strip()] = float(_seconds)
+
+
+class HttpClient:
+    def __init__(self, max_retries=HTTP_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._sessions = {}
+        self._metrics = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _session(self, host):
+        with self._lock:
+            # Pooled sockets must not be shared across a gunicorn fork
+            if self._pid != os.getpid():
+                self._sessions = {}
+                self._pid = os.getpid()
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Retries are handled in get() so they can be jittered and counted
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                                      pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def _record(self, host, latency, status=None, error=False, retry=False):
+        with self._lock:
+            m = self._metrics.setdefault(host, {
+                "requests": 0, "retries": 0, "errors": 0, "statuses": {},
+                "latency_ms_total": 0.0, "latency_ms_max": 0.0
+            })
+            if retry:
+                m["retries"] += 1
+                return
+            m["requests"] += 1
+            latency_ms = latency * 1000
+            m["latency_ms_total"] += latency_ms
+            m["latency_ms_max"] = max(m["latency_ms_max"], latency_ms)
+            if error:
+                m["errors"] += 1
+            else:
+                m["statuses"][str(status)] = m["statuses"].get(str(status), 0) + 1
+
+    @staticmethod
+    def _backoff(attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        # Full jitter keeps several workers from retrying in lockstep
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+    def get(self, url, timeout=None, retries=None, **kwargs):
+        """GET through the host's pooled session. Returns the final Response (which may
+        still be a 429/5xx once retries run out) or raises the last requests exception."""
+        host = urlsplit(url).hostname or ''
+        read_timeout = timeout if timeout is not None else HOST_TIMEOUTS.get(host, HTTP_DEFAULT_TIMEOUT)
+        retries = self.max_retries if retries is None else retries
+        session = self._session(host)
+
+        for attempt in range(retries + 1):
+            last_attempt = attempt == retries
+            start = time.time()
+            try:
+                response = session.get(url, timeout=(HTTP_CONNECT_TIMEOUT, read_timeout), **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(host, time.time() - start, error=True)
+                if last_attempt:
+                    raise
+                self._record(host, 0, retry=True)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            self._record(host, time.time() - start, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            self._record(host, 0, retry=True)
+            time.sleep(self._backoff(attempt, response))
+
+    def stats(self):
+        with self._lock:
+            return {
+                host: {
+                    **{k: v for k, v in m.items() if k != "latency_ms_total"},
+                    "statuses": dict(m["statuses"]),
+                    "latency_ms_avg": round(m["latency_ms_total"] / m["requests"], 1) if m["requests"] else None,
+                    "latency_ms_max": round(m["latency_ms_max"], 1),
+                }
+                for host, m in self._metrics.items()
+            }
+
+
+http_client = HttpClient()
@@ -0,0 +1,256 @@
+"""
+Result cache for near-duplicate leaf and soil photos.
+
+Farmers re-upload the same photo (or another shot of the same leaf) when an
+answer is slow, and each upload would run the disease CNN or a Gemini Vision
+call again. Results are therefore cached under a perceptual hash of the
+image: a 64-bit pHash (low frequencies of a 32x32 DCT) or dHash (signs of
+horizontal gradients), which barely changes under re-compression, resizing
+or small shifts. A lookup returns the closest cached image within
+IMAGE_CACHE_<NAMESPACE>_DISTANCE bits (Hamming distance), found through a
+BK-tree so only a few hashes are compared.
+
+Perceptual hashes ignore colour, which is what the soil analysis (and part
+of a diagnosis) is about, so an entry also records the image's mean RGB and
+only matches images within IMAGE_CACHE_MAX_COLOR_DELTA of it. Results are
+also keyed by a context (language, model version) that must match exactly.
+
+Entries expire after IMAGE_CACHE_TTL seconds and the least recently used
+ones are evicted beyond IMAGE_CACHE_MAX_ENTRIES per namespace.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+IMAGE_CACHE_HASH = os.getenv('IMAGE_CACHE_HASH', 'phash')
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', 5000))
+IMAGE_CACHE_TTL = float(os.getenv('IMAGE_CACHE_TTL', 24 * 3600))
+IMAGE_CACHE_MAX_COLOR_DELTA = float(os.getenv('IMAGE_CACHE_MAX_COLOR_DELTA', 12))
+# Largest Hamming distance (out of 64 bits) still treated as the same photo
+IMAGE_CACHE_DISTANCES = {
+    "disease": int(os.getenv('IMAGE_CACHE_DISEASE_DISTANCE', 6)),
+    "soil": int(os.getenv('IMAGE_CACHE_SOIL_DISTANCE', 8)),
+}
+DEFAULT_DISTANCE = 6
+
+_PHASH_SIZE = 32
+_PHASH_LOW = 8
+# DCT-II basis, so the 2-D transform is two small matrix products
+_DCT = np.cos(np.pi * (2 * np.arange(_PHASH_SIZE) + 1)[np.newaxis, :] * np.arange(_PHASH_SIZE)[:, np.newaxis]
+              / (2 * _PHASH_SIZE))
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash(image):
+    """64-bit DCT hash: low 8x8 frequencies of the 32x32 grayscale image against their median."""
+    pixels = np.asarray(image.convert('L').resize((_PHASH_SIZE, _PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:_PHASH_LOW, :_PHASH_LOW]
+    return _bits_to_int(low > np.median(low))
+
+
+def dhash(image):
+    """64-bit difference hash: whether each pixel of a 9x8 grayscale image is brighter than its right neighbour."""
+    pixels = np.asarray(image.convert('L').resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+HASHES = {"phash": phash, "dhash": dhash}
+
+
+def mean_color(image):
+    return tuple(float(c) for c in np.asarray(image.convert('RGB').resize((16, 16), Image.BOX), dtype=np.float64)
+                 .reshape(-1, 3).mean(axis=0))
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance. Each node
+    holds the ids of entries with exactly that hash. Removing the last id
+    leaves the node as a routing-only tombstone; the tree is rebuilt once
+    those outnumber live nodes."""
+
+    def __init__(self):
+        self.root = None
+        self.nodes = 0
+        self.tombstones = 0
+
+    @staticmethod
+    def _node(value, ids):
+        return [value, set(ids), {}]
+
+    def add(self, value, entry_id):
+        if self.root is None:
+            self.root = self._node(value, [entry_id])
+            self.nodes = 1
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                if not node[1]:
+                    self.tombstones -= 1
+                node[1].add(entry_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = self._node(value, [entry_id])
+                self.nodes += 1
+                return
+            node = child
+
+    def remove(self, value, entry_id):
+        node = self.root
+        while node is not None:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                if entry_id in node[1]:
+                    node[1].discard(entry_id)
+                    if not node[1]:
+                        self.tombstones += 1
+                break
+            node = node[2].get(distance)
+        if self.tombstones > self.nodes - self.tombstones:
+            self._rebuild()
+
+    def _rebuild(self):
+        live = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if node[1]:
+                live.append((node[0], node[1]))
+            stack.extend(node[2].values())
+        self.root, self.nodes, self.tombstones = None, 0, 0
+        for value, ids in live:
+            for entry_id in ids:
+                self.add(value, entry_id)
+
+    def search(self, value, radius):
+        """(distance, entry id) for every entry within `radius` bits of `value`."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, entry_id) for entry_id in node[1])
+            # Triangle inequality: only subtrees at distance d from this node can hold matches
+            for d, child in node[2].items():
+                if distance - radius <= d <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class ImageResultCache:
+    def __init__(self, max_entries=IMAGE_CACHE_MAX_ENTRIES, ttl=IMAGE_CACHE_TTL, hash_name=IMAGE_CACHE_HASH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hash_name = hash_name if hash_name in HASHES else 'phash'
+        self.enabled = os.getenv('IMAGE_CACHE_ENABLED', 'true').lower() != 'false'
+        self.counters = {}
+        self._spaces = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _space(self, namespace):
+        if namespace not in self._spaces:
+            self._spaces[namespace] = {"tree": BKTree(), "entries": OrderedDict()}
+            self.counters[namespace] = {"hits": 0, "near_hits": 0, "misses": 0, "evicted": 0}
+        return self._spaces[namespace]
+
+    def _remove(self, space, entry_id):
+        entry = space["entries"].pop(entry_id)
+        space["tree"].remove(entry["hash"], entry_id)
+
+    def fingerprint(self, image):
+        """(perceptual hash, mean colour) of an image, both taken from a 64x64 box-filtered copy."""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        small = image.resize((64, 64), Image.BOX, reducing_gap=2.0)
+        return HASHES[self.hash_name](small), mean_color(small)
+
+    def lookup(self, namespace, image_key, context=()):
+        """The cached result for the closest matching image, or None."""
+        image_hash, color = image_key
+        radius = IMAGE_CACHE_DISTANCES.get(namespace, DEFAULT_DISTANCE)
+        now = time.time()
+        with self._lock:
+            space = self._space(namespace)
+            best = None
+            for distance, entry_id in space["tree"].search(image_hash, radius):
+                entry = space["entries"][entry_id]
+                if entry["expires"] < now:
+                    self._remove(space, entry_id)
+                    continue
+                if entry["context"] != context:
+                    continue
+                if max(abs(a - b) for a, b in zip(entry["color"], color)) > IMAGE_CACHE_MAX_COLOR_DELTA:
+                    continue
+                if best is None or distance < best[0]:
+                    best = (distance, entry_id)
+            if best is None:
+                self.counters[namespace]["misses"] += 1
+                return None
+            distance, entry_id = best
+            space["entries"].move_to_end(entry_id)
+            self.counters[namespace]["hits" if distance == 0 else "near_hits"] += 1
+            return copy.deepcopy(space["entries"][entry_id]["value"])
+
+    def store(self, namespace, image_key, context, value):
+        image_hash, color = image_key
+        with self._lock:
+            space = self._space(namespace)
+            entry_id = self._next_id
+            self._next_id += 1
+            space["entries"][entry_id] = {
+                "hash": image_hash, "color": color, "context": context,
+                "value": copy.deepcopy(value), "expires": time.time() + self.ttl,
+            }
+            space["tree"].add(image_hash, entry_id)
+            while len(space["entries"]) > self.max_entries:
+                self._remove(space, next(iter(space["entries"])))
+                self.counters[namespace]["evicted"] += 1
+
+    def get_or_compute(self, namespace, image, context, compute, cacheable=None):
+        """compute() for `image`, or the result cached for a near-identical image
+        with the same context. Results failing cacheable(result) are not stored."""
+        if not self.enabled or image is None:
+            return compute()
+        image_key = self.fingerprint(image)
+        cached = self.lookup(namespace, image_key, context)
+        if cached is not None:
+            return cached
+        value = compute()
+        if cacheable is None or cacheable(value):
+            self.store(namespace, image_key, context, value)
+        return value
+
+    def stats(self):
+        result = {"enabled": self.enabled, "hash": self.hash_name, "max_entries": self.max_entries}
+        for namespace, space in self._spaces.items():
+            c = self.counters[namespace]
+            total = c["hits"] + c["near_hits"] + c["misses"]
+            result[namespace] = {
+                **c,
+                "entries": len(space["entries"]),
+                "max_distance": IMAGE_CACHE_DISTANCES.get(namespace, DEFAULT_DISTANCE),
+                "hit_ratio": round((c["hits"] + c["near_hits"]) / total, 4) if total else 0.0,
+            }
+        return result
+
+
+image_cache = ImageResultCache()
@@ -0,0 +1,199 @@
+"""
+Shared decoding for uploaded photos (disease detection, soil analysis).
+
+Phone photos are 12-50 megapixels, but the models look at 224x224 (disease
+CNN) or 150x150 (soil colour). Decoding such a photo at full size and
+converting it to float64 costs ~100 MB of short-lived arrays per request, so
+uploads are ingested like this instead:
+
+    1. Request bodies over MAX_CONTENT_LENGTH (config.py) are refused by
+       werkzeug before they are read. The spooled upload is then measured
+       as-is (no extra bytes copy) against IMAGE_UPLOAD_MAX_BYTES.
+    2. Only the header is parsed; images of more than IMAGE_MAX_PIXELS or in
+       an unsupported format are rejected before any pixel is decoded.
+    3. When the caller passes a min_size (disease detection), JPEGs are
+       decoded in draft mode: libjpeg scales by 1/2, 1/4 or 1/8 while
+       decoding, landing just above the requested size, so a 12 MP photo
+       aimed at 224x224 decodes to ~500x375 directly.
+    4. Model inputs are produced straight as float32 and scaled in place.
+
+read_upload_batch() collects many images from one request, expanding zip
+archives, and writes each one to a file in a caller-owned directory so that
+decoding processes read them from disk rather than being sent the bytes.
+ImageRejected carries the HTTP status the route should answer with.
+"""
+import io
+import os
+import shutil
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv('IMAGE_UPLOAD_MAX_BYTES', 15 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 64_000_000))
+ALLOWED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "BMP", "GIF", "TIFF"}
+
+
+class ImageRejected(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _too_large(max_bytes):
+    return ImageRejected(f"Image is larger than {round(max_bytes / (1024 * 1024), 1):g} MB", 413)
+
+
+def _upload_stream(source, max_bytes):
+    """A seekable binary stream over `source` (bytes, a werkzeug FileStorage or a file object),
+    after checking its size. File paths are size-checked and returned as they are."""
+    if isinstance(source, (str, os.PathLike)):
+        if os.path.getsize(source) > max_bytes:
+            raise _too_large(max_bytes)
+        return source
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if len(source) > max_bytes:
+            raise _too_large(max_bytes)
+        return io.BytesIO(source)
+
+    stream = getattr(source, 'stream', source)
+    if stream.seekable():
+        # werkzeug spools uploads into a BytesIO or temp file: measure it, don't copy it
+        start = stream.tell()
+        size = stream.seek(0, io.SEEK_END) - start
+        stream.seek(start)
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        return stream
+
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise _too_large(max_bytes)
+    return io.BytesIO(data)
+
+
+def open_upload(source, min_size=None, max_bytes=IMAGE_UPLOAD_MAX_BYTES, max_pixels=IMAGE_MAX_PIXELS):
+    """
+    Decode an uploaded image to RGB, at reduced resolution when possible.
+
+    min_size: (width, height) the caller needs at least; JPEGs are decoded at
+    the smallest 1/2^k scale that still covers it. None decodes at full size.
+    """
+    stream = _upload_stream(source, max_bytes)
+    try:
+        image = Image.open(stream)
+    except Exception:
+        raise ImageRejected("File is not a readable image")
+    if image.format not in ALLOWED_FORMATS:
+        raise ImageRejected(f"Unsupported image format: {image.format}")
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageRejected(f"Image is too large ({width}x{height}); the limit is {max_pixels // 1_000_000} megapixels", 413)
+
+    if min_size and image.format in ("JPEG", "MPO"):
+        image.draft('RGB', (min(min_size[0], width), min(min_size[1], height)))
+    try:
+        image.load()
+    except Exception as e:
+        raise ImageRejected(f"Image could not be decoded: {e}")
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def resized_array(image, size, dtype=np.uint8, resample=Image.BICUBIC):
+    """`image` resized to exactly `size` as an (height, width, 3) array of `dtype`;
+    float arrays are scaled to [0, 1] in place."""
+    if image.size != tuple(size):
+        image = image.resize(tuple(size), resample)
+    array = np.asarray(image, dtype=dtype)
+    if np.issubdtype(array.dtype, np.floating):
+        array /= 255.0
+    return array
+
+
+IMAGE_BATCH_MAX_FILES = int(os.getenv('IMAGE_BATCH_MAX_FILES', 200))
+IMAGE_BATCH_MAX_BYTES = int(os.getenv('IMAGE_BATCH_MAX_BYTES', 256 * 1024 * 1024))
+# Room for multipart boundaries and part headers on top of the file sizes
+MULTIPART_OVERHEAD = 1024 * 1024
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+
+
+def _is_zip(upload):
+    if (upload.filename or '').lower().endswith('.zip') or upload.mimetype in ('application/zip', 'application/x-zip-compressed'):
+        return True
+    stream = upload.stream
+    if not stream.seekable():
+        return False
+    # is_zipfile() leaves the stream wherever it last read
+    start = stream.tell()
+    try:
+        return zipfile.is_zipfile(stream)
+    finally:
+        stream.seek(start)
+
+
+def read_upload_batch(uploads, directory, max_files=IMAGE_BATCH_MAX_FILES, max_bytes=IMAGE_UPLOAD_MAX_BYTES,
+                      max_total=IMAGE_BATCH_MAX_BYTES):
+    """
+    (name, path) for every uploaded image, expanding .zip archives.
+
+    uploads: FileStorage objects (e.g. request.files.getlist('images')), any
+    mix of images and zip archives. Each image is copied into its own file
+    under `directory` (e.g. a tempfile.TemporaryDirectory the caller removes),
+    so the batch is never held in memory. Archive members are size-checked
+    from the zip directory before they are inflated. Images that are too
+    large or cannot be extracted come back as (name, ImageRejected).
+    Raises ImageRejected (413) beyond max_files images or max_total bytes.
+    """
+    items = []
+    total = 0
+
+    def add(name, size, copy):
+        nonlocal total
+        if len(items) >= max_files:
+            raise ImageRejected(f"Too many images; at most {max_files} per request", 413)
+        if size > max_bytes:
+            items.append((name, _too_large(max_bytes)))
+            return
+        total += size
+        if total > max_total:
+            raise ImageRejected(f"Images add up to more than {round(max_total / (1024 * 1024), 1):g} MB", 413)
+        path = os.path.join(directory, f"{len(items):05d}")
+        try:
+            with open(path, 'wb') as out:
+                copy(out)
+            items.append((name, path))
+        except (zipfile.BadZipFile, OSError) as e:
+            items.append((name, ImageRejected(f"Could not extract image: {e}")))
+
+    def copy_member(archive, info):
+        def copy(out):
+            with archive.open(info) as member:
+                shutil.copyfileobj(member, out)
+        return copy
+
+    for upload in uploads:
+        if _is_zip(upload):
+            upload.stream.seek(0)
+            try:
+                archive = zipfile.ZipFile(upload.stream)
+            except zipfile.BadZipFile:
+                raise ImageRejected(f"{upload.filename} is not a valid zip archive")
+            with archive:
+                for info in archive.infolist():
+                    base = os.path.basename(info.filename)
+                    if info.is_dir() or base.startswith('.') or '__MACOSX' in info.filename:
+                        continue
+                    if not base.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    add(info.filename, info.file_size, copy_member(archive, info))
+        else:
+            stream = _upload_stream(upload, max_total)
+            start = stream.tell()
+            size = stream.seek(0, io.SEEK_END) - start
+            stream.seek(start)
+            add(upload.filename or f"image_{len(items) + 1}", size, lambda out: shutil.copyfileobj(stream, out))
+    return items
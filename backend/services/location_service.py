@@ -2,8 +2,20 @@
 Location-based services for auto-fetching weather and regional soil data.
 This helps uneducated farmers by automatically getting climate data.
 """
-import requests
 import os
+import statistics
+from collections import Counter
+from types import MappingProxyType
+
+from services.http_client import http_client
+from services.weather_cache import weather_cache
+from services.district_gazetteer import gazetteer, PointIndex
+from services.soilgrids_store import (
+    soilgrids_cache,
+    soilgrids_grid,
+    PROPERTIES as SOILGRIDS_PROPERTIES,
+    SOILGRIDS_OFFLINE
+)
 
 # Regional soil data for major Indian states/districts
 # Based on average soil characteristics from government soil health databases
@@ -973,10 +985,76 @@ STATES_DISTRICTS = {
 }
 
 
+def _fetch_current_weather(lat, lon, api_key):
+    """Current conditions from OpenWeatherMap, or None if the call fails."""
+    current_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
+    response = http_client.get(current_url)
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    return {
+        "temperature": round(data["main"]["temp"]),
+        "humidity": data["main"]["humidity"],
+        "rainfall": data.get("rain", {}).get("1h", 0) * 24 * 30,  # Estimate monthly
+        "wind": round(data.get("wind", {}).get("speed", 0) * 3.6),  # convert m/s to km/h
+        "condition": data.get("weather", [{}])[0].get("main", "Clear")
+    }
+
+
+def _fetch_forecast(lat, lon, api_key):
+    """Next three days from the 5 day / 3 hour forecast, or None if the call fails."""
+    import datetime
+    forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric"
+    f_response = http_client.get(forecast_url)
+    if f_response.status_code != 200:
+        return None
+    f_data = f_response.json()
+    forecast = []
+    seen_dates = set()
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    
+    for item in f_data.get("list", []):
+        date_str = item["dt_txt"].split(" ")[0]
+        # Pick the first reading of a future day
+        if date_str != today and date_str not in seen_dates:
+            seen_dates.add(date_str)
+            dt = datetime.datetime.strptime(date_str, "%Y-%m-%d")
+            forecast.append({
+                "day": dt.strftime("%a"),
+                "temp": round(item["main"]["temp_max"]),
+                "condition": item["weather"][0]["main"]
+            })
+            if len(forecast) >= 3:
+                break
+    return forecast
+
+
+# Returned when the weather lookup fails
+DEFAULT_WEATHER = {"temperature": 25, "humidity": 70, "rainfall": 100, "condition": "Clear", "wind": 10}
+
+# Seasonal weather defaults for India, used when no OpenWeatherMap key is configured
+SEASONAL_WEATHER = {
+    "winter": {"temperature": 20, "condition": "Clear", "humidity": 60, "wind": 10, "rainfall": 20},
+    "summer": {"temperature": 35, "condition": "Sunny", "humidity": 40, "wind": 15, "rainfall": 10},
+    "monsoon": {"temperature": 28, "condition": "Rain", "humidity": 85, "wind": 20, "rainfall": 250},
+    "post_monsoon": {"temperature": 25, "condition": "Clouds", "humidity": 70, "wind": 12, "rainfall": 50},
+}
+
+
+def season_for_month(month):
+    if month in [12, 1, 2]:
+        return "winter"
+    if month in [3, 4, 5]:
+        return "summer"
+    if month in [6, 7, 8, 9]:
+        return "monsoon"
+    return "post_monsoon"
+
+
 def get_weather_by_coordinates(lat, lon):
     """
     Fetch current weather data using coordinates.
-    Uses OpenWeatherMap free API.
+    Uses OpenWeatherMap free API, cached per geohash cell (see weather_cache).
     """
     try:
         # Using a free weather API (OpenWeatherMap)
@@ -985,60 +1063,26 @@ def get_weather_by_coordinates(lat, lon):
         # If no API key or demo key, return average values based on season
         if api_key == 'demo' or not api_key:
             import datetime
-            month = datetime.datetime.now().month
-            
-            # Seasonal defaults for India
-            if month in [12, 1, 2]:  # Winter
-                return {"temperature": 20, "condition": "Clear", "humidity": 60, "wind": 10, "rainfall": 20, "forecast": []}
-            elif month in [3, 4, 5]:  # Summer
-                return {"temperature": 35, "condition": "Sunny", "humidity": 40, "wind": 15, "rainfall": 10, "forecast": []}
-            elif month in [6, 7, 8, 9]:  # Monsoon
-                return {"temperature": 28, "condition": "Rain", "humidity": 85, "wind": 20, "rainfall": 250, "forecast": []}
-            else:  # Post-monsoon
-                return {"temperature": 25, "condition": "Clouds", "humidity": 70, "wind": 12, "rainfall": 50, "forecast": []}
-        
-        current_url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-        response = requests.get(current_url, timeout=5)
+            season = season_for_month(datetime.datetime.now().month)
+            return {**SEASONAL_WEATHER[season], "forecast": []}
         
-        weather_data = {"temperature": 25, "humidity": 70, "rainfall": 100, "condition": "Clear", "wind": 10, "forecast": []}
+        weather_data = {**DEFAULT_WEATHER, "forecast": []}
 
-        if response.status_code == 200:
-            data = response.json()
-            weather_data["temperature"] = round(data["main"]["temp"])
-            weather_data["humidity"] = data["main"]["humidity"]
-            weather_data["rainfall"] = data.get("rain", {}).get("1h", 0) * 24 * 30  # Estimate monthly
-            weather_data["wind"] = round(data.get("wind", {}).get("speed", 0) * 3.6) # convert m/s to km/h
-            weather_data["condition"] = data.get("weather", [{}])[0].get("main", "Clear")
+        current = weather_cache.get_or_fetch("current", lat, lon, lambda: _fetch_current_weather(lat, lon, api_key))
+        if current:
+            weather_data.update(current)
             
         # 2. Forecast Data (5 day / 3 hour)
-        forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-        f_response = requests.get(forecast_url, timeout=5)
-        if f_response.status_code == 200:
-            f_data = f_response.json()
-            seen_dates = set()
-            import datetime
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            
-            for item in f_data.get("list", []):
-                date_str = item["dt_txt"].split(" ")[0]
-                # Pick the first reading of a future day
-                if date_str != today and date_str not in seen_dates:
-                    seen_dates.add(date_str)
-                    dt = datetime.datetime.strptime(date_str, "%Y-%m-%d")
-                    weather_data["forecast"].append({
-                        "day": dt.strftime("%a"),
-                        "temp": round(item["main"]["temp_max"]),
-                        "condition": item["weather"][0]["main"]
-                    })
-                    if len(weather_data["forecast"]) >= 3:
-                        break
+        forecast = weather_cache.get_or_fetch("forecast", lat, lon, lambda: _fetch_forecast(lat, lon, api_key))
+        if forecast:
+            weather_data["forecast"] = list(forecast)
                         
         return weather_data
     except Exception as e:
         print(f"Weather API error: {e}")
     
     # Default fallback
-    return {"temperature": 25, "humidity": 70, "rainfall": 100, "condition": "Clear", "wind": 10, "forecast": []}
+    return {**DEFAULT_WEATHER, "forecast": []}
 
 
 def get_weather_by_location(state, district):
@@ -1060,108 +1104,209 @@ def get_weather_by_location(state, district):
     if coords:
         return get_weather_by_coordinates(coords[0], coords[1])
     
+    # Any other district (or an unknown district of a known state) via the gazetteer
+    coords = gazetteer.coordinates_for(state, district)
+    if coords:
+        return get_weather_by_coordinates(coords[0], coords[1])
+    
     # Return seasonal defaults
     return get_weather_by_coordinates(20, 78)
 
 
+def _soilgrids_to_soil(raw, source):
+    """Convert raw SoilGrids values to the N/P/K/pH/organic-carbon estimates the app uses."""
+    nitrogen_raw = raw.get("nitrogen")  # cg/kg → divide by 100 for g/kg
+    ph_raw = raw.get("phh2o")  # pH*10 → divide by 10
+    ocd_raw = raw.get("ocd")  # hg/dm³ organic carbon density
+    cec_raw = raw.get("cec")  # mmol(c)/kg cation exchange capacity
+    
+    # Convert to usable values
+    N_est = round(nitrogen_raw / 100 * 10, 1) if nitrogen_raw else 40  # Approximate N in mg/kg
+    ph_est = round(ph_raw / 10, 1) if ph_raw else 7.0
+    oc_est = round(ocd_raw / 10, 1) if ocd_raw else 0.5  # g/dm³
+    
+    # Estimate P and K from organic carbon and CEC (heuristic)
+    P_est = round(max(15, min(80, (oc_est * 3) + 20)), 1)
+    K_est = round(max(20, min(90, (cec_raw / 10) + 25 if cec_raw else 40)), 1)
+    
+    return {
+        "success": True,
+        "N": N_est,
+        "P": P_est,
+        "K": K_est,
+        "ph": ph_est,
+        "organic_carbon": oc_est,
+        "source": source,
+        "note": "P and K are estimated from organic carbon and CEC. For exact values, use lab testing."
+    }
+
+
+def _fetch_soilgrids_raw(lat, lon):
+    """Raw 0-5 cm mean values from the SoilGrids REST API v2.0, or None if the call fails."""
+    url = (
+        f"https://rest.isric.org/soilgrids/v2.0/properties/query"
+        f"?lon={lon}&lat={lat}"
+        f"&property=nitrogen&property=phh2o&property=ocd&property=cec"
+        f"&depth=0-5cm&value=mean"
+    )
+    response = http_client.get(url)
+    if response.status_code != 200:
+        print(f"[SoilGrids] API returned HTTP {response.status_code}")
+        return None
+    
+    raw = {name: None for name in SOILGRIDS_PROPERTIES}
+    for layer in response.json().get("properties", {}).get("layers", []):
+        name = layer.get("name", "")
+        depths = layer.get("depths", [])
+        if name in raw and depths:
+            raw[name] = depths[0].get("values", {}).get("mean")
+    return raw
+
+
 def fetch_soilgrids_data(lat, lon):
     """
-    Fetch real soil data from the SoilGrids REST API (ISRIC).
+    Fetch real soil data from SoilGrids (ISRIC).
     Returns estimated N, P, K, pH, organic_carbon for the location.
-    Falls back to regional data if API is unreachable.
+    Looks in the offline grid, then the permanent cell cache, then calls the API
+    (unless SOILGRIDS_OFFLINE is set). Returns None so callers can fall back to regional data.
     """
     try:
-        # SoilGrids REST API v2.0
-        url = (
-            f"https://rest.isric.org/soilgrids/v2.0/properties/query"
-            f"?lon={lon}&lat={lat}"
-            f"&property=nitrogen&property=phh2o&property=ocd&property=cec"
-            f"&depth=0-5cm&value=mean"
-        )
-        response = requests.get(url, timeout=10)
+        raw = soilgrids_grid.lookup(lat, lon)
+        if raw is not None:
+            return _soilgrids_to_soil(raw, "SoilGrids offline grid (ISRIC)")
         
-        if response.status_code == 200:
-            data = response.json()
-            layers = data.get("properties", {}).get("layers", [])
-            
-            nitrogen_raw = None
-            ph_raw = None
-            ocd_raw = None
-            cec_raw = None
-            
-            for layer in layers:
-                name = layer.get("name", "")
-                depths = layer.get("depths", [])
-                if depths:
-                    val = depths[0].get("values", {}).get("mean")
-                    if name == "nitrogen" and val is not None:
-                        nitrogen_raw = val  # cg/kg → divide by 100 for g/kg
-                    elif name == "phh2o" and val is not None:
-                        ph_raw = val  # pH*10 → divide by 10
-                    elif name == "ocd" and val is not None:
-                        ocd_raw = val  # hg/dm³ organic carbon density
-                    elif name == "cec" and val is not None:
-                        cec_raw = val  # mmol(c)/kg cation exchange capacity
-            
-            # Convert to usable values
-            N_est = round(nitrogen_raw / 100 * 10, 1) if nitrogen_raw else 40  # Approximate N in mg/kg
-            ph_est = round(ph_raw / 10, 1) if ph_raw else 7.0
-            oc_est = round(ocd_raw / 10, 1) if ocd_raw else 0.5  # g/dm³
-            
-            # Estimate P and K from organic carbon and CEC (heuristic)
-            P_est = round(max(15, min(80, (oc_est * 3) + 20)), 1)
-            K_est = round(max(20, min(90, (cec_raw / 10) + 25 if cec_raw else 40)), 1)
-            
-            return {
-                "success": True,
-                "N": N_est,
-                "P": P_est,
-                "K": K_est,
-                "ph": ph_est,
-                "organic_carbon": oc_est,
-                "source": "SoilGrids API (ISRIC)",
-                "note": "P and K are estimated from organic carbon and CEC. For exact values, use lab testing."
-            }
-        else:
-            print(f"[SoilGrids] API returned HTTP {response.status_code}")
+        raw = soilgrids_cache.get(lat, lon)
+        if raw is not None:
+            return _soilgrids_to_soil(raw, "SoilGrids API (ISRIC)")
+        
+        if SOILGRIDS_OFFLINE:
+            return None
+        
+        raw = _fetch_soilgrids_raw(lat, lon)
+        if raw is not None:
+            soilgrids_cache.set(lat, lon, raw)
+            return _soilgrids_to_soil(raw, "SoilGrids API (ISRIC)")
     except Exception as e:
         print(f"[SoilGrids] API error: {e}")
     
     return None
 
 
+# Districts further than this from any profiled district use the state average instead
+NEAREST_SOIL_MAX_KM = 150
+
+SOIL_SUMMARY_PARAMS = ("N", "P", "K", "ph")
+
+
+def _build_regional_soil_store():
+    """
+    Read-only views over REGIONAL_SOIL_DATA, built once at import:
+    - by_state: state -> ((district, profile), ...)
+    - summary: state -> mean/min/max/std of N, P, K, pH and the dominant soil_type
+    - averages: state -> the rounded means served as "State average data"
+    """
+    grouped = {}
+    for (state, district), profile in REGIONAL_SOIL_DATA.items():
+        grouped.setdefault(state, []).append((district, MappingProxyType(dict(profile))))
+
+    by_state, summary, averages = {}, {}, {}
+    for state in sorted(grouped):
+        profiles = [profile for _, profile in grouped[state]]
+        stats = {}
+        for param in SOIL_SUMMARY_PARAMS:
+            values = [profile[param] for profile in profiles]
+            stats[param] = MappingProxyType({
+                "mean": round(statistics.fmean(values), 2),
+                "min": min(values),
+                "max": max(values),
+                "std": round(statistics.pstdev(values), 2)
+            })
+        soil_types = Counter(profile["soil_type"] for profile in profiles)
+        by_state[state] = tuple(grouped[state])
+        summary[state] = MappingProxyType({
+            "districts": len(profiles),
+            **stats,
+            "dominant_soil_type": soil_types.most_common(1)[0][0]
+        })
+        averages[state] = MappingProxyType({
+            "N": round(sum(p["N"] for p in profiles) / len(profiles)),
+            "P": round(sum(p["P"] for p in profiles) / len(profiles)),
+            "K": round(sum(p["K"] for p in profiles) / len(profiles)),
+            "ph": round(sum(p["ph"] for p in profiles) / len(profiles), 1)
+        })
+    return MappingProxyType(by_state), MappingProxyType(summary), MappingProxyType(averages)
+
+
+REGIONAL_SOIL_BY_STATE, STATE_SOIL_SUMMARY, STATE_SOIL_AVERAGES = _build_regional_soil_store()
+_SOIL_PROFILES = MappingProxyType({
+    (state, district): profile
+    for state, districts in REGIONAL_SOIL_BY_STATE.items()
+    for district, profile in districts
+})
+
+# Spatial indexes over profiled districts, per state and overall
+_STATE_SOIL_INDEX = {
+    state: PointIndex(gazetteer, [(state, district) for district, _ in districts])
+    for state, districts in REGIONAL_SOIL_BY_STATE.items()
+}
+_SOIL_INDEX = PointIndex(gazetteer, _SOIL_PROFILES)
+
+
+def get_state_soil_summary(state=None):
+    """
+    Per-state soil aggregates (mean/min/max/std of N, P, K, pH and dominant soil type).
+    Returns one state's summary, or all of them when state is None.
+    """
+    if state is not None:
+        summary = STATE_SOIL_SUMMARY.get(state)
+        return _plain(summary) if summary is not None else None
+    return {name: _plain(summary) for name, summary in STATE_SOIL_SUMMARY.items()}
+
+
+def _plain(summary):
+    """JSON-serialisable copy of a frozen summary."""
+    return {key: dict(value) if isinstance(value, MappingProxyType) else value for key, value in summary.items()}
+
+
+def _district_soil(key, source, distance_km=None):
+    data = _SOIL_PROFILES[key]
+    result = {
+        "success": True,
+        "N": data["N"],
+        "P": data["P"],
+        "K": data["K"],
+        "ph": data["ph"],
+        "soil_type": data["soil_type"],
+        "source": source
+    }
+    if distance_km is not None:
+        result["nearest_district"] = key[1]
+        result["distance_km"] = round(distance_km, 1)
+    return result
+
+
 def get_regional_soil_data(state, district):
     """
     Get average soil data for a region.
-    Returns estimated N, P, K, pH values.
+    Returns estimated N, P, K, pH values: the district's own profile, else the
+    nearest profiled district of the same state, else the state average.
     """
-    data = REGIONAL_SOIL_DATA.get((state, district))
-    if data:
-        return {
-            "success": True,
-            "N": data["N"],
-            "P": data["P"],
-            "K": data["K"],
-            "ph": data["ph"],
-            "soil_type": data["soil_type"],
-            "source": "Regional average data"
-        }
+    if (state, district) in _SOIL_PROFILES:
+        return _district_soil((state, district), "Regional average data")
+    
+    coords = gazetteer.coordinates.get((state, district))
+    if coords and state in _STATE_SOIL_INDEX:
+        key, distance_km = _STATE_SOIL_INDEX[state].nearest(*coords)
+        if key and distance_km <= NEAREST_SOIL_MAX_KM:
+            return _district_soil(key, f"Nearest district data ({key[1]})", distance_km)
     
     # Return state-level average if district not found
-    state_data = [v for k, v in REGIONAL_SOIL_DATA.items() if k[0] == state]
-    if state_data:
-        avg_n = sum(d["N"] for d in state_data) / len(state_data)
-        avg_p = sum(d["P"] for d in state_data) / len(state_data)
-        avg_k = sum(d["K"] for d in state_data) / len(state_data)
-        avg_ph = sum(d["ph"] for d in state_data) / len(state_data)
-        
+    if state in STATE_SOIL_AVERAGES:
         return {
             "success": True,
-            "N": round(avg_n),
-            "P": round(avg_p),
-            "K": round(avg_k),
-            "ph": round(avg_ph, 1),
+            **STATE_SOIL_AVERAGES[state],
             "soil_type": "mixed",
+            "dominant_soil_type": STATE_SOIL_SUMMARY[state]["dominant_soil_type"],
             "source": "State average data"
         }
     
@@ -1177,6 +1322,22 @@ def get_regional_soil_data(state, district):
     }
 
 
+def get_soil_by_coordinates(lat, lon):
+    """
+    Soil profile for a GPS position: the nearest profiled district if it is within
+    NEAREST_SOIL_MAX_KM, otherwise the regional lookup for the district containing the point.
+    """
+    key, distance_km = _SOIL_INDEX.nearest(lat, lon)
+    if key and distance_km <= NEAREST_SOIL_MAX_KM:
+        return _district_soil(key, f"Nearest district data ({key[1]})", distance_km)
+    
+    nearest = gazetteer.nearest(lat, lon)
+    if nearest:
+        result = get_regional_soil_data(nearest[0]["state"], nearest[0]["district"])
+        return {**result, "state": nearest[0]["state"], "district": nearest[0]["district"]}
+    return get_regional_soil_data(None, None)
+
+
 def get_soil_data_by_type(soil_type):
     """
     Get NPK values based on visual soil type selection.
@@ -1239,17 +1400,39 @@ def convert_simple_to_technical(simple_input):
     return result
 
 
-def get_location_details(lat, lon):
+def get_offline_location_details(lat, lon):
+    """
+    Reverse geocode to the nearest district in the gazetteer (no network call).
+    """
+    nearest = gazetteer.nearest(lat, lon)
+    if not nearest:
+        return {"success": False, "error": "District gazetteer not available"}
+    match = nearest[0]
+    return {
+        "success": True,
+        "state": match["state"],
+        "district": match["district"],
+        "city": "",
+        "mandal": "",
+        "formatted_address": f"{match['district']}, {match['state']}, India",
+        "distance_km": match["distance_km"],
+        "source": "offline"
+    }
+
+
+def get_location_details(lat, lon, offline=False):
     """
     Reverse geocode coordinates using Google Maps Geocoding API.
+    Uses the offline gazetteer when asked to, when REVERSE_GEOCODE_OFFLINE is set,
+    or when no API key is configured.
     """
     try:
         api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-        if not api_key:
-            return {"success": False, "error": "Geocoding API Key not configured"}
+        if offline or not api_key or os.getenv('REVERSE_GEOCODE_OFFLINE', 'false').lower() == 'true':
+            return get_offline_location_details(lat, lon)
             
         url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lon}&key={api_key}"
-        response = requests.get(url, timeout=5)
+        response = http_client.get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -1285,5 +1468,5 @@ def get_location_details(lat, lon):
                 }
         return {"success": False, "error": "No results found"}
     except Exception as e:
-        print(f"Geocoding API error: {e}")
-        return {"success": False, "error": str(e)}
+        print(f"Geocoding API error: {e} — using offline gazetteer")
+        return get_offline_location_details(lat, lon)
@@ -1,9 +1,77 @@
 import requests
+import statistics
 from datetime import datetime
 
+from services.http_client import http_client
+
 API_KEY = "579b464db66ec23bdd000001c7e1e45ebbd846ca6ab16ff56074f14e"
 BASE_URL = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
 
+# Rows per executemany batch when writing synced records
+SYNC_CHUNK_SIZE = 500
+# Columns a re-synced report overwrites on its existing row (plus updated_at)
+PRICE_COLUMNS = ("min_price", "max_price", "modal_price")
+# Cached prices older than this are flagged stale and queued for a background refresh
+STALE_HOURS = 6
+# Most recent rows per tuple read when rebuilding its price summary
+# (the natural key allows one report per day, so this covers the 30-day window)
+SUMMARY_WINDOW_ROWS = 31
+
+
+def _parse_arrival_date(value):
+    """Agmarknet reports arrival dates as dd/mm/yyyy."""
+    try:
+        return datetime.strptime(value, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        return None
+
+
+def _price_trend(latest, previous):
+    if previous is None or latest is None:
+        return "stable"
+    if latest > previous:
+        return "increasing"
+    if latest < previous:
+        return "decreasing"
+    return "stable"
+
+
+def _summarize_prices(rows):
+    """Summary columns for one tuple from its most recent rows as (id, modal_price, arrival_date),
+    newest id first. Windows are measured back from the newest parseable arrival date;
+    without dates they fall back to the last 7 / 30 reports."""
+    latest_id, latest_price, latest_date = rows[0]
+    previous_price = rows[1][1] if len(rows) > 1 else None
+
+    dated = [(_parse_arrival_date(arrival_date), price) for _, price, arrival_date in rows if price]
+    dated = [(day, price) for day, price in dated if day is not None]
+    if dated:
+        anchor = max(day for day, _ in dated)
+        window_7 = [price for day, price in dated if (anchor - day).days < 7]
+        window_30 = [price for day, price in dated if (anchor - day).days < 30]
+    else:
+        prices = [price for _, price, _ in rows if price]
+        window_7, window_30 = prices[:7], prices[:30]
+
+    volatility = None
+    if len(window_30) > 1:
+        mean_30 = statistics.fmean(window_30)
+        if mean_30:
+            volatility = round(statistics.pstdev(window_30) / mean_30 * 100, 2)
+
+    return {
+        "latest_price_id": latest_id,
+        "latest_price": latest_price,
+        "previous_price": previous_price,
+        "latest_arrival_date": latest_date,
+        "avg_7d": round(statistics.fmean(window_7), 2) if window_7 else None,
+        "avg_30d": round(statistics.fmean(window_30), 2) if window_30 else None,
+        "volatility_30d": volatility,
+        "samples_30d": len(window_30),
+        "trend": _price_trend(latest_price, previous_price),
+    }
+
+
 class MarketService:
     @staticmethod
     def sync_market_data(limit=500, state=None, market=None, commodity=None):
@@ -22,38 +90,14 @@ class MarketService:
                 url += f"&filters[commodity]={requests.utils.quote(commodity)}"
 
             print(f"[MarketService] Fetching from Agmarknet: limit={limit}, state={state}, market={market}, commodity={commodity}")
-            response = requests.get(url, timeout=30)
+            response = http_client.get(url)
             if response.status_code == 200:
                 data = response.json()
                 records = data.get('records', [])
                 print(f"[MarketService] Got {len(records)} records from API (total available: {data.get('total', '?')})")
                 
-                for record in records:
-                    existing = MarketPrice.query.filter_by(
-                        state=record.get('state'),
-                        market=record.get('market'),
-                        commodity=record.get('commodity'),
-                        arrival_date=record.get('arrival_date')
-                    ).first()
-                    
-                    if existing:
-                        existing.min_price = float(record.get('min_price', 0) or 0)
-                        existing.max_price = float(record.get('max_price', 0) or 0)
-                        existing.modal_price = float(record.get('modal_price', 0) or 0)
-                    else:
-                        new_price = MarketPrice(
-                            state=record.get('state'),
-                            district=record.get('district'),
-                            market=record.get('market'),
-                            commodity=record.get('commodity'),
-                            min_price=float(record.get('min_price', 0) or 0),
-                            max_price=float(record.get('max_price', 0) or 0),
-                            modal_price=float(record.get('modal_price', 0) or 0),
-                            arrival_date=record.get('arrival_date')
-                        )
-                        db.session.add(new_price)
-                
-                db.session.commit()
+                counts = MarketService.bulk_upsert_records(records)
+                print(f"[MarketService] Upserted {counts['upserted']} rows ({counts['undated']} without an arrival date)")
                 return len(records)
             else:
                 print(f"[MarketService] Error fetching data: HTTP {response.status_code}")
@@ -63,6 +107,166 @@ class MarketService:
             print(f"[MarketService] Exception in sync_market_data: {e}")
             return 0
 
+    @staticmethod
+    def _upsert_statement(dialect_name):
+        """INSERT ... ON DUPLICATE KEY / ON CONFLICT against the natural key, refreshing
+        the prices of rows that already exist."""
+        from models.market_price import MarketPrice
+        
+        if dialect_name in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(MarketPrice)
+            return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in PRICE_COLUMNS + ("updated_at",)})
+        if dialect_name in ('sqlite', 'postgresql'):
+            if dialect_name == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(MarketPrice)
+            return stmt.on_conflict_do_update(
+                index_elements=[MarketPrice.state, MarketPrice.market, MarketPrice.commodity, MarketPrice.arrival_date],
+                set_={column: stmt.excluded[column] for column in PRICE_COLUMNS + ("updated_at",)}
+            )
+        raise NotImplementedError(f"No market price upsert for the {dialect_name} dialect")
+
+    @staticmethod
+    def bulk_upsert_records(records, chunk_size=SYNC_CHUNK_SIZE):
+        """Insert or update Agmarknet records keyed on (state, market, commodity, arrival_date).
+        Each chunk is one executemany upsert against the unique natural key, so
+        overlapping syncs can't collide on it. Records without an arrival date
+        aren't covered by the unique index (NULLs never conflict) and are matched
+        on arrival_date IS NULL instead. Returns {"upserted": n, "undated": n}."""
+        from models.market_price import MarketPrice
+        from extensions import db
+        from sqlalchemy import insert, update, tuple_
+        
+        # Collapse duplicates within the batch; the last record for a key wins
+        rows = {}
+        for record in records:
+            key = (record.get('state'), record.get('market'), record.get('commodity'), record.get('arrival_date'))
+            rows[key] = {
+                "state": record.get('state'),
+                "district": record.get('district'),
+                "market": record.get('market'),
+                "commodity": record.get('commodity'),
+                "min_price": float(record.get('min_price', 0) or 0),
+                "max_price": float(record.get('max_price', 0) or 0),
+                "modal_price": float(record.get('modal_price', 0) or 0),
+                "arrival_date": record.get('arrival_date'),
+            }
+        
+        now = datetime.utcnow()
+        dated = [{**row, "updated_at": now} for key, row in rows.items() if key[3] is not None]
+        undated = [key for key in rows if key[3] is None]
+        try:
+            upsert = MarketService._upsert_statement(db.session.get_bind().dialect.name)
+            for start in range(0, len(dated), chunk_size):
+                db.session.execute(upsert, dated[start:start + chunk_size])
+            
+            for start in range(0, len(undated), chunk_size):
+                chunk = undated[start:start + chunk_size]
+                existing = db.session.query(
+                    MarketPrice.id, MarketPrice.state, MarketPrice.market, MarketPrice.commodity
+                ).filter(
+                    MarketPrice.arrival_date.is_(None),
+                    tuple_(MarketPrice.state, MarketPrice.market, MarketPrice.commodity).in_([key[:3] for key in chunk])
+                ).all()
+                existing_ids = {}
+                for row_id, state, market, commodity in existing:
+                    existing_ids.setdefault((state, market, commodity, None), row_id)
+                
+                to_update = [
+                    {"id": existing_ids[key], **{column: rows[key][column] for column in PRICE_COLUMNS}, "updated_at": now}
+                    for key in chunk if key in existing_ids
+                ]
+                to_insert = [{**rows[key], "updated_at": now} for key in chunk if key not in existing_ids]
+                if to_insert:
+                    db.session.execute(insert(MarketPrice), to_insert)
+                if to_update:
+                    db.session.execute(update(MarketPrice), to_update)
+            
+            MarketService.refresh_price_summaries({key[:3] for key in rows}, chunk_size=chunk_size)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {"upserted": len(dated), "undated": len(undated)}
+
+    @staticmethod
+    def refresh_price_summaries(tuples, chunk_size=SYNC_CHUNK_SIZE):
+        """Recompute MarketPriceSummary rows for the given (state, market, commodity) tuples.
+        Per chunk: one windowed SELECT of the latest SUMMARY_WINDOW_ROWS rows of each tuple,
+        one SELECT of existing summaries, then executemany INSERT/UPDATE. Does not commit."""
+        from models.market_price import MarketPrice
+        from models.market_price_summary import MarketPriceSummary
+        from extensions import db
+        from sqlalchemy import func, insert, update, tuple_
+        
+        tuples = list(tuples)
+        now = datetime.utcnow()
+        for start in range(0, len(tuples), chunk_size):
+            chunk = tuples[start:start + chunk_size]
+            rank = func.row_number().over(
+                partition_by=(MarketPrice.state, MarketPrice.market, MarketPrice.commodity),
+                order_by=MarketPrice.id.desc()
+            ).label('rank')
+            ranked = db.session.query(
+                MarketPrice.id, MarketPrice.state, MarketPrice.market, MarketPrice.commodity,
+                MarketPrice.modal_price, MarketPrice.arrival_date, rank
+            ).filter(
+                tuple_(MarketPrice.state, MarketPrice.market, MarketPrice.commodity).in_(chunk)
+            ).subquery()
+            recent = db.session.query(ranked).filter(
+                ranked.c.rank <= SUMMARY_WINDOW_ROWS
+            ).order_by(ranked.c.rank).all()
+            
+            history = {}
+            for row in recent:
+                history.setdefault((row.state, row.market, row.commodity), []).append(
+                    (row.id, row.modal_price, row.arrival_date))
+            
+            if not history:
+                continue
+            existing = db.session.query(
+                MarketPriceSummary.id, MarketPriceSummary.state,
+                MarketPriceSummary.market, MarketPriceSummary.commodity
+            ).filter(
+                tuple_(MarketPriceSummary.state, MarketPriceSummary.market,
+                       MarketPriceSummary.commodity).in_(list(history))
+            ).all()
+            existing_ids = {(state, market, commodity): summary_id
+                            for summary_id, state, market, commodity in existing}
+            
+            to_insert = []
+            to_update = []
+            for key, rows in history.items():
+                summary = {**_summarize_prices(rows), "updated_at": now}
+                if key in existing_ids:
+                    to_update.append({"id": existing_ids[key], **summary})
+                else:
+                    to_insert.append({"state": key[0], "market": key[1], "commodity": key[2], **summary})
+            if to_insert:
+                db.session.execute(insert(MarketPriceSummary), to_insert)
+            if to_update:
+                db.session.execute(update(MarketPriceSummary), to_update)
+
+    @staticmethod
+    def rebuild_price_summaries(chunk_size=SYNC_CHUNK_SIZE):
+        """Backfill summaries for every tuple in market_prices. Returns the number of tuples."""
+        from models.market_price import MarketPrice
+        from extensions import db
+        
+        tuples = db.session.query(
+            MarketPrice.state, MarketPrice.market, MarketPrice.commodity
+        ).distinct().all()
+        try:
+            MarketService.refresh_price_summaries([tuple(t) for t in tuples], chunk_size=chunk_size)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(tuples)
+
     @staticmethod
     def _fetch_live_direct(state=None, market=None, commodity=None, limit=20):
         """Fetch data directly from the Agmarknet API without touching DB.
@@ -76,7 +280,7 @@ class MarketService:
             if commodity:
                 url += f"&filters[commodity]={requests.utils.quote(commodity)}"
             
-            response = requests.get(url, timeout=15)
+            response = http_client.get(url, timeout=15, retries=1)
             if response.status_code == 200:
                 data = response.json()
                 return data.get('records', [])
@@ -97,16 +301,14 @@ class MarketService:
         """Get all distinct markets for a given state."""
         from models.market_price import MarketPrice
         from extensions import db
+        from services.market_sync import record_demand
         
         markets = db.session.query(MarketPrice.market).filter(MarketPrice.state == state).distinct().all()
         market_list = [market[0] for market in markets if market[0]]
         
-        # If we have very few markets, try to sync more data for this state
+        # If we have very few markets, ask the background sync to pull the whole state
         if len(market_list) < 3:
-            print(f"[MarketService] Few markets for {state}, syncing more data...")
-            MarketService.sync_market_data(limit=500, state=state)
-            markets = db.session.query(MarketPrice.market).filter(MarketPrice.state == state).distinct().all()
-            market_list = [market[0] for market in markets if market[0]]
+            record_demand(state=state)
         
         return market_list
 
@@ -121,43 +323,28 @@ class MarketService:
     @staticmethod
     def get_market_insights(state, market, commodity):
         """Get the latest price details for a specific state, market, and crop.
-        Auto-refreshes if cached data is older than 6 hours.
-        First checks DB freshness, then syncs if stale, then falls back to direct API."""
+        Serves whatever is in the DB (stale-while-revalidate): every call is counted
+        so the background sync keeps popular tuples fresh, and rows older than
+        STALE_HOURS are returned with stale=True. Only a tuple with no rows at all
+        falls back to a direct API read."""
         from models.market_price import MarketPrice
+        from models.market_price_summary import MarketPriceSummary
         from extensions import db
-        
-        STALE_HOURS = 6  # Re-fetch if data is older than this
+        from services.market_sync import record_demand
         
         # 1. Check DB first
         result = MarketPrice.query.filter_by(
             state=state, market=market, commodity=commodity
         ).order_by(MarketPrice.id.desc()).first()
         
-        # 2. Check if the cached result is stale
+        # 2. Queue this tuple for the background sync
+        record_demand(state=state, market=market, commodity=commodity)
+        
+        # 3. Check if the cached result is stale
         is_stale = False
         if result and result.updated_at:
-            age = datetime.utcnow() - result.updated_at
-            age_hours = age.total_seconds() / 3600
-            if age_hours > STALE_HOURS:
-                is_stale = True
-                print(f"[MarketService] Cached data for {commodity}@{market} is {age_hours:.1f}h old — refreshing")
-        
-        # 3. Re-sync if no result OR stale
-        if not result or is_stale:
-            # Targeted sync
-            synced = MarketService.sync_market_data(limit=50, state=state, market=market, commodity=commodity)
-            if synced > 0:
-                result = MarketPrice.query.filter_by(
-                    state=state, market=market, commodity=commodity
-                ).order_by(MarketPrice.id.desc()).first()
-        
-        if not result:
-            # Broader sync (state + commodity only)
-            synced = MarketService.sync_market_data(limit=100, state=state, commodity=commodity)
-            if synced > 0:
-                result = MarketPrice.query.filter_by(
-                    state=state, market=market, commodity=commodity
-                ).order_by(MarketPrice.id.desc()).first()
+            age_hours = (datetime.utcnow() - result.updated_at).total_seconds() / 3600
+            is_stale = age_hours > STALE_HOURS
         
         if not result:
             # 4. Last resort: direct live fetch without DB
@@ -195,21 +382,22 @@ class MarketService:
                 }
 
         if result:
-            # Calculate trend based on historical records
-            previous = MarketPrice.query.filter_by(
-                state=state, market=market, commodity=commodity
-            ).order_by(MarketPrice.id.desc()).all()
-            
-            trend = "stable"
-            if len(previous) > 1:
-                if result.modal_price > previous[1].modal_price:
-                    trend = "increasing"
-                elif result.modal_price < previous[1].modal_price:
-                    trend = "decreasing"
-                    
             data = result.to_dict()
-            data['trend'] = trend
+            # Trend and statistics come from the rolling summary kept up to date at sync time
+            summary = MarketPriceSummary.query.filter_by(
+                state=state, market=market, commodity=commodity
+            ).first()
+            if summary:
+                data.update(summary.to_dict())
+            else:
+                # Rows synced before summaries existed: compare with the previous report only
+                previous = MarketPrice.query.filter_by(
+                    state=state, market=market, commodity=commodity
+                ).order_by(MarketPrice.id.desc()).offset(1).first()
+                data['previous_price'] = previous.modal_price if previous else None
+                data['trend'] = _price_trend(result.modal_price, data['previous_price'])
             data['source'] = 'database'
+            data['stale'] = is_stale
             return data
             
         return None
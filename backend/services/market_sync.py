@@ -0,0 +1,365 @@
+"""
+Background refresh of Agmarknet market prices.
+
+Request handlers only read the market_prices table. Whenever they serve a
+(state, market, commodity) tuple they call record_demand(), which counts the
+hit in process memory; a flusher thread in each process adds the counts to
+market_sync_targets every MARKET_DEMAND_FLUSH_SECONDS in one batch, so reads
+never write. MarketSyncScheduler polls that table and re-syncs the most
+requested tuples shortly before their rows pass STALE_HOURS, so readers get
+cached rows (stale-while-revalidate) and never wait on data.gov.in. Demand
+decays with a half-life; the last decay time is kept in the database so
+several schedulers don't decay it twice.
+
+Run it as a separate process (python market_sync_worker.py) or set
+MARKET_SYNC_IN_APP=true to start it as a daemon thread in the web app; with
+several gunicorn workers only the one holding the lock file runs it.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from services.market_service import MarketService, STALE_HOURS
+
+# Seconds between scheduler passes
+MARKET_SYNC_POLL_SECONDS = float(os.getenv('MARKET_SYNC_POLL_SECONDS', 300))
+# Hot tuples are refreshed at this fraction of STALE_HOURS, before readers see them go stale
+MARKET_SYNC_REFRESH_FRACTION = float(os.getenv('MARKET_SYNC_REFRESH_FRACTION', 0.75))
+# Upper bound on data.gov.in calls per pass
+MARKET_SYNC_MAX_PER_PASS = int(os.getenv('MARKET_SYNC_MAX_PER_PASS', 20))
+# Request counts halve over this many hours
+MARKET_SYNC_DEMAND_HALF_LIFE_HOURS = float(os.getenv('MARKET_SYNC_DEMAND_HALF_LIFE_HOURS', 24))
+# Tuples that decay below this stop being refreshed until someone asks for them again
+MARKET_SYNC_MIN_DEMAND = float(os.getenv('MARKET_SYNC_MIN_DEMAND', 0.1))
+# Pause between API calls within one pass
+MARKET_SYNC_CALL_SPACING = float(os.getenv('MARKET_SYNC_CALL_SPACING', 1.0))
+# Seconds request counts are held in memory before they are written out
+MARKET_DEMAND_FLUSH_SECONDS = float(os.getenv('MARKET_DEMAND_FLUSH_SECONDS', 30))
+
+DEMAND_DECAYED_AT = 'demand_decayed_at'
+
+LOCK_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'market_sync.lock')
+
+
+class DemandCounter:
+    """
+    Request counts per tuple, accumulated in memory and added to
+    market_sync_targets in one batch by a daemon thread (one per process).
+    A failed flush puts its counts back for the next one.
+    """
+
+    def __init__(self, flush_seconds=MARKET_DEMAND_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._counts = Counter()
+        self._last_requested = {}
+        self._lock = threading.Lock()
+        self._app = None
+        self._thread = None
+        self._pid = None
+
+    def record(self, state='', market='', commodity=''):
+        key = (state or '', market or '', commodity or '')
+        with self._lock:
+            self._counts[key] += 1
+            self._last_requested[key] = datetime.utcnow()
+            if self._thread is None or self._pid != os.getpid():
+                self._start()
+
+    def _start(self):
+        from flask import current_app, has_app_context
+
+        if not has_app_context():
+            return
+        self._app = current_app._get_current_object()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='market-demand', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def _take(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            requested, self._last_requested = self._last_requested, {}
+        return counts, requested
+
+    def _put_back(self, counts, requested):
+        with self._lock:
+            self._counts.update(counts)
+            for key, at in requested.items():
+                self._last_requested[key] = max(at, self._last_requested.get(key, at))
+
+    def flush(self):
+        """Write the pending counts: one SELECT, one executemany UPDATE and one INSERT. Returns tuples written."""
+        counts, requested = self._take()
+        if not counts or self._app is None:
+            if counts:
+                self._put_back(counts, requested)
+            return 0
+        with self._app.app_context():
+            try:
+                self._write(counts, requested)
+                return len(counts)
+            except Exception as e:
+                from extensions import db
+                db.session.rollback()
+                self._put_back(counts, requested)
+                print(f"[MarketSync] Could not record demand: {e}")
+                return 0
+            finally:
+                from extensions import db
+                db.session.remove()
+
+    @staticmethod
+    def _write(counts, requested):
+        from models.market_sync_target import MarketSyncTarget
+        from extensions import db
+        from sqlalchemy import bindparam, insert, tuple_, update
+
+        keys = list(counts)
+        existing = dict(
+            ((state, market, commodity), target_id)
+            for target_id, state, market, commodity in db.session.query(
+                MarketSyncTarget.id, MarketSyncTarget.state, MarketSyncTarget.market, MarketSyncTarget.commodity
+            ).filter(
+                tuple_(MarketSyncTarget.state, MarketSyncTarget.market, MarketSyncTarget.commodity).in_(keys)
+            )
+        )
+        hits = [
+            {"target_id": existing[key], "hits": float(counts[key]), "requested_at": requested[key]}
+            for key in keys if key in existing
+        ]
+        if hits:
+            # Core UPDATE: an executemany with per-row increments, not an ORM bulk update by primary key
+            table = MarketSyncTarget.__table__
+            db.session.execute(
+                update(table)
+                .where(table.c.id == bindparam('target_id'))
+                .values(demand=table.c.demand + bindparam('hits'), last_requested_at=bindparam('requested_at')),
+                hits
+            )
+        new = [
+            {"state": key[0], "market": key[1], "commodity": key[2],
+             "demand": float(counts[key]), "last_requested_at": requested[key]}
+            for key in keys if key not in existing
+        ]
+        if new:
+            # A tuple another process created meanwhile fails the unique key; the counts are retried
+            db.session.execute(insert(MarketSyncTarget), new)
+        db.session.commit()
+
+
+demand_counter = DemandCounter()
+atexit.register(demand_counter.flush)
+
+
+def record_demand(state='', market='', commodity=''):
+    """Count one request for a tuple; empty strings are wildcards (state-wide / nationwide).
+    Only touches memory; the count reaches the database with the next flush."""
+    demand_counter.record(state, market, commodity)
+
+
+def sync_status(limit=20):
+    """Aggregate sync metrics from the shared targets table (works across processes)."""
+    from models.market_sync_target import MarketSyncTarget
+    from extensions import db
+    from sqlalchemy import func
+
+    stale_before = datetime.utcnow() - timedelta(hours=STALE_HOURS)
+    total, synced, records, latency = db.session.query(
+        func.count(MarketSyncTarget.id),
+        func.count(MarketSyncTarget.last_synced_at),
+        func.sum(MarketSyncTarget.last_records),
+        func.avg(MarketSyncTarget.last_latency_ms)
+    ).one()
+    stale = MarketSyncTarget.query.filter(
+        (MarketSyncTarget.last_synced_at.is_(None)) | (MarketSyncTarget.last_synced_at < stale_before)
+    ).count()
+    hottest = MarketSyncTarget.query.order_by(MarketSyncTarget.demand.desc()).limit(limit).all()
+    return {
+        "targets": total,
+        "synced_targets": synced,
+        "stale_targets": stale,
+        "records_last_fetched": int(records or 0),
+        "avg_latency_ms": round(float(latency), 1) if latency is not None else None,
+        "hottest": [t.to_dict() for t in hottest]
+    }
+
+
+class MarketSyncScheduler:
+    def __init__(self, app, poll_seconds=MARKET_SYNC_POLL_SECONDS, max_per_pass=MARKET_SYNC_MAX_PER_PASS):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self.max_per_pass = max_per_pass
+        self.refresh_after = timedelta(hours=STALE_HOURS * MARKET_SYNC_REFRESH_FRACTION)
+        self.stats = {
+            "passes": 0,
+            "syncs": 0,
+            "empty_syncs": 0,
+            "records_fetched": 0,
+            "sync_latency_ms_total": 0,
+            "last_pass_at": None
+        }
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _ensure_bootstrap_target(self):
+        """An empty database gets one nationwide sync before anything else."""
+        from models.market_price import MarketPrice
+        from models.market_sync_target import MarketSyncTarget
+        from extensions import db
+
+        if MarketPrice.query.first() is None and \
+                MarketSyncTarget.query.filter_by(state='', market='', commodity='').first() is None:
+            db.session.add(MarketSyncTarget(demand=1.0, last_requested_at=datetime.utcnow()))
+            db.session.commit()
+
+    def _decay_demand(self):
+        """Decay demand for the time since the last decay by any process. The timestamp
+        in market_sync_state is advanced with a compare-and-set, so of two schedulers
+        passing at once only one applies the decay."""
+        from models.market_sync_target import MarketSyncState, MarketSyncTarget
+        from extensions import db
+        from sqlalchemy.exc import IntegrityError
+
+        now = datetime.utcnow()
+        state = db.session.get(MarketSyncState, DEMAND_DECAYED_AT)
+        if state is None:
+            try:
+                db.session.add(MarketSyncState(name=DEMAND_DECAYED_AT, value=now))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+            return
+
+        elapsed_hours = (now - state.value).total_seconds() / 3600
+        factor = 0.5 ** (elapsed_hours / MARKET_SYNC_DEMAND_HALF_LIFE_HOURS)
+        if factor >= 1:
+            return
+        claimed = MarketSyncState.query.filter_by(name=DEMAND_DECAYED_AT, value=state.value).update(
+            {MarketSyncState.value: now}, synchronize_session=False
+        )
+        if claimed:
+            MarketSyncTarget.query.update(
+                {MarketSyncTarget.demand: MarketSyncTarget.demand * factor}, synchronize_session=False
+            )
+        db.session.commit()
+
+    def due_targets(self):
+        """Never-synced tuples first, then requested tuples nearing staleness, hottest first."""
+        from models.market_sync_target import MarketSyncTarget
+        from sqlalchemy import case
+
+        refresh_before = datetime.utcnow() - self.refresh_after
+        return MarketSyncTarget.query.filter(
+            (MarketSyncTarget.last_synced_at.is_(None)) |
+            ((MarketSyncTarget.last_synced_at < refresh_before) &
+             (MarketSyncTarget.demand >= MARKET_SYNC_MIN_DEMAND))
+        ).order_by(
+            case((MarketSyncTarget.last_synced_at.is_(None), 0), else_=1),
+            MarketSyncTarget.demand.desc()
+        ).limit(self.max_per_pass).all()
+
+    def sync_target(self, target):
+        from extensions import db
+
+        start = time.time()
+        if target.market and target.commodity:
+            fetched = MarketService.sync_market_data(
+                limit=50, state=target.state, market=target.market, commodity=target.commodity)
+            if not fetched:
+                # The exact market may not report today; pull the state-wide commodity list instead
+                fetched = MarketService.sync_market_data(
+                    limit=100, state=target.state, commodity=target.commodity)
+        elif target.state:
+            fetched = MarketService.sync_market_data(limit=500, state=target.state)
+        else:
+            fetched = MarketService.sync_market_data(limit=1000)
+        latency_ms = int((time.time() - start) * 1000)
+
+        target.last_synced_at = datetime.utcnow()
+        target.last_records = fetched
+        target.last_latency_ms = latency_ms
+        target.last_status = 'ok' if fetched else 'empty'
+        db.session.commit()
+
+        self.stats["syncs"] += 1
+        self.stats["records_fetched"] += fetched
+        self.stats["sync_latency_ms_total"] += latency_ms
+        if not fetched:
+            self.stats["empty_syncs"] += 1
+        return fetched
+
+    def run_pass(self):
+        """Refresh up to max_per_pass due tuples. Returns the number of tuples synced."""
+        from extensions import db
+
+        with self.app.app_context():
+            try:
+                self._ensure_bootstrap_target()
+                # Counts recorded by this process so far take part in this pass
+                demand_counter.flush()
+                self._decay_demand()
+                targets = self.due_targets()
+                for i, target in enumerate(targets):
+                    if self._stop.is_set():
+                        break
+                    if i:
+                        time.sleep(MARKET_SYNC_CALL_SPACING)
+                    fetched = self.sync_target(target)
+                    print(f"[MarketSync] {target.state or '*'}/{target.market or '*'}/{target.commodity or '*'}: "
+                          f"{fetched} records in {target.last_latency_ms}ms")
+                return len(targets)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MarketSync] Pass failed: {e}")
+                return 0
+            finally:
+                self.stats["passes"] += 1
+                self.stats["last_pass_at"] = datetime.utcnow().isoformat()
+                db.session.remove()
+
+    def run_forever(self):
+        print(f"[MarketSync] Scheduler started (every {self.poll_seconds:.0f}s, "
+              f"refresh after {self.refresh_after.total_seconds() / 3600:.1f}h)")
+        while not self._stop.is_set():
+            self.run_pass()
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='market-sync', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+_lock_file = None
+
+
+def start_in_app(app):
+    """Start the scheduler thread in this process if MARKET_SYNC_IN_APP is set and no
+    other worker already holds the lock. Returns the scheduler or None."""
+    global _lock_file
+    if os.getenv('MARKET_SYNC_IN_APP', 'false').lower() != 'true':
+        return None
+    try:
+        import fcntl
+        os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+        _lock_file = open(LOCK_PATH, 'w')
+        fcntl.flock(_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+        pass  # no flock on Windows; single-process dev server
+    except OSError:
+        # Another worker already runs the scheduler
+        _lock_file.close()
+        _lock_file = None
+        return None
+    return MarketSyncScheduler(app).start()
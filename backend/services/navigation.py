@@ -0,0 +1,31 @@
+"""
+App pages the assistant can send the user to, keyed by the intents Gemini
+returns (used by the chatbot and voice routes).
+"""
+
+# Navigation map: intent → route info
+NAVIGATION_MAP = {
+    'navigate_dashboard': {'route': '/dashboard', 'label': 'Dashboard'},
+    'navigate_crop': {'route': '/crop', 'label': 'Crop Recommendation'},
+    'navigate_fertilizer': {'route': '/fertilizer', 'label': 'Fertilizer'},
+    'navigate_yield': {'route': '/yield', 'label': 'Yield Prediction'},
+    'navigate_soil': {'route': '/soil', 'label': 'Soil Health'},
+    'navigate_disease': {'route': '/disease', 'label': 'Disease Detection'},
+    'navigate_advisory': {'route': '/advisory', 'label': 'Advisory'},
+    'navigate_community': {'route': '/community', 'label': 'Community'},
+    'navigate_simulator': {'route': '/simulator', 'label': 'Farm Simulator'},
+    'navigate_market': {'route': '/market', 'label': 'Market Insights'},
+    'navigate_risk': {'route': '/risk', 'label': 'Risk Assessment'},
+    'navigate_farm3d': {'route': '/farm3d', 'label': '3D Farm View'},
+    'navigate_schemes': {'route': '/schemes', 'label': 'Govt Schemes'},
+    'navigate_developer': {'route': '/developer', 'label': 'Developer'},
+    'navigate_login': {'route': '/login', 'label': 'Login'},
+    'navigate_register': {'route': '/register', 'label': 'Register'},
+}
+
+
+def navigation_for(intent):
+    nav_info = NAVIGATION_MAP.get(intent)
+    if nav_info:
+        return {"route": nav_info['route'], "label": nav_info['label']}
+    return None
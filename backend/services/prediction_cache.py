@@ -0,0 +1,85 @@
+"""
+Memoization for ML predictions and decision-engine results.
+
+Simple mode feeds the models the same few feature vectors over and over
+(soil from SOIL_TYPE_DATA / REGIONAL_SOIL_DATA, rainfall from
+WATER_AVAILABILITY, seasonal weather), so results are kept in a bounded
+in-process LRU. Keys are (namespace, model version, canonical inputs,
+language): numeric inputs are rounded to PREDICTION_CACHE_DECIMALS and the
+rounded values are what the model is run on, so a cached answer is exactly
+what a fresh call would return. Entries of a model are dropped when its
+files change (see models/model_registry.py).
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', 20000))
+PREDICTION_CACHE_DECIMALS = int(os.getenv('PREDICTION_CACHE_DECIMALS', 2))
+
+
+def quantize(values, decimals=PREDICTION_CACHE_DECIMALS):
+    """Canonical tuple of floats rounded to `decimals` (-0.0 folded into 0.0)."""
+    return tuple(round(float(value), decimals) + 0.0 for value in values)
+
+
+class PredictionCache:
+    def __init__(self, max_entries=PREDICTION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.enabled = os.getenv('PREDICTION_CACHE_ENABLED', 'true').lower() != 'false'
+        self.counters = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _count(self, namespace, field):
+        counters = self.counters.setdefault(namespace, {"hits": 0, "misses": 0, "invalidated": 0})
+        counters[field] += 1
+
+    def get_or_compute(self, namespace, key, compute, cacheable=None):
+        """Cached result of compute() for (namespace, key). Results for which
+        cacheable(result) is false (e.g. a fallback after an error) are returned
+        but not stored."""
+        if not self.enabled:
+            return compute()
+        full_key = (namespace, key)
+        with self._lock:
+            if full_key in self._entries:
+                self._entries.move_to_end(full_key)
+                self._count(namespace, "hits")
+                value = self._entries[full_key]
+                hit = True
+            else:
+                self._count(namespace, "misses")
+                hit = False
+        if hit:
+            # Callers may decorate the result they get back
+            return copy.deepcopy(value)
+
+        value = compute()
+        if cacheable is None or cacheable(value):
+            with self._lock:
+                self._entries[full_key] = copy.deepcopy(value)
+                self._entries.move_to_end(full_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, namespace):
+        """Drop every entry of a namespace (called when a model is reloaded)."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == namespace]
+            for key in stale:
+                del self._entries[key]
+            self.counters.setdefault(namespace, {"hits": 0, "misses": 0, "invalidated": 0})
+            self.counters[namespace]["invalidated"] += len(stale)
+
+    def stats(self):
+        result = {"enabled": self.enabled, "entries": len(self._entries), "max_entries": self.max_entries}
+        for namespace, c in self.counters.items():
+            total = c["hits"] + c["misses"]
+            result[namespace] = {**c, "hit_ratio": round(c["hits"] / total, 4) if total else 0.0}
+        return result
+
+
+prediction_cache = PredictionCache()
@@ -0,0 +1,173 @@
+"""
+Precomputed answers for /api/crop/recommend-simple.
+
+Simple mode turns a handful of choices into model features: soil from
+SOIL_TYPE_DATA or the district's regional profile, rainfall from
+WATER_AVAILABILITY, temperature/humidity (and rainfall when no water level is
+given) from the seasonal weather defaults or the fallback weather. That space is finite, so
+build_simple_recommendations.py runs every distinct feature vector it can
+produce through the crop model, the decision engine and the fertilizer model
+once, and writes the results to a gzipped JSON table.
+
+The table is keyed by the rounded feature vector plus the fertilizer soil
+class, i.e. by exactly what the models see, so a lookup returns what live
+inference would. Inputs outside the space (live OpenWeatherMap data, custom
+values) miss and are computed live. The table records a fingerprint of the
+models and decision engine it was built from and is ignored once they change.
+"""
+import gzip
+import json
+import os
+import threading
+
+from services.location_service import (
+    SOIL_TYPE_DATA,
+    STATES_DISTRICTS,
+    WATER_AVAILABILITY,
+    SEASONAL_WEATHER,
+    DEFAULT_WEATHER,
+    get_regional_soil_data
+)
+from services.prediction_cache import quantize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+DEFAULT_TABLE_PATH = os.path.join(BACKEND_DIR, 'cache', 'simple_recommendations.json.gz')
+TABLE_FORMAT = 1
+
+# Soil classes known to the fertilizer model, by simple-mode soil choice and regional soil type
+FERTILIZER_SOIL_CLASS = {
+    "black_sticky": "Black",
+    "red_sandy": "Red",
+    "brown_loamy": "Loamy",
+    "yellow_clay": "Clayey",
+    "alluvial": "Loamy",
+    "black_clay": "Black",
+    "red_loamy": "Red",
+    "laterite": "Clayey",
+    "desert": "Sandy",
+    "mountain": "Loamy",
+    "mixed": "Loamy",
+}
+FERTILIZER_MOISTURE = 50
+
+# Everything the table's contents depend on besides the input space itself
+FINGERPRINT_FILES = [
+    os.path.join(BACKEND_DIR, 'ml', 'saved_models', name) for name in (
+        'crop_model.pkl', 'crop_label_encoder.pkl', 'fertilizer_model.pkl', 'fertilizer_soil_encoder.pkl',
+        'fertilizer_crop_encoder.pkl', 'fertilizer_label_encoder.pkl'
+    )
+] + [os.path.join(BACKEND_DIR, 'services', 'decision_engine.py')]
+
+
+def fingerprint():
+    from models.tree_arrays import file_sha256
+    return {os.path.relpath(path, BACKEND_DIR): file_sha256(path) for path in FINGERPRINT_FILES if os.path.exists(path)}
+
+
+def fertilizer_soil_class(soil_type):
+    return FERTILIZER_SOIL_CLASS.get(soil_type, "Loamy")
+
+
+def simple_soil_class(simple_input):
+    """Fertilizer soil class for a simple-mode request: the chosen soil, else the district's regional soil."""
+    if simple_input.get("soil_type") in SOIL_TYPE_DATA:
+        return fertilizer_soil_class(simple_input["soil_type"])
+    if simple_input.get("state") and simple_input.get("district"):
+        regional = get_regional_soil_data(simple_input["state"], simple_input["district"])
+        return fertilizer_soil_class(regional.get("soil_type"))
+    return fertilizer_soil_class(None)
+
+
+def table_key(features, soil_class):
+    return (*quantize(features), soil_class)
+
+
+def enumerate_space():
+    """Every distinct (features, soil class) simple mode can produce without live weather.
+    features are [N, P, K, temperature, humidity, ph, rainfall]."""
+    soils = {
+        (data["N"], data["P"], data["K"], data["ph"], fertilizer_soil_class(key))
+        for key, data in SOIL_TYPE_DATA.items()
+    }
+    for state, districts in STATES_DISTRICTS.items():
+        for district in districts:
+            soil = get_regional_soil_data(state, district)
+            soils.add((soil["N"], soil["P"], soil["K"], soil["ph"], fertilizer_soil_class(soil.get("soil_type"))))
+
+    space = {}
+    for n, p, k, ph, soil_class in sorted(soils):
+        for weather in [*SEASONAL_WEATHER.values(), DEFAULT_WEATHER]:
+            rainfalls = {weather["rainfall"]} | {water["rainfall"] for water in WATER_AVAILABILITY.values()}
+            for rainfall in sorted(rainfalls):
+                features = [n, p, k, weather["temperature"], weather["humidity"], ph, rainfall]
+                space[table_key(features, soil_class)] = (features, soil_class)
+    return list(space.values())
+
+
+class SimpleRecommendationTable:
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SIMPLE_RECOMMENDATIONS_PATH', DEFAULT_TABLE_PATH)
+        self.enabled = os.getenv('SIMPLE_RECOMMENDATIONS_ENABLED', 'true').lower() != 'false'
+        self.entries = None
+        self.meta = {}
+        self.hits = 0
+        self.misses = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.enabled or not os.path.exists(self.path):
+                return
+            try:
+                with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                    table = json.load(f)
+                if table.get("format") != TABLE_FORMAT or table.get("fingerprint") != fingerprint():
+                    print(f"⚠️ {self.path} was built from other models or decision-engine code; "
+                          f"re-run build_simple_recommendations.py. Using live inference.")
+                    return
+                crops, fertilizers = table["crops"], table["fertilizers"]
+                entries = {}
+                for row in table["rows"]:
+                    *features, soil_class, crop, confidence, fertilizer, decision = row
+                    entries[table_key(features, soil_class)] = {
+                        "crop": crops[crop],
+                        "confidence": confidence,
+                        "fertilizer": fertilizers[fertilizer] if fertilizer is not None else None,
+                        "decision": decision,
+                    }
+                self.entries = entries
+                self.meta = {key: table[key] for key in ("built_at", "build_seconds") if key in table}
+                print(f"[SimpleRecommendations] {len(entries):,} precomputed answers loaded")
+            except Exception as e:
+                print(f"[SimpleRecommendations] Could not load {self.path}: {e}")
+
+    def lookup(self, features, soil_class):
+        """Precomputed {"crop", "confidence", "fertilizer", "decision"} or None outside the space."""
+        if self.entries is None:
+            self._load()
+            if self.entries is None:
+                return None
+        entry = self.entries.get(table_key(features, soil_class))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "loaded": self.entries is not None,
+            "entries": len(self.entries) if self.entries else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            **self.meta,
+        }
+
+
+simple_table = SimpleRecommendationTable()
@@ -1,93 +1,259 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
-import io
-from PIL import Image
+
+from services.image_cache import image_cache
+from services.image_ingest import open_upload, ImageRejected
+
+# Colour statistics are taken on a small thumbnail
+ANALYSIS_SIZE = (150, 150)
+
+# Histogram bins over OpenCV's hue (0-179) and value (0-255) ranges
+HUE_BINS = 18
+VALUE_BINS = 16
+
+# Decoding processes per app worker for /analyze-images (0 disables the pool).
+# Each one is a separate interpreter with cv2/numpy/PIL loaded, multiplied by the
+# gunicorn workers, so keep this small. The pool is started by start_decode_pool()
+# (gunicorn.conf.py post_worker_init), never inside a request; without it, and for
+# batches of up to SOIL_BATCH_INLINE images, decoding happens in the request thread.
+SOIL_BATCH_WORKERS = int(os.getenv('SOIL_BATCH_WORKERS', 2))
+SOIL_BATCH_INLINE = 4
+
+# Soil Classification Logic (Heuristic based on Hue/Sat/Val), in rule order:
+# the first matching rule wins, the last entry is the fallback
+SOIL_CLASSES = [
+    # Red Soil: Hue around 0-20 or 160-180 (Red), Saturation moderate to high
+    ("Red Soil", 0.85, {"N": "Low", "P": "Low", "K": "Medium", "pH": 6.5},
+     "Rich in iron, suitable for cotton, wheat, pulses."),
+    # Black Soil: Low Value (Dark), Low Saturation (Grayish/Black)
+    ("Black Soil", 0.90, {"N": "High", "P": "Low", "K": "High", "pH": 7.5},
+     "Excellent moisture retention. Good for cotton, sugarcane."),
+    # Sandy/Yellow Soil: Hue around 20-35 (Yellow/Orange), Low Saturation
+    ("Sandy/Loamy Soil", 0.80, {"N": "Low", "P": "Medium", "K": "Medium", "pH": 7.0},
+     "Well-drained. Good for groundnut, potato."),
+    # Brown/Alluvial: Generic brownish
+    ("Alluvial Soil", 0.75, {"N": "Medium", "P": "Medium", "K": "High", "pH": 7.2},
+     "Very fertile. Suitable for rice, wheat, sugarcane."),
+    ("Loamy Soil", 0.60, {"N": "Medium", "P": "Medium", "K": "Medium", "pH": 7.0},
+     "Balanced texture. Good for most crops."),
+]
+
+
+def hsv_features(hsv):
+    """
+    Colour features of a stack of HSV images, shape (n, height, width, 3) uint8.
+    Returns (means (n, 3), hue histograms (n, HUE_BINS), value histograms (n, VALUE_BINS)),
+    histograms as fractions of each image's pixels.
+    """
+    n = hsv.shape[0]
+    pixels = hsv.reshape(n, -1, 3)
+    means = pixels.mean(axis=1)
+    # One bincount per channel for the whole stack: offset each image's bins by its index
+    offsets = np.arange(n)[:, np.newaxis]
+    hue_bins = offsets * HUE_BINS + pixels[:, :, 0].astype(np.intp) * HUE_BINS // 180
+    value_bins = offsets * VALUE_BINS + pixels[:, :, 2].astype(np.intp) * VALUE_BINS // 256
+    per_image = pixels.shape[1] or 1
+    hue_hist = np.bincount(hue_bins.ravel(), minlength=n * HUE_BINS).reshape(n, HUE_BINS) / per_image
+    value_hist = np.bincount(value_bins.ravel(), minlength=n * VALUE_BINS).reshape(n, VALUE_BINS) / per_image
+    return means, hue_hist, value_hist
+
+
+def classify_hsv(means):
+    """Index into SOIL_CLASSES for each row of HSV means (n, 3). Hue ranges: 0-179 in OpenCV."""
+    h, s, v = means[:, 0], means[:, 1], means[:, 2]
+    rules = [
+        ((h < 20) | (h > 160)) & (s > 50),
+        v < 60,
+        (20 <= h) & (h <= 40),
+        (10 <= h) & (h <= 25) & (60 <= v) & (v <= 150),
+    ]
+    return np.select(rules, np.arange(len(rules)), default=len(SOIL_CLASSES) - 1)
+
+
+def estimate_moisture(v):
+    # Moisture estimation based on V (Value/Brightness)
+    # Darker usually means wetter
+    return np.interp(v, [40, 200], [90, 10]).astype(int) # Map 40-200 brightness to 90-10% moisture
+
+
+def _image_result(soil_class, mean, moisture):
+    soil_type, confidence, nutrients, message = SOIL_CLASSES[soil_class]
+    h, s, v = mean
+    return {
+        "success": True,
+        "soil_type": soil_type,
+        "confidence": confidence,
+        "estimates": dict(nutrients),
+        "moisture_percent": int(moisture),
+        "message": message,
+        "color_detected": f"HSV({int(h)},{int(s)},{int(v)})"
+    }
+
+
+def _to_hsv(image):
+    # Resize for faster processing. The thresholds in classify_hsv were tuned on
+    # full-resolution decodes shrunk with cv2.resize (bilinear, no antialiasing),
+    # so uploads are decoded at full size and resized the same way: a draft-mode
+    # decode or an antialiased resize averages pixels and moves the mean hue.
+    img = cv2.resize(np.asarray(image), ANALYSIS_SIZE)
+    return cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+
+
+def _decode_hsv(path):
+    """Process-pool task: image file -> (150x150 HSV array, None) or (None, error)."""
+    try:
+        return _to_hsv(open_upload(path)), None
+    except ImageRejected as e:
+        return None, str(e)
+    except Exception as e:
+        return None, f"Could not analyze image: {e}"
+
+
+def _warm():
+    # Runs once per pool process so the imports happen at startup, not in the first batch
+    return os.getpid()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def start_decode_pool():
+    """
+    Start this process's decoding pool for analyze_batch() and wait until its
+    processes have imported this module. Call once per app worker, after any fork.
+    """
+    global _pool, _pool_pid
+    if SOIL_BATCH_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn, not fork: the app worker has threads (gunicorn, Gemini executor)
+            _pool = ProcessPoolExecutor(SOIL_BATCH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+            # Submitted together, so each goes to a fresh process
+            for future in [_pool.submit(_warm) for _ in range(SOIL_BATCH_WORKERS)]:
+                future.result()
+            atexit.register(stop_decode_pool)
+            print(f"🧪 [Soil] Decoding pool started ({SOIL_BATCH_WORKERS} processes)")
+        return _pool
+
+
+def stop_decode_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_pid = None
+
+
+def _decode_pool():
+    """The pool started by start_decode_pool() in this process, or None."""
+    return _pool if _pool_pid == os.getpid() else None
+
+
+def village_summary(classes, means, moisture, hue_hist, value_hist):
+    """Aggregate of a batch of analysed images: soil type shares, the dominant type and mean colour statistics."""
+    n = len(classes)
+    counts = np.bincount(classes, minlength=len(SOIL_CLASSES))
+    dominant = int(np.argmax(counts))
+    soil_type, _, nutrients, message = SOIL_CLASSES[dominant]
+    h, s, v = means.mean(axis=0)
+    return {
+        "images_analyzed": n,
+        "dominant_soil_type": soil_type,
+        "dominant_share": round(float(counts[dominant]) / n, 3),
+        "soil_types": {
+            SOIL_CLASSES[i][0]: {"count": int(count), "share": round(float(count) / n, 3)}
+            for i, count in enumerate(counts) if count
+        },
+        "estimates": dict(nutrients),
+        "message": message,
+        "average_moisture_percent": int(round(float(moisture.mean()))),
+        "moisture_range": [int(moisture.min()), int(moisture.max())],
+        "average_color": f"HSV({int(h)},{int(s)},{int(v)})",
+        "hue_histogram": np.round(hue_hist.mean(axis=0), 4).tolist(),
+        "value_histogram": np.round(value_hist.mean(axis=0), 4).tolist(),
+    }
+
 
 class SoilAnalyzer:
     @staticmethod
-    def analyze_image(image_bytes):
+    def analyze_image(image_source):
         """
         Analyze soil image to determine type and estimate NPK/pH.
+        image_source: upload (FileStorage), file object or bytes.
+        Raises ImageRejected for uploads that are too large or not images.
         """
-        try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                # Try PIL fallback if cv2 fails to read directly
-                image = Image.open(io.BytesIO(image_bytes))
-                img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-            # Resize for faster processing
-            img = cv2.resize(img, (150, 150))
-            
-            # Convert to HSV
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-            
-            # Calculate average color
-            avg_color_per_row = np.average(hsv, axis=0)
-            avg_color = np.average(avg_color_per_row, axis=0)
-            
-            h, s, v = avg_color
-            
-            # Soil Classification Logic (Heuristic based on Hue/Sat/Val)
-            # Hue ranges: 0-179 in OpenCV
-            
-            soil_type = "Unknown"
-            confidence = 0.5
-            
-            # Check for generic soil colors
-            # Red Soil: Hue around 0-20 or 160-180 (Red), Saturation moderate to high
-            if (h < 20 or h > 160) and s > 50:
-                soil_type = "Red Soil"
-                confidence = 0.85
-                nutrients = {"N": "Low", "P": "Low", "K": "Medium", "pH": 6.5}
-                message = "Rich in iron, suitable for cotton, wheat, pulses."
-                
-            # Black Soil: Low Value (Dark), Low Saturation (Grayish/Black)
-            elif v < 60:
-                soil_type = "Black Soil"
-                confidence = 0.90
-                nutrients = {"N": "High", "P": "Low", "K": "High", "pH": 7.5}
-                message = "Excellent moisture retention. Good for cotton, sugarcane."
-
-            # Sandy/Yellow Soil: Hue around 20-35 (Yellow/Orange), Low Saturation
-            elif 20 <= h <= 40:
-                soil_type = "Sandy/Loamy Soil"
-                confidence = 0.80
-                nutrients = {"N": "Low", "P": "Medium", "K": "Medium", "pH": 7.0}
-                message = "Well-drained. Good for groundnut, potato."
-                
-            # Brown/Alluvial: Generic brownish
-            elif 10 <= h <= 25 and 60 <= v <= 150:
-                soil_type = "Alluvial Soil"
-                confidence = 0.75
-                nutrients = {"N": "Medium", "P": "Medium", "K": "High", "pH": 7.2}
-                message = "Very fertile. Suitable for rice, wheat, sugarcane."
-                
-            else:
-                soil_type = "Loamy Soil" # Fallback
-                confidence = 0.60
-                nutrients = {"N": "Medium", "P": "Medium", "K": "Medium", "pH": 7.0}
-                message = "Balanced texture. Good for most crops."
-
-            # Moisture estimation based on V (Value/Brightness)
-            # Darker usually means wetter
-            moisture = int(np.interp(v, [40, 200], [90, 10])) # Map 40-200 brightness to 90-10% moisture
-
-            return {
-                "success": True,
-                "soil_type": soil_type,
-                "confidence": confidence,
-                "estimates": nutrients,
-                "moisture_percent": moisture,
-                "message": message,
-                "color_detected": f"HSV({int(h)},{int(s)},{int(v)})"
-            }
+        # Decoded at full size, as the classifier expects (see _to_hsv)
+        image = open_upload(image_source)
+        # Re-uploads of the same (or a near-identical) photo are answered from the cache
+        return image_cache.get_or_compute(
+            'soil', image, (), lambda: SoilAnalyzer._analyze(image), cacheable=lambda result: result['success']
+        )
 
+    @staticmethod
+    def _analyze(image):
+        try:
+            means, _, _ = hsv_features(_to_hsv(image)[np.newaxis])
+            soil_class = classify_hsv(means)[0]
+            return _image_result(soil_class, means[0], estimate_moisture(means[:, 2])[0])
         except Exception as e:
             print(f"Soil Analysis Error: {e}")
             return {"success": False, "error": str(e)}
 
+    @staticmethod
+    def analyze_batch(items):
+        """
+        Analyze a survey's worth of soil photos at once.
+        items: (name, file path) pairs, or (name, ImageRejected) for uploads already refused
+        (see services/image_ingest.read_upload_batch).
+        Images are decoded in the process pool when it is running, stacked, and
+        featurized and classified in one vectorized pass. Returns per-image results
+        (in upload order) and a village summary over the images that could be read.
+        """
+        pending = [(i, data) for i, (_, data) in enumerate(items) if not isinstance(data, Exception)]
+        pool = _decode_pool()
+        if pool is not None and len(pending) > SOIL_BATCH_INLINE:
+            chunksize = max(1, len(pending) // (SOIL_BATCH_WORKERS * 4))
+            decoded = list(pool.map(_decode_hsv, [data for _, data in pending], chunksize=chunksize))
+        else:
+            decoded = [_decode_hsv(data) for _, data in pending]
+
+        errors = {i: str(data) for i, (_, data) in enumerate(items) if isinstance(data, Exception)}
+        readable = []
+        for (i, _), (hsv, error) in zip(pending, decoded):
+            if hsv is None:
+                errors[i] = error
+            else:
+                readable.append((i, hsv))
+
+        results = [None] * len(items)
+        for i, error in errors.items():
+            results[i] = {"name": items[i][0], "success": False, "error": error}
+
+        summary = None
+        if readable:
+            means, hue_hist, value_hist = hsv_features(np.stack([hsv for _, hsv in readable]))
+            classes = classify_hsv(means)
+            moisture = estimate_moisture(means[:, 2])
+            for row, (i, _) in enumerate(readable):
+                results[i] = {
+                    "name": items[i][0],
+                    **_image_result(classes[row], means[row], moisture[row]),
+                    "hue_histogram": np.round(hue_hist[row], 4).tolist(),
+                    "value_histogram": np.round(value_hist[row], 4).tolist(),
+                }
+            summary = village_summary(classes, means, moisture, hue_hist, value_hist)
+
+        return {"count": len(items), "analyzed": len(readable), "results": results, "summary": summary}
+
 soil_analyzer = SoilAnalyzer()
@@ -0,0 +1,165 @@
+"""
+Local storage for SoilGrids (ISRIC) soil properties.
+
+Soil properties do not change, so raw SoilGrids values (nitrogen, phh2o, ocd,
+cec at 0-5 cm, in SoilGrids' mapped units) are kept for good:
+
+- SoilGridsCache: a permanent SQLite cache of API results, keyed by the
+  ~250 m grid cell (SOILGRIDS_CELL_DEGREES) the coordinate snaps to.
+- SoilGridsGrid: an optional offline raster built by import_soilgrids_grid.py
+  from a SoilGrids GeoTIFF/CSV extract. It is a float32 .npy array of shape
+  (4, rows, cols) opened with mmap_mode='r', so a lookup is one array index
+  and only touched pages are read from disk.
+
+Set SOILGRIDS_OFFLINE=true to answer only from the grid and cache and never
+call the API.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, 'soilgrids.sqlite3')
+DEFAULT_GRID_PATH = os.path.join(CACHE_DIR, 'soilgrids_grid.npy')
+
+# SoilGrids is published at 250 m; 0.0025° is ~280 m at the equator
+SOILGRIDS_CELL_DEGREES = float(os.getenv('SOILGRIDS_CELL_DEGREES', 0.0025))
+SOILGRIDS_OFFLINE = os.getenv('SOILGRIDS_OFFLINE', 'false').lower() == 'true'
+
+# Band order of the offline grid and keys of every raw-value dict
+PROPERTIES = ("nitrogen", "phh2o", "ocd", "cec")
+
+
+def snap(lat, lon, cell=SOILGRIDS_CELL_DEGREES):
+    """Integer grid cell containing a coordinate."""
+    return int(np.floor(lat / cell)), int(np.floor(lon / cell))
+
+
+class SoilGridsCache:
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SOILGRIDS_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.enabled = os.getenv('SOILGRIDS_CACHE_ENABLED', 'true').lower() != 'false'
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, so each gunicorn worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS soilgrids (
+                    cell_lat INTEGER NOT NULL,
+                    cell_lon INTEGER NOT NULL,
+                    raw TEXT NOT NULL,
+                    PRIMARY KEY (cell_lat, cell_lon)
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, lat, lon):
+        """Raw property dict for the cell, or None on a miss."""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT raw FROM soilgrids WHERE cell_lat = ? AND cell_lon = ?", snap(lat, lon)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[SoilGridsCache] Read error: {e}")
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, lat, lon, raw):
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO soilgrids (cell_lat, cell_lon, raw) VALUES (?, ?, ?)",
+                    (*snap(lat, lon), json.dumps(raw))
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"[SoilGridsCache] Write error: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "path": self.path,
+        }
+
+
+class SoilGridsGrid:
+    """Offline raster of raw SoilGrids values. Metadata lives next to the .npy file
+    as <name>.json: {"lat_max", "lon_min", "cell", "rows", "cols"} where (lat_max,
+    lon_min) is the north-west corner of cell [0, 0]."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SOILGRIDS_GRID_PATH', DEFAULT_GRID_PATH)
+        self.values = None
+        self.meta = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            meta_path = os.path.splitext(self.path)[0] + '.json'
+            if not (os.path.exists(self.path) and os.path.exists(meta_path)):
+                return
+            try:
+                with open(meta_path) as f:
+                    self.meta = json.load(f)
+                self.values = np.load(self.path, mmap_mode='r')
+                print(f"[SoilGrids] Offline grid loaded: {self.values.shape[1]}x{self.values.shape[2]} "
+                      f"cells of {self.meta['cell']}°")
+            except Exception as e:
+                print(f"[SoilGrids] Could not load offline grid: {e}")
+                self.values = None
+
+    @property
+    def available(self):
+        self._load()
+        return self.values is not None
+
+    def lookup(self, lat, lon):
+        """Raw property dict for the cell, None outside the grid or where every band is NoData."""
+        if not self.available:
+            return None
+        meta = self.meta
+        row = int((meta["lat_max"] - lat) // meta["cell"])
+        col = int((lon - meta["lon_min"]) // meta["cell"])
+        if not (0 <= row < meta["rows"] and 0 <= col < meta["cols"]):
+            return None
+        cell = self.values[:, row, col]
+        if np.isnan(cell).all():
+            return None
+        return {name: (None if np.isnan(value) else float(value)) for name, value in zip(PROPERTIES, cell)}
+
+
+soilgrids_cache = SoilGridsCache()
+soilgrids_grid = SoilGridsGrid()
@@ -0,0 +1,27 @@
+"""
+Server-Sent Events helpers shared by the chatbot and voice routes.
+"""
+import json
+
+from flask import Response, request, stream_with_context
+
+
+def wants_stream(data):
+    """True when the client asked for Server-Sent Events ("stream": true, or Accept: text/event-stream)."""
+    if data.get('stream') is True:
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream'
+
+
+def sse_response(events):
+    """
+    Server-Sent Events response over (event, payload) pairs, each sent as soon
+    as it is produced. X-Accel-Buffering stops nginx-style proxies from holding
+    the stream back until it ends.
+    """
+    def generate():
+        for event, payload in events:
+            yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,175 @@
+"""
+Persistent translation cache for Gemini calls.
+
+Translations of crop names, fertilizer names and recommendation messages
+repeat constantly, so results are stored in a small SQLite file shared by
+every gunicorn worker. Entries are content-addressed by a hash of
+(text, language, model) and evicted by TTL and least-recently-used order.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, 'translations.sqlite3')
+
+# Hits refresh last_used at most this often, so reads rarely need a write lock
+TOUCH_INTERVAL_SECONDS = 3600
+# Size-based eviction runs once per this many writes rather than on every insert
+EVICT_EVERY_WRITES = 100
+
+
+class TranslationCache:
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None):
+        self.path = path or os.getenv('TRANSLATION_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else \
+            float(os.getenv('TRANSLATION_CACHE_TTL_DAYS', 30)) * 86400
+        self.max_entries = max_entries if max_entries is not None else \
+            int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', 50000))
+        self.enabled = os.getenv('TRANSLATION_CACHE_ENABLED', 'true').lower() != 'false'
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+
+    @staticmethod
+    def make_key(text, language, model):
+        """Content address for a (text, language, model) triple."""
+        raw = f"{model}\x00{language}\x00{text}".encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, so each gunicorn worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            # WAL lets several worker processes read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, text, language, model):
+        """Return the cached translation, or None on a miss or expired entry."""
+        return self.get_any(text, language, [model])
+
+    def get_any(self, text, language, models):
+        """
+        The cached translation made by the first of `models` that has one
+        (e.g. the primary model, then its fallbacks), or None.
+        """
+        if not self.enabled:
+            return None
+        keys = [self.make_key(text, language, model) for model in models]
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                rows = {
+                    key: (translation, created_at, last_used)
+                    for key, translation, created_at, last_used in conn.execute(
+                        "SELECT key, translation, created_at, last_used FROM translations "
+                        f"WHERE key IN ({', '.join('?' * len(keys))})", keys
+                    )
+                }
+                for key in keys:
+                    if key not in rows:
+                        continue
+                    translation, created_at, last_used = rows[key]
+                    if now - created_at > self.ttl_seconds:
+                        conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                        conn.commit()
+                        continue
+                    if now - last_used > TOUCH_INTERVAL_SECONDS:
+                        conn.execute("UPDATE translations SET last_used = ? WHERE key = ?", (now, key))
+                        conn.commit()
+                    self.hits += 1
+                    return translation
+                self.misses += 1
+                return None
+        except sqlite3.Error as e:
+            print(f"[TranslationCache] Read error: {e}")
+            return None
+
+    def set(self, text, language, model, translation):
+        """Store a translation and evict least-recently-used entries past max_entries."""
+        if not self.enabled or not translation:
+            return
+        key = self.make_key(text, language, model)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO translations "
+                    "(key, text, language, model, translation, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, text, language, model, translation, now, now)
+                )
+                self._writes += 1
+                if self._writes % EVICT_EVERY_WRITES == 0:
+                    self._evict_lru(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"[TranslationCache] Write error: {e}")
+
+    def _evict_lru(self, conn):
+        (count,) = conn.execute("SELECT COUNT(*) FROM translations").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM translations WHERE key IN "
+                "(SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def purge_expired(self):
+        """Delete entries older than the TTL and trim to max_entries. Returns the number expired."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                cursor = conn.execute(
+                    "DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+                self._evict_lru(conn)
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"[TranslationCache] Purge error: {e}")
+            return 0
+
+    def stats(self):
+        try:
+            with self._lock:
+                (count,) = self._connect().execute("SELECT COUNT(*) FROM translations").fetchone()
+        except sqlite3.Error:
+            count = None
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "path": self.path,
+        }
+
+
+translation_cache = TranslationCache()
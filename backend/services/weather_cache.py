@@ -0,0 +1,192 @@
+"""
+Geo-bucketed cache for OpenWeatherMap responses.
+
+Weather hardly changes across a few kilometres or a quarter of an hour, so
+results are keyed by the geohash cell of the coordinates (precision 5 is a
+~4.9 km x 4.9 km cell) with separate TTLs for current conditions and the
+forecast. Concurrent misses for the same cell share one upstream call
+(single-flight). Entries live in process memory and, with
+WEATHER_CACHE_BACKEND=sqlite, also in a SQLite file shared by all gunicorn
+workers.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, 'weather.sqlite3')
+
+WEATHER_CACHE_PRECISION = int(os.getenv('WEATHER_CACHE_PRECISION', 5))
+WEATHER_CURRENT_TTL = float(os.getenv('WEATHER_CURRENT_TTL', 900))
+WEATHER_FORECAST_TTL = float(os.getenv('WEATHER_FORECAST_TTL', 3 * 3600))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', 5000))
+# How long a request waits for another thread's in-flight fetch of the same cell
+SINGLE_FLIGHT_WAIT = 15
+
+_GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lon, precision=WEATHER_CACHE_PRECISION):
+    """Standard base32 geohash of a coordinate."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class WeatherCache:
+    def __init__(self, precision=WEATHER_CACHE_PRECISION, backend=None, path=None):
+        self.precision = precision
+        self.ttls = {"current": WEATHER_CURRENT_TTL, "forecast": WEATHER_FORECAST_TTL}
+        self.backend = backend or os.getenv('WEATHER_CACHE_BACKEND', 'memory')
+        self.path = path or os.getenv('WEATHER_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.enabled = os.getenv('WEATHER_CACHE_ENABLED', 'true').lower() != 'false'
+        self.counters = {kind: {"hits": 0, "misses": 0, "coalesced": 0} for kind in self.ttls}
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, so each gunicorn worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+        if self.backend != 'sqlite':
+            return None
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT payload, expires_at FROM weather WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[WeatherCache] Read error: {e}")
+            return None
+        if row is None or row[1] <= now:
+            return None
+        value = json.loads(row[0])
+        self._remember(key, value, row[1])
+        return value
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > WEATHER_CACHE_MAX_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _set(self, key, kind, value):
+        expires_at = time.time() + self.ttls[kind]
+        self._remember(key, value, expires_at)
+        if self.backend != 'sqlite':
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO weather (key, payload, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                conn.execute("DELETE FROM weather WHERE expires_at < ?", (time.time(),))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"[WeatherCache] Write error: {e}")
+
+    def get_or_fetch(self, kind, lat, lon, fetch):
+        """Return the cached `kind` ("current" or "forecast") payload for the cell containing
+        (lat, lon), calling fetch() on a miss. fetch() returning None is not cached."""
+        if not self.enabled:
+            return fetch()
+        key = f"{kind}:{geohash(float(lat), float(lon), self.precision)}"
+        counters = self.counters[kind]
+
+        value = self._get(key)
+        if value is not None:
+            counters["hits"] += 1
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            counters["coalesced"] += 1
+            flight.event.wait(SINGLE_FLIGHT_WAIT)
+            return flight.value
+
+        counters["misses"] += 1
+        try:
+            value = fetch()
+            if value is not None:
+                self._set(key, kind, value)
+            flight.value = value
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        result = {"enabled": self.enabled, "backend": self.backend, "precision": self.precision,
+                  "memory_entries": len(self._memory)}
+        for kind, c in self.counters.items():
+            served = c["hits"] + c["coalesced"]
+            total = served + c["misses"]
+            result[kind] = {**c, "hit_ratio": round(served / total, 4) if total else 0.0}
+        return result
+
+
+weather_cache = WeatherCache()
@@ -0,0 +1,49 @@
+import random
+
+from services.decision_engine import (
+    CROP_NAMES,
+    CROP_REQUIREMENTS,
+    compute_final_score,
+    compute_profitability_score,
+    compute_risk_score,
+    compute_suitability_score,
+    score_all_crops,
+)
+
+
+def _random_inputs(rng):
+    return {
+        "n": round(rng.uniform(0, 160), rng.choice([0, 1, 2])),
+        "p": round(rng.uniform(0, 120), rng.choice([0, 1, 2])),
+        "k": round(rng.uniform(0, 120), rng.choice([0, 1, 2])),
+        "temperature": round(rng.uniform(-5, 50), 1),
+        "humidity": round(rng.uniform(10, 100), 1),
+        "ph": round(rng.uniform(3, 10), 2),
+        "rainfall": round(rng.uniform(0, 600), 1),
+        "market_trend": None if rng.random() < 0.3 else round(rng.random(), 3),
+    }
+
+
+def _boundary_inputs():
+    # Every ideal-range bound, and just either side of it
+    for reqs in CROP_REQUIREMENTS.values():
+        for bound in (0, 1):
+            for offset in (-0.01, 0.0, 0.01):
+                row = {param: values[bound] + offset for param, values in reqs.items()}
+                yield {**row, "rainfall": 50 + offset * 100, "market_trend": None}
+
+
+def test_score_all_crops_matches_per_crop_scores():
+    rng = random.Random(7)
+    inputs = [_random_inputs(rng) for _ in range(2000)] + list(_boundary_inputs())
+    table = score_all_crops(inputs)
+
+    for i, row in enumerate(inputs):
+        risk, _ = compute_risk_score(row)
+        assert float(table["risk"][i]) == risk, row
+        for j, crop in enumerate(CROP_NAMES):
+            suitability = compute_suitability_score(row, crop)
+            profitability = compute_profitability_score(row, crop)
+            assert float(table["suitability"][i][j]) == suitability, (row, crop)
+            assert float(table["profitability"][i][j]) == profitability, (row, crop)
+            assert float(table["final"][i][j]) == compute_final_score(suitability, profitability, risk), (row, crop)
@@ -0,0 +1,38 @@
+import random
+
+from services.image_cache import BKTree, hamming
+
+
+def flip_bits(rng, value, max_flips):
+    for bit in rng.sample(range(64), rng.randint(0, max_flips)):
+        value ^= 1 << bit
+    return value
+
+
+def test_bk_tree_search_matches_linear_scan():
+    rng = random.Random(13)
+    # Clusters of near-identical photo hashes, as re-uploads produce
+    centers = [rng.getrandbits(64) for _ in range(40)]
+    tree = BKTree()
+    live = {}
+
+    for entry_id in range(4000):
+        # Removals leave tombstones and eventually trigger rebuilds
+        if live and rng.random() < 0.35:
+            removed = rng.choice(list(live))
+            tree.remove(live.pop(removed), removed)
+            continue
+        if live and rng.random() < 0.1:
+            value = rng.choice(list(live.values()))  # same hash as an existing entry
+        else:
+            value = flip_bits(rng, rng.choice(centers), 10) if rng.random() < 0.8 else rng.getrandbits(64)
+        tree.add(value, entry_id)
+        live[entry_id] = value
+
+        if entry_id % 20 == 0:
+            for radius in (0, 3, 8, 16):
+                query = flip_bits(rng, rng.choice(centers), 12)
+                expected = sorted((hamming(query, h), i) for i, h in live.items() if hamming(query, h) <= radius)
+                assert sorted(tree.search(query, radius)) == expected, (entry_id, radius)
+
+    assert tree.tombstones <= tree.nodes - tree.tombstones
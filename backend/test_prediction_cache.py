@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+
+from models.ml_models import crop_model, fertilizer_model
+from services.decision_engine import run_decision_engine
+from services.prediction_cache import prediction_cache
+
+FEATURES = ("N", "P", "K", "temperature", "humidity", "ph", "rainfall")
+RANGES = {"N": (0, 140), "P": (5, 145), "K": (5, 205), "temperature": (8, 44),
+          "humidity": (14, 100), "ph": (3.5, 9.9), "rainfall": (20, 300)}
+
+rng = random.Random(5)
+# Rounded values repeat, as simple mode's do; 4 decimals exercise the key rounding
+INPUTS = [
+    {key: round(rng.uniform(*RANGES[key]), decimals) for key in FEATURES}
+    for decimals in [rng.choice([0, 1, 4]) for _ in range(300)]
+]
+
+
+def predict_all():
+    answers = []
+    for row in INPUTS:
+        crop, confidence = crop_model.predict(np.array([[row[key] for key in FEATURES]]))
+        fertilizer = fertilizer_model.predict([row["N"], row["P"], row["K"], row["ph"]], crop=crop.lower(),
+                                              temperature=row["temperature"], humidity=row["humidity"])
+        answers.append((crop, confidence, fertilizer, run_decision_engine(row, crop, 'en')))
+    return answers
+
+
+def test_cached_answers_equal_uncached_ones():
+    assert crop_model.model is not None and fertilizer_model.model is not None
+    enabled = prediction_cache.enabled
+    try:
+        prediction_cache.enabled = False
+        uncached = predict_all()
+        prediction_cache.enabled = True
+        first = predict_all()
+        hits = prediction_cache.counters["crop"]["hits"]
+        # Routes decorate the decision they get back; that must not reach the cache
+        for *_, decision in first:
+            decision["scores"] = None
+        cached = predict_all()
+    finally:
+        prediction_cache.enabled = enabled
+
+    assert prediction_cache.counters["crop"]["hits"] - hits == len(INPUTS)
+    assert cached == uncached
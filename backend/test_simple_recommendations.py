@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+# The table assumes seasonal-default weather, so keep OpenWeatherMap out of it
+os.environ['OPENWEATHER_API_KEY'] = 'demo'
+
+from flask import Flask
+
+import routes.crop_routes as crop_routes
+from build_simple_recommendations import build
+from services.location_service import SOIL_TYPE_DATA, STATES_DISTRICTS, WATER_AVAILABILITY
+from services.simple_recommendations import SimpleRecommendationTable
+
+app = Flask(__name__)
+app.register_blueprint(crop_routes.crop_bp, url_prefix='/api/crop')
+
+# First and last district of a few states × every soil choice (or none) × every water level (or none)
+REQUESTS = [
+    {"state": state, "district": district, "language": "en",
+     **({"soil_type": soil_type} if soil_type else {}), **({"water": water} if water else {})}
+    for state, districts in list(STATES_DISTRICTS.items())[:6]
+    for district in (districts[0], districts[-1])
+    for soil_type in [None, *SOIL_TYPE_DATA]
+    for water in [None, *WATER_AVAILABILITY]
+]
+
+
+def recommend_all(table):
+    original = crop_routes.simple_table
+    crop_routes.simple_table = table
+    try:
+        client = app.test_client()
+        return [client.post('/api/crop/recommend-simple', json=body).get_json() for body in REQUESTS]
+    finally:
+        crop_routes.simple_table = original
+
+
+def test_table_answers_match_live_inference():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'simple_recommendations.json.gz')
+        build(path, min(4, os.cpu_count() or 1))
+
+        disabled = SimpleRecommendationTable(path)
+        disabled.enabled = False
+        live = recommend_all(disabled)
+
+        table = SimpleRecommendationTable(path)
+        precomputed = recommend_all(table)
+
+    assert all(response["success"] for response in live)
+    # Every simple-mode request without live weather is in the table...
+    assert table.misses == 0 and table.hits == len(REQUESTS)
+    # ...and answered exactly as live inference answers it
+    for body, expected, actual in zip(REQUESTS, live, precomputed):
+        assert actual == expected, body
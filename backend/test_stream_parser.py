@@ -0,0 +1,55 @@
+import json
+import random
+
+from services.gemini_service import _partial_json_string, gemini_service
+
+ANSWERS = [
+    {"intent": "navigate_crop", "language_detected": "en",
+     "response": "Try \"Rice\" here:\n1. Sow in June\\July\n2. Keep 5 cm of water\ttabs and all"},
+    {"intent": "general_query", "language_detected": "hi",
+     "response": "धान की बुवाई जून में करें। 🌾 पानी 5 से.मी. रखें"},
+    {"intent": "weather_query", "language_detected": "te",
+     "response": "వర్షం పడే అవకాశం ఉంది 🌧️ — éè \"quoted\" \\ backslash / slash"},
+    {"intent": "navigate_market", "language_detected": "en", "response": ""},
+]
+
+# How Gemini may write each answer: raw UTF-8, \uXXXX escapes (surrogate pairs
+# for emoji), or pretty-printed inside a ```json fence
+STREAMS = [
+    (answer, text)
+    for answer in ANSWERS
+    for text in (json.dumps(answer, ensure_ascii=False), json.dumps(answer),
+                 "```json\n" + json.dumps(answer, indent=2, ensure_ascii=False) + "\n```")
+]
+
+
+def test_partial_values_only_grow_towards_the_final_value():
+    for answer, text in STREAMS:
+        for key in ("intent", "language_detected", "response"):
+            previous = ""
+            for end in range(len(text) + 1):
+                value, complete = _partial_json_string(text[:end], key)
+                if value is None:
+                    assert not complete
+                    continue
+                assert answer[key].startswith(value) and value.startswith(previous), (key, text[:end])
+                assert not complete or value == answer[key], (key, text[:end])
+                previous = value
+            assert _partial_json_string(text, key) == (answer[key], True)
+
+
+def test_streamed_tokens_add_up_to_the_response(monkeypatch):
+    rng = random.Random(17)
+    monkeypatch.setattr(gemini_service, 'client', gemini_service.client or object())
+    for answer, text in STREAMS:
+        for _ in range(20):
+            # Cut the reply into chunks at arbitrary characters, mid-escape included
+            cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, min(30, len(text) - 1))))
+            chunks = [text[a:b] for a, b in zip([0, *cuts], [*cuts, len(text)])]
+            monkeypatch.setattr(gemini_service, '_generate_content_stream', lambda prompt: iter(chunks))
+
+            events = list(gemini_service.stream_farming_intent("question", "en"))
+            assert events[0] == ("intent", answer["intent"])
+            assert [event for event, _ in events].count("intent") == 1
+            assert "".join(value for event, value in events if event == "token") == answer["response"]
+            assert events[-1] == ("done", answer)
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from models.tree_arrays import ARRAYS, COMPILED, TreeModel, _model_arrays, export_tree_model
+
+# Flat-array engine vs the scikit-learn model it was exported from: predictions
+# must agree bit for bit. benchmark_tree_models.py does the same on the bundled models.
+
+rng = np.random.default_rng(3)
+X = rng.normal(size=(1500, 7)) * [1, 10, 100, 0.1, 5, 50, 2]
+X[:, 0] = np.round(X[:, 0], 1)  # repeated values land exactly on split thresholds
+labels = (X[:, 0] + X[:, 1] / 10 > 0).astype(int) + (X[:, 2] > 50).astype(int) * 2
+y_class = np.array(["rice", "wheat", "maize", "cotton"])[labels]
+y_value = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=len(X))
+X_test = rng.normal(size=(800, 7)) * [1, 10, 100, 0.1, 5, 50, 2]
+
+MODELS = {
+    "forest": RandomForestClassifier(n_estimators=25, max_depth=12, random_state=0).fit(X, y_class),
+    "tree": DecisionTreeClassifier(random_state=0).fit(X, y_class),
+    "boosting": GradientBoostingRegressor(n_estimators=40, max_depth=4, random_state=0).fit(X, y_value),
+}
+
+
+def assert_same_predictions(flat, model):
+    assert np.array_equal(flat.predict(X_test), model.predict(X_test))
+    if hasattr(model, "predict_proba"):
+        assert np.array_equal(flat.predict_proba(X_test), model.predict_proba(X_test))
+    for row in X_test[:50]:
+        assert np.array_equal(flat.predict(row.reshape(1, -1)), model.predict(row.reshape(1, -1)))
+
+
+def test_compiled_export_matches_sklearn():
+    with tempfile.TemporaryDirectory() as directory:
+        for name, model in MODELS.items():
+            path = os.path.join(directory, f"{name}.trees")
+            export_tree_model(model, path)
+            flat = TreeModel(path)
+            # Used in place from the memory map, not copied
+            assert isinstance(flat._children, np.memmap)
+            assert_same_predictions(flat, model)
+
+
+def export_legacy(model, path):
+    # The layout written before the compiled arrays existed: sklearn's nodes, no max_depth
+    arrays, meta = _model_arrays(model)
+    os.makedirs(path)
+    for name in ARRAYS:
+        np.save(os.path.join(path, f"{name}.npy"), arrays[name])
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def test_compiled_export_has_no_raw_node_arrays():
+    with tempfile.TemporaryDirectory() as directory:
+        export_tree_model(MODELS["forest"], directory)
+        written = {name[:-4] for name in os.listdir(directory) if name.endswith('.npy')}
+        assert written == set(COMPILED) | {"roots"}
+
+
+def test_legacy_export_matches_sklearn():
+    with tempfile.TemporaryDirectory() as directory:
+        for name, model in MODELS.items():
+            path = os.path.join(directory, f"{name}.trees")
+            export_legacy(model, path)
+            assert_same_predictions(TreeModel(path), model)
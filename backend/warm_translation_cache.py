@@ -0,0 +1,75 @@
+"""
+Pre-translate every known crop and fertilizer name into every supported language
+so non-English requests are served from the translation cache.
+
+Usage:
+    python warm_translation_cache.py                 # all languages
+    python warm_translation_cache.py --languages hi te
+    python warm_translation_cache.py --purge         # drop expired entries first
+"""
+import argparse
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.decision_engine import CROP_REQUIREMENTS
+from services.gemini_service import gemini_service, LANGUAGE_MAP
+from services.translation_cache import translation_cache
+
+SAVED_MODELS_DIR = os.path.join(os.path.dirname(__file__), 'ml', 'saved_models')
+
+
+def collect_terms():
+    """Crop and fertilizer names exactly as the routes pass them to translate_text."""
+    crops = set(crop.capitalize() for crop in CROP_REQUIREMENTS)
+    crop_classes_path = os.path.join(SAVED_MODELS_DIR, 'crop_classes.json')
+    if os.path.exists(crop_classes_path):
+        with open(crop_classes_path) as f:
+            crops.update(crop.capitalize() for crop in json.load(f))
+
+    fertilizers = set()
+    fertilizer_classes_path = os.path.join(SAVED_MODELS_DIR, 'fertilizer_classes.json')
+    if os.path.exists(fertilizer_classes_path):
+        with open(fertilizer_classes_path) as f:
+            fertilizers.update(json.load(f).get('fertilizers', []))
+
+    return sorted(crops) + sorted(fertilizers)
+
+
+def warm(languages):
+    terms = collect_terms()
+    print(f"Warming {len(terms)} terms × {len(languages)} languages")
+    translated = cached = failed = 0
+    start = time.time()
+
+    for language in languages:
+        for term in terms:
+            if translation_cache.get_any(term, language, gemini_service.all_models()) is not None:
+                cached += 1
+                continue
+            result = gemini_service.translate_text(term, language)
+            if result and result != term:
+                translated += 1
+            else:
+                failed += 1
+        print(f"  {language} ({LANGUAGE_MAP[language]}) done")
+
+    print(f"✅ {translated} translated, {cached} already cached, {failed} failed "
+          f"in {time.time() - start:.1f}s")
+    print(translation_cache.stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--languages', nargs='+', choices=[code for code in LANGUAGE_MAP if code != 'en'],
+                        default=[code for code in LANGUAGE_MAP if code != 'en'])
+    parser.add_argument('--purge', action='store_true', help='Delete expired entries before warming')
+    args = parser.parse_args()
+
+    if args.purge:
+        print(f"Purged {translation_cache.purge_expired()} expired entries")
+    warm(args.languages)